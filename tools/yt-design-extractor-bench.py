@@ -0,0 +1,910 @@
+#!/usr/bin/env python3
+"""
+YouTube 设计概念提取器 - 基准测试
+=================================
+离线测量 `yt-design-extractor.py` 的性能，便于跨提交比较。
+所有网络依赖（yt-dlp、youtube-transcript-api）都由临时目录中的
+替身程序代替，因此不需要网络访问。
+
+用法：
+    python3 tools/yt-design-extractor-bench.py startup [选项]
+    python3 tools/yt-design-extractor-bench.py synthetic [选项]
+    python3 tools/yt-design-extractor-bench.py ocr [选项]
+    python3 tools/yt-design-extractor-bench.py offline
+
+示例：
+    python3 tools/yt-design-extractor-bench.py startup
+    python3 tools/yt-design-extractor-bench.py startup --budget-ms 250 --json
+    python3 tools/yt-design-extractor-bench.py synthetic --output bench.json
+    python3 tools/yt-design-extractor-bench.py ocr --sizes 1280x720 1920x1080
+"""
+
+import argparse
+import contextlib
+import difflib
+import importlib.util
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows：synthetic 不记录 CPU 和峰值 RSS
+    resource = None
+
+SCRIPT = Path(__file__).resolve().parent / "yt-design-extractor.py"
+
+# 这些模块只应在选中的功能真正需要时才被导入
+HEAVY_MODULES = ("torch", "easyocr", "PIL", "pytesseract", "colorthief", "numpy", "cv2")
+
+STAND_IN_VIDEO_ID = "benchVideo0"
+STAND_IN_META = {
+    "id": STAND_IN_VIDEO_ID,
+    "title": "Benchmark video",
+    "channel": "bench",
+    "duration": 60,
+    "webpage_url": f"https://youtu.be/{STAND_IN_VIDEO_ID}",
+}
+STAND_IN_TRANSCRIPT = [
+    {"text": f"caption {i}", "start": i * 2.0, "duration": 2.0} for i in range(30)
+]
+
+# ---------------------------------------------------------------------------
+# 替身程序
+# ---------------------------------------------------------------------------
+
+STAND_IN_YT_DLP = '''\
+#!/usr/bin/env python3
+"""yt-dlp 替身：--dump-json 输出固定元数据，-o 复制/输出本地视频。"""
+import json, os, shutil, sys
+
+args = sys.argv[1:]
+meta = json.loads(os.environ.get("BENCH_META", "{}"))
+if "--dump-json" in args:
+    print(json.dumps(meta))
+    sys.exit(0)
+if "-o" in args:
+    video = os.environ.get("BENCH_VIDEO")
+    if not video:
+        sys.exit("BENCH_VIDEO 未设置")
+    out = args[args.index("-o") + 1]
+    if out == "-":
+        with open(video, "rb") as fh:
+            shutil.copyfileobj(fh, sys.stdout.buffer)
+    else:
+        shutil.copy(video, out.replace("%(ext)s", "mp4"))
+    sys.exit(0)
+sys.exit("yt-dlp 替身：不支持的参数 " + " ".join(args))
+'''
+
+STAND_IN_TRANSCRIPT_API = '''\
+"""youtube-transcript-api 替身：返回固定的离线字幕。"""
+import json
+import os
+
+
+class _Snippet:
+    def __init__(self, text, start, duration):
+        self.text = text
+        self.start = start
+        self.duration = duration
+
+
+class YouTubeTranscriptApi:
+    def fetch(self, video_id):
+        entries = json.loads(os.environ.get("BENCH_TRANSCRIPT", "[]"))
+        return [_Snippet(e["text"], e["start"], e["duration"]) for e in entries]
+'''
+
+STAND_IN_TRANSCRIPT_ERRORS = """\
+class TranscriptsDisabled(Exception):
+    pass
+
+
+class NoTranscriptFound(Exception):
+    pass
+
+
+class VideoUnavailable(Exception):
+    pass
+"""
+
+
+def write_stand_ins(root: Path) -> dict:
+    """在 `root` 下写入替身程序，返回运行提取器所需的环境变量。"""
+    bin_dir = root / "bin"
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    yt_dlp = bin_dir / "yt-dlp"
+    yt_dlp.write_text(STAND_IN_YT_DLP.replace("/usr/bin/env python3", sys.executable))
+    yt_dlp.chmod(0o755)
+
+    pkg = root / "pylib" / "youtube_transcript_api"
+    pkg.mkdir(parents=True, exist_ok=True)
+    (pkg / "__init__.py").write_text(STAND_IN_TRANSCRIPT_API)
+    (pkg / "_errors.py").write_text(STAND_IN_TRANSCRIPT_ERRORS)
+
+    env = dict(os.environ)
+    env["PATH"] = f"{bin_dir}{os.pathsep}{env.get('PATH', '')}"
+    env["PYTHONPATH"] = str(root / "pylib")
+    env["XDG_CACHE_HOME"] = str(root / "cache")
+    env.setdefault("BENCH_META", json.dumps(STAND_IN_META))
+    env.setdefault("BENCH_TRANSCRIPT", json.dumps(STAND_IN_TRANSCRIPT))
+    return env
+
+
+# ---------------------------------------------------------------------------
+# 启动时间
+# ---------------------------------------------------------------------------
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    """解析 `-X importtime` 输出，返回 {模块: 自身导入耗时（微秒）}。"""
+    modules = {}
+    for line in stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\S.*)$", line)
+        if m:
+            modules[m.group(3).strip()] = int(m.group(1))
+    return modules
+
+
+def measure_startup(argv: list[str], env: dict) -> dict:
+    """以 `-X importtime` 运行一次提取器，返回导入耗时和已导入的重量级模块。"""
+    cmd = [sys.executable, "-X", "importtime", str(SCRIPT), *argv]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env, timeout=300)
+    wall_ms = (time.perf_counter() - start) * 1000
+    modules = parse_importtime(result.stderr)
+    heavy = sorted({name.split(".")[0] for name in modules} & set(HEAVY_MODULES))
+    return {
+        "argv": argv,
+        "returncode": result.returncode,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(sum(modules.values()) / 1000, 1),
+        "modules_imported": len(modules),
+        "heavy_modules": heavy,
+    }
+
+
+def bench_startup(args) -> int:
+    with tempfile.TemporaryDirectory(prefix="yt-bench-") as tmp:
+        root = Path(tmp)
+        env = write_stand_ins(root)
+        cases = {
+            "help": ["--help"],
+            "transcript-only": [
+                STAND_IN_VIDEO_ID,
+                "--transcript-only",
+                "-o",
+                str(root / "out"),
+            ],
+        }
+        results = {name: measure_startup(argv, env) for name, argv in cases.items()}
+
+    failures = []
+    for name, r in results.items():
+        if r["returncode"] != 0:
+            failures.append(f"{name}：退出代码 {r['returncode']}")
+        if r["heavy_modules"]:
+            failures.append(f"{name}：导入了重量级模块 {', '.join(r['heavy_modules'])}")
+        if r["import_ms"] > args.budget_ms:
+            failures.append(
+                f"{name}：导入耗时 {r['import_ms']} ms 超出预算 {args.budget_ms} ms"
+            )
+
+    if args.json:
+        print(json.dumps({"startup": results, "failures": failures}, indent=2))
+    else:
+        print(f"{'场景':<18}{'导入 ms':>10}{'总耗时 ms':>12}{'模块数':>8}  重量级模块")
+        for name, r in results.items():
+            heavy = ", ".join(r["heavy_modules"]) or "-"
+            print(
+                f"{name:<18}{r['import_ms']:>10}{r['wall_ms']:>12}"
+                f"{r['modules_imported']:>8}  {heavy}"
+            )
+        for f in failures:
+            print(f"[✗] {f}")
+        if not failures:
+            print(f"[✓] 启动导入耗时在 {args.budget_ms} ms 预算内")
+    return 1 if failures else 0
+
+
+# ---------------------------------------------------------------------------
+# 合成视频
+# ---------------------------------------------------------------------------
+
+# 幻灯片内容同时作为 OCR 的标准答案；避免 drawtext 需要转义的字符（: ' \ %）
+SLIDES = [
+    (
+        "Design Tokens",
+        ["Primary color 4F46E5", "Spacing scale 4 8 16 24", "Radius 6px"],
+    ),
+    (
+        "Typography",
+        ["Heading Inter Bold 32", "Body Inter Regular 16", "Line height 1.5"],
+    ),
+    ("Grid System", ["Twelve columns", "Gutter 24px", "Max width 1200px"]),
+    ("Buttons", ["Primary filled", "Secondary outline", "Disabled opacity 40"]),
+    ("Color Palette", ["Neutral gray 50 to 900", "Success green 600", "Error red 600"]),
+    (
+        "Accessibility",
+        ["Contrast ratio 4.5 to 1", "Focus ring 2px", "Touch target 44px"],
+    ),
+]
+SLIDE_SECONDS = 5
+VIDEO_SIZE = (1280, 720)
+VIDEO_FPS = 25
+SLIDE_BG = (30, 30, 46)
+SLIDE_FG = (235, 235, 245)
+
+
+def ffmpeg_has_filter(name: str) -> bool:
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-filters"], capture_output=True, text=True
+    )
+    return re.search(rf"^\s*\S+\s+{re.escape(name)}\s", result.stdout, re.M) is not None
+
+
+def render_slide(title: str, lines: list[str], size: tuple[int, int] = VIDEO_SIZE):
+    """用 Pillow 绘制一张幻灯片（ffmpeg 不带 drawtext 时的回退，也用于 OCR 基准）。"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    def font(px):
+        try:
+            return ImageFont.load_default(size=px)
+        except TypeError:  # Pillow < 10.1 的默认字体不可缩放
+            return ImageFont.load_default()
+
+    width, height = size
+    img = Image.new("RGB", size, SLIDE_BG)
+    draw = ImageDraw.Draw(img)
+    draw.text((width // 12, height // 8), title, fill=SLIDE_FG, font=font(height // 10))
+    for i, line in enumerate(lines):
+        y = height // 8 + height // 5 + i * height // 9
+        draw.text((width // 12, y), line, fill=SLIDE_FG, font=font(height // 16))
+    return img
+
+
+def _encode(cmd: list[str], path: Path) -> Path:
+    cmd = [
+        *cmd,
+        "-c:v",
+        "libx264",
+        "-preset",
+        "ultrafast",
+        "-pix_fmt",
+        "yuv420p",
+        "-r",
+        str(VIDEO_FPS),
+        "-movflags",
+        "+faststart",
+        "-y",
+        str(path),
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"生成合成视频失败：{path.name}\n{result.stderr[-2000:]}")
+    return path
+
+
+def make_slides_video(path: Path) -> Path:
+    """带文字的幻灯片：每 SLIDE_SECONDS 秒换一张。
+    优先使用 ffmpeg 的 drawtext；不可用时用 Pillow 绘制后拼接。"""
+    width, height = VIDEO_SIZE
+    duration = len(SLIDES) * SLIDE_SECONDS
+    bg = "0x{:02x}{:02x}{:02x}".format(*SLIDE_BG)
+    fg = "0x{:02x}{:02x}{:02x}".format(*SLIDE_FG)
+    if ffmpeg_has_filter("drawtext"):
+        draws = []
+        for i, (title, lines) in enumerate(SLIDES):
+            on = f"enable='between(t,{i * SLIDE_SECONDS},{(i + 1) * SLIDE_SECONDS})'"
+            x = width // 12
+            draws.append(
+                f"drawtext=text='{title}':x={x}:y={height // 8}"
+                f":fontsize={height // 10}:fontcolor={fg}:{on}"
+            )
+            for j, line in enumerate(lines):
+                y = height // 8 + height // 5 + j * height // 9
+                draws.append(
+                    f"drawtext=text='{line}':x={x}:y={y}"
+                    f":fontsize={height // 16}:fontcolor={fg}:{on}"
+                )
+        source = f"color=c={bg}:s={width}x{height}:r={VIDEO_FPS}:d={duration}"
+        return _encode(
+            ["ffmpeg", "-f", "lavfi", "-i", ",".join([source, *draws])], path
+        )
+
+    inputs, labels = [], []
+    for i, (title, lines) in enumerate(SLIDES):
+        png = path.with_name(f"{path.stem}-{i}.png")
+        render_slide(title, lines).save(png)
+        inputs += ["-loop", "1", "-framerate", str(VIDEO_FPS)]
+        inputs += ["-t", str(SLIDE_SECONDS), "-i", str(png)]
+        labels.append(f"[{i}:v]")
+    graph = f"{''.join(labels)}concat=n={len(SLIDES)}:v=1:a=0[v]"
+    return _encode(["ffmpeg", *inputs, "-filter_complex", graph, "-map", "[v]"], path)
+
+
+def make_cuts_video(path: Path, cuts: int = 40, seconds: float = 0.5) -> Path:
+    """快速场景切换：testsrc 和纯色片段交替，每段 `seconds` 秒。"""
+    width, height = VIDEO_SIZE
+    colors = ["red", "blue", "green", "yellow", "magenta", "white", "black", "cyan"]
+    opts = f"s={width}x{height}:r={VIDEO_FPS}:d={seconds}"
+    inputs, labels = [], []
+    for i in range(cuts):
+        if i % 2:
+            source = f"color=c={colors[i // 2 % len(colors)]}:{opts}"
+        else:
+            source = f"{'testsrc' if i % 4 else 'testsrc2'}={opts}"
+        inputs += ["-f", "lavfi", "-i", source]
+        labels.append(f"[{i}:v]")
+    graph = f"{''.join(labels)}concat=n={cuts}:v=1:a=0[v]"
+    return _encode(["ffmpeg", *inputs, "-filter_complex", graph, "-map", "[v]"], path)
+
+
+def make_static_video(path: Path, duration: int = 60) -> Path:
+    """长时间静止的画面（彩条），考察去重和场景检测在无变化时的开销。"""
+    width, height = VIDEO_SIZE
+    source = f"smptebars=s={width}x{height}:r={VIDEO_FPS}:d={duration}"
+    return _encode(["ffmpeg", "-f", "lavfi", "-i", source], path)
+
+
+SYNTHETIC_VIDEOS = {
+    "slides": (make_slides_video, len(SLIDES) * SLIDE_SECONDS),
+    "cuts": (make_cuts_video, 20),
+    "static": (make_static_video, 60),
+}
+
+
+# ---------------------------------------------------------------------------
+# 合成基准
+# ---------------------------------------------------------------------------
+
+
+def load_extractor():
+    """按文件路径导入提取器脚本（文件名含连字符，无法直接 import）。
+    注册到 sys.modules，使进程池能够按名称找到其中的函数。"""
+    name = "yt_design_extractor"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _usage() -> tuple[float, float, float, float]:
+    """(本进程 CPU 秒, 子进程 CPU 秒, 本进程峰值 RSS MB, 子进程峰值 RSS MB)"""
+    if resource is None:
+        return 0.0, 0.0, 0.0, 0.0
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    scale = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024
+    return (
+        own.ru_utime + own.ru_stime,
+        children.ru_utime + children.ru_stime,
+        own.ru_maxrss * scale,
+        children.ru_maxrss * scale,
+    )
+
+
+def run_stage(stage: str, video: str, out_dir: str, options: dict) -> dict:
+    """在独立的子进程中运行一个提取器阶段，使峰值 RSS 只反映该阶段。
+    提取器的进度输出转到 stderr，stdout 只保留 JSON 结果。"""
+    with contextlib.redirect_stdout(sys.stderr):
+        return _run_stage(stage, video, out_dir, options)
+
+
+def _run_stage(stage: str, video: str, out_dir: str, options: dict) -> dict:
+    ext = load_extractor()
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    frames = [Path(f) for f in options.get("frames", [])]
+    cpu0, child_cpu0, _, _ = _usage()
+    start = time.perf_counter()
+    if stage == "interval":
+        produced = ext.extract_frames_interval(Path(video), out, options["interval"])
+        items = len(produced)
+    elif stage == "scene":
+        produced, _ = ext.extract_frames_scene(Path(video), out, options["threshold"])
+        items = len(produced)
+    elif stage == "segmented":
+        interval_frames, produced, _ = ext.extract_frames_segmented(
+            Path(video),
+            out,
+            options["interval"],
+            options["threshold"],
+            segments=options["segments"],
+            duration=options["duration"],
+        )
+        items = len(interval_frames) + len(produced)
+    elif stage == "ocr":
+        produced = []
+        items = len(
+            ext.run_ocr_on_frames(
+                frames,
+                ocr_engine=options["engine"],
+                text_threshold=options.get("text_threshold"),
+            )
+        )
+    elif stage == "palette":
+        produced = []
+        engine = ext.load_engine("palette", options["engine"])
+        engine.run(frames)
+        items = len(frames)
+    else:
+        raise ValueError(stage)
+    wall = time.perf_counter() - start
+    cpu, child_cpu, rss, child_rss = _usage()
+    return {
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu - cpu0, 3),
+        "children_cpu_s": round(child_cpu - child_cpu0, 3),
+        "peak_rss_mb": round(rss, 1),
+        "children_peak_rss_mb": round(child_rss, 1),
+        "items": items,
+        "items_per_s": round(items / wall, 2) if wall else None,
+        "frames": [str(f) for f in produced],
+    }
+
+
+def measure_stage(stage: str, video: Path, out_dir: Path, **options) -> dict:
+    # 每个阶段使用全新的 spawn 子进程：ru_maxrss 是单调的最高水位
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(run_stage, stage, str(video), str(out_dir), options).result()
+
+
+def bench_end_to_end(video: Path, duration: int, root: Path, interval: int) -> dict:
+    """通过替身程序以 --full --profile 运行完整 CLI，返回按调用汇总的剖析结果。"""
+    env = write_stand_ins(root)
+    env["BENCH_VIDEO"] = str(video)
+    width, height = VIDEO_SIZE
+    env["BENCH_META"] = json.dumps(
+        {
+            "id": STAND_IN_VIDEO_ID,
+            "title": "Synthetic slides",
+            "channel": "bench",
+            "duration": duration,
+            "width": width,
+            "height": height,
+            "webpage_url": f"https://youtu.be/{STAND_IN_VIDEO_ID}",
+            "chapters": [
+                {
+                    "title": title,
+                    "start_time": i * SLIDE_SECONDS,
+                    "end_time": (i + 1) * SLIDE_SECONDS,
+                }
+                for i, (title, _) in enumerate(SLIDES)
+            ],
+        }
+    )
+    out = root / "e2e"
+    cmd = [
+        sys.executable,
+        str(SCRIPT),
+        STAND_IN_VIDEO_ID,
+        "--full",
+        "--profile",
+        "--no-ocr-cache",
+        "--interval",
+        str(interval),
+        "-o",
+        str(out),
+    ]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env, timeout=1800)
+    wall = time.perf_counter() - start
+    report = {"returncode": result.returncode, "wall_s": round(wall, 3)}
+    trace_path = out / "profile-trace.json"
+    if result.returncode != 0 or not trace_path.exists():
+        report["error"] = result.stderr[-2000:]
+        return report
+    profiler = load_extractor().Profiler()
+    profiler.events = json.loads(trace_path.read_text())["traceEvents"]
+    report["spans"] = {
+        row.pop("name"): {
+            k: round(v, 3) if isinstance(v, float) else v for k, v in row.items()
+        }
+        for row in profiler.summary()
+    }
+    return report
+
+
+def git_revision() -> Optional[str]:
+    result = subprocess.run(
+        ["git", "-C", str(SCRIPT.parent), "rev-parse", "--short", "HEAD"],
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip() or None
+
+
+def bench_synthetic(args) -> int:
+    if not shutil.which("ffmpeg"):
+        sys.exit("合成基准需要 ffmpeg")
+    ext = load_extractor()
+    ocr_engines = [
+        e for e in sorted(ext.ENGINES["ocr"]) if ext.engine_available("ocr", e)
+    ]
+    palette_engines = [
+        e for e in sorted(ext.ENGINES["palette"]) if ext.engine_available("palette", e)
+    ]
+    text_threshold = args.text_threshold
+    if text_threshold is None:
+        text_threshold = ext.TEXT_SCORE_THRESHOLD
+    report = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "ffmpeg_drawtext": ffmpeg_has_filter("drawtext"),
+        "interval": args.interval,
+        "scene_threshold": args.scene_threshold,
+        "videos": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="yt-bench-") as tmp:
+        root = Path(tmp)
+        for name in args.videos:
+            make, duration = SYNTHETIC_VIDEOS[name]
+            print(f"[*] 生成合成视频：{name}（{duration} 秒）", file=sys.stderr)
+            video = make(root / f"{name}.mp4")
+            decoded = duration * VIDEO_FPS
+            stages = {}
+
+            def record(label, metrics, decode=False):
+                metrics = dict(metrics)
+                frames = metrics.pop("frames")
+                if decode and metrics["wall_s"]:
+                    metrics["decode_fps"] = round(decoded / metrics["wall_s"], 1)
+                stages[label] = metrics
+                print(f"    → {name}/{label}：{metrics['wall_s']} s", file=sys.stderr)
+                return frames
+
+            frames = record(
+                "interval",
+                measure_stage("interval", video, root / name, interval=args.interval),
+                decode=True,
+            )
+            record(
+                "scene",
+                measure_stage(
+                    "scene", video, root / name, threshold=args.scene_threshold
+                ),
+                decode=True,
+            )
+            if args.segments > 1:
+                record(
+                    f"segmented:{args.segments}",
+                    measure_stage(
+                        "segmented",
+                        video,
+                        root / name / "segmented",
+                        interval=args.interval,
+                        threshold=args.scene_threshold,
+                        segments=args.segments,
+                        duration=duration,
+                    ),
+                    decode=True,
+                )
+            for engine in ocr_engines:
+                record(
+                    f"ocr:{engine}",
+                    measure_stage(
+                        "ocr", video, root / name, frames=frames, engine=engine
+                    ),
+                )
+                record(
+                    f"ocr:{engine}+text-filter",
+                    measure_stage(
+                        "ocr",
+                        video,
+                        root / name,
+                        frames=frames,
+                        engine=engine,
+                        text_threshold=text_threshold,
+                    ),
+                )
+            for engine in palette_engines:
+                record(
+                    f"palette:{engine}",
+                    measure_stage(
+                        "palette", video, root / name, frames=frames, engine=engine
+                    ),
+                )
+            report["videos"][name] = {"duration_s": duration, "stages": stages}
+
+        if not args.skip_e2e:
+            print("[*] 通过替身程序运行端到端 --full --profile", file=sys.stderr)
+            make, duration = SYNTHETIC_VIDEOS["slides"]
+            video = root / "slides.mp4"
+            if not video.exists():
+                make(video)
+            report["end_to_end"] = bench_end_to_end(
+                video, duration, root, args.interval
+            )
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"[✓] 结果已写入 {args.output}", file=sys.stderr)
+    print(text)
+    e2e = report.get("end_to_end", {})
+    return 1 if e2e.get("returncode") else 0
+
+
+# ---------------------------------------------------------------------------
+# OCR 准确率 / 吞吐量
+# ---------------------------------------------------------------------------
+
+# 准确率允许的下降幅度（字符相似度），低于该幅度视为“不低于”当前路径
+OCR_ACCURACY_TOLERANCE = 0.005
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def char_accuracy(truth: str, text: str) -> float:
+    """规范化空白后的字符级相似度（difflib 比率，0-1）。"""
+    return difflib.SequenceMatcher(
+        None, normalize_text(truth), normalize_text(text)
+    ).ratio()
+
+
+def bench_ocr(args) -> int:
+    """在 Pillow 绘制的幻灯片上比较整帧 OCR 与 --ocr-preprocess 的准确率和吞吐量。"""
+    ext = load_extractor()
+    if not ext.engine_available("ocr", "tesseract"):
+        sys.exit("OCR 基准需要 Pillow、pytesseract 和 tesseract 可执行文件")
+    import numpy as np
+
+    images = []
+    for size in args.sizes:
+        width, height = (int(v) for v in size.lower().split("x"))
+        for title, lines in SLIDES:
+            img = render_slide(title, lines, (width, height))
+            images.append((size, np.asarray(img), "\n".join([title, *lines])))
+
+    report = {
+        "revision": git_revision(),
+        "engine": "tesseract",
+        "frames": len(images),
+        "modes": {},
+    }
+    for mode, preprocess in (("full-frame", False), ("preprocess", True)):
+        ocr_options = ext.OcrOptions(preprocess=preprocess)
+        scores: dict[str, list[float]] = {}
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for size, frame, truth in images:
+                with contextlib.redirect_stdout(sys.stderr):
+                    text = ext.ocr_frame_tesseract(frame, ocr_options=ocr_options)
+                scores.setdefault(size, []).append(char_accuracy(truth, text or ""))
+        wall = time.perf_counter() - start
+        calls = len(images) * args.repeat
+        all_scores = [s for values in scores.values() for s in values]
+        report["modes"][mode] = {
+            "wall_s": round(wall, 3),
+            "frames_per_s": round(calls / wall, 2) if wall else None,
+            "accuracy": round(sum(all_scores) / len(all_scores), 4),
+            "accuracy_by_size": {
+                size: round(sum(v) / len(v), 4) for size, v in scores.items()
+            },
+        }
+        print(
+            f"[*] {mode}：{report['modes'][mode]['frames_per_s']} 帧/秒，"
+            f"准确率 {report['modes'][mode]['accuracy']:.2%}",
+            file=sys.stderr,
+        )
+
+    base, pre = report["modes"]["full-frame"], report["modes"]["preprocess"]
+    report["speedup"] = round(base["wall_s"] / pre["wall_s"], 2)
+    report["passed"] = (
+        pre["wall_s"] < base["wall_s"]
+        and pre["accuracy"] >= base["accuracy"] - OCR_ACCURACY_TOLERANCE
+    )
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        print(f"[✓] 结果已写入 {args.output}", file=sys.stderr)
+    print(text)
+    if not report["passed"]:
+        print("[!] 预处理路径没有同时做到更快且准确率不降低", file=sys.stderr)
+        return 1
+    print(
+        f"[✓] 预处理路径快 {report['speedup']} 倍，准确率不低于整帧识别",
+        file=sys.stderr,
+    )
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# 离线库调用
+# ---------------------------------------------------------------------------
+
+
+@contextlib.contextmanager
+def without_network_tools(root: Path):
+    """PATH 只含空目录（没有 yt-dlp 和 ffmpeg），youtube-transcript-api
+    无法导入：任何访问网络的尝试都会失败而不是悄悄成功。"""
+    empty = root / "empty-bin"
+    empty.mkdir()
+    path = os.environ.get("PATH")
+    module = sys.modules.get("youtube_transcript_api")
+    os.environ["PATH"] = str(empty)
+    sys.modules["youtube_transcript_api"] = None
+    try:
+        yield
+    finally:
+        if path is None:
+            os.environ.pop("PATH", None)
+        else:
+            os.environ["PATH"] = path
+        if module is None:
+            sys.modules.pop("youtube_transcript_api", None)
+        else:
+            sys.modules["youtube_transcript_api"] = module
+
+
+def bench_offline(args) -> int:
+    """用预先填入的 MemoryCache 调用 `extract(transcript_only=True)`：元数据和
+    字幕都来自缓存时不需要 yt-dlp，也不访问网络；缓存为空时应当报告缺少
+    yt-dlp。"""
+    ext = load_extractor()
+    meta, transcript = STAND_IN_META, STAND_IN_TRANSCRIPT
+    seeded = ext.MetadataCache(ext.MemoryCache(), ttl=3600)
+    seeded.put("metadata", STAND_IN_VIDEO_ID, meta)
+    seeded.put("transcript", STAND_IN_VIDEO_ID, transcript)
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="yt-bench-") as tmp:
+        root = Path(tmp)
+        options = {"transcript_only": True, "cache_dir": str(root / "cache")}
+        with without_network_tools(root), contextlib.redirect_stdout(sys.stderr):
+            try:
+                result = ext.extract(
+                    STAND_IN_VIDEO_ID,
+                    str(root / "seeded"),
+                    meta_cache=seeded,
+                    **options,
+                )
+            except ext.ExtractorError as e:
+                result = None
+                failures.append(f"缓存已填入时提取失败：{e}")
+            try:
+                ext.extract(
+                    STAND_IN_VIDEO_ID,
+                    str(root / "empty"),
+                    meta_cache=ext.MetadataCache(ext.MemoryCache(), ttl=3600),
+                    **options,
+                )
+                failures.append("缓存为空时提取没有失败")
+            except ext.DependencyError:
+                pass
+            except ext.ExtractorError as e:
+                failures.append(f"缓存为空时应报告缺少 yt-dlp，实际：{e}")
+        if result is not None:
+            if result.metadata.get("title") != meta["title"]:
+                failures.append(f"元数据不是缓存中的值：{result.metadata.get('title')}")
+            if len(result.transcript) != len(transcript):
+                failures.append(
+                    f"字幕条数 {len(result.transcript)}，缓存中为 {len(transcript)}"
+                )
+            if result.reference is None or not result.reference.exists():
+                failures.append("没有写出参考文档")
+
+    for f in failures:
+        print(f"[✗] {f}")
+    if not failures:
+        print("[✓] 元数据和字幕来自 MemoryCache，没有调用 yt-dlp 或字幕 API")
+    return 1 if failures else 0
+
+
+# ---------------------------------------------------------------------------
+# 主函数
+# ---------------------------------------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="离线测量 yt-design-extractor.py 的性能。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=textwrap.dedent("""\
+            示例：
+              %(prog)s startup
+              %(prog)s startup --budget-ms 250 --json
+              %(prog)s synthetic --output bench.json
+              %(prog)s synthetic --videos slides cuts --skip-e2e
+              %(prog)s synthetic --videos static --segments 8 --skip-e2e
+              %(prog)s ocr --sizes 1280x720 1920x1080 --repeat 3
+              %(prog)s offline
+        """),
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_startup = sub.add_parser(
+        "startup",
+        help="断言 --help / --transcript-only 不导入重量级后端且导入耗时在预算内",
+    )
+    p_startup.add_argument(
+        "--budget-ms",
+        type=float,
+        default=300,
+        help="允许的最大导入耗时（毫秒，默认：300）",
+    )
+    p_startup.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    p_startup.set_defaults(func=bench_startup)
+
+    p_synth = sub.add_parser(
+        "synthetic",
+        help="在 ffmpeg 生成的合成视频上测量帧提取、OCR 和调色板的吞吐量与峰值内存",
+    )
+    p_synth.add_argument(
+        "--videos",
+        nargs="+",
+        choices=list(SYNTHETIC_VIDEOS),
+        default=list(SYNTHETIC_VIDEOS),
+        help="要生成的合成视频（默认：全部）",
+    )
+    p_synth.add_argument(
+        "--interval", type=int, default=2, help="间隔帧的秒数（默认：2）"
+    )
+    p_synth.add_argument(
+        "--scene-threshold", type=float, default=0.3, help="场景变化阈值（默认：0.3）"
+    )
+    p_synth.add_argument(
+        "--text-threshold",
+        type=float,
+        help="ocr:<引擎>+text-filter 阶段使用的文本预筛选阈值"
+        "（默认：提取器的 TEXT_SCORE_THRESHOLD）",
+    )
+    p_synth.add_argument(
+        "--segments",
+        type=int,
+        default=0,
+        metavar="N",
+        help="另外测量 --segments N 分段并行提取（间隔 + 场景）（默认：不测量）",
+    )
+    p_synth.add_argument(
+        "--skip-e2e", action="store_true", help="跳过通过替身程序运行的端到端 CLI 测量"
+    )
+    p_synth.add_argument("--output", help="同时把 JSON 结果写入文件，便于跨提交比较")
+    p_synth.set_defaults(func=bench_synthetic)
+
+    p_ocr = sub.add_parser(
+        "ocr",
+        help="在合成幻灯片上比较整帧 Tesseract 与 --ocr-preprocess 的准确率和吞吐量",
+    )
+    p_ocr.add_argument(
+        "--sizes",
+        nargs="+",
+        default=["1280x720", "1920x1080", "854x480"],
+        help="幻灯片分辨率（默认：1280x720 1920x1080 854x480）",
+    )
+    p_ocr.add_argument(
+        "--repeat", type=int, default=1, help="每种模式重复识别的轮数（默认：1）"
+    )
+    p_ocr.add_argument("--output", help="同时把 JSON 结果写入文件，便于跨提交比较")
+    p_ocr.set_defaults(func=bench_ocr)
+
+    p_offline = sub.add_parser(
+        "offline",
+        help="断言元数据和字幕由预先填入的 MemoryCache 提供时，"
+        "--transcript-only 不需要 yt-dlp 和网络",
+    )
+    p_offline.set_defaults(func=bench_offline)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
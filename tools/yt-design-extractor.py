@@ -7,6 +7,8 @@ markdown 参考文档，供 agent 使用。
 
 用法：
     python3 tools/yt-design-extractor.py <youtube_url> [选项]
+    python3 tools/yt-design-extractor.py --batch urls.txt [选项]
+    python3 tools/yt-design-extractor.py search <查询> [选项]   # 跨视频全文搜索
 
 示例：
     python3 tools/yt-design-extractor.py "https://youtu.be/eVnQFWGDEdY"
@@ -14,6 +16,18 @@ markdown 参考文档，供 agent 使用。
     python3 tools/yt-design-extractor.py "https://youtu.be/eVnQFWGDEdY" --scene-detect --ocr
     python3 tools/yt-design-extractor.py "https://youtu.be/eVnQFWGDEdY" --full  # 所有功能
     python3 tools/yt-design-extractor.py "https://youtu.be/eVnQFWGDEdY" --ocr --ocr-engine easyocr
+    python3 tools/yt-design-extractor.py "https://youtu.be/eVnQFWGDEdY" --ocr --adaptive  # 按内容选帧
+    python3 tools/yt-design-extractor.py "https://www.youtube.com/playlist?list=PL..." --full
+    python3 tools/yt-design-extractor.py --batch urls.txt --download-workers 3 --ocr
+
+作为库使用（通过 tools/yt_design_extractor.py 导入）：
+    import yt_design_extractor as yde
+    result = yde.extract("eVnQFWGDEdY", ocr=True)   # 或 await yde.extract_async(...)
+    失败时抛出 yde.ExtractorError（及其子类），不会退出进程。
+    元数据和字幕按视频 ID 缓存（--meta-cache-ttl）；离线测试时可传入预先填好的
+    meta_cache=yde.MetadataCache(yde.MemoryCache(), ttl=3600)。
+    CLI 默认把每个视频写入跨视频全文索引，库调用只在传入 search_index=True
+    （或索引文件路径）时才写入。
 
 依赖要求：
     pip install yt-dlp youtube-transcript-api
@@ -28,53 +42,475 @@ markdown 参考文档，供 agent 使用。
 
     可选（调色板提取）：
     pip install colorthief
+
+    可选（--stream-frames 内存帧管道）：
+    pip install numpy Pillow
 """
 
 import argparse
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import functools
+import hashlib
+import importlib
+import importlib.util
+import itertools
 import json
+import math
 import os
+import queue
 import re
+import shlex
 import shutil
+import socket
+import socketserver
+import sqlite3
 import subprocess
 import sys
 import textwrap
-from collections import Counter
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import asdict, dataclass, field, replace
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
-
-# 可选导入 - 如果不可用则优雅降级
-PILLOW_AVAILABLE = False
-TESSERACT_AVAILABLE = False
+from typing import Callable, Iterable, Iterator, Optional
 
 try:
-    from PIL import Image
+    import resource
+except ImportError:  # Windows：--profile 不记录子进程 CPU 和峰值 RSS
+    resource = None
 
-    PILLOW_AVAILABLE = True
-except ImportError:
-    pass
+# ---------------------------------------------------------------------------
+# 错误类型
+# ---------------------------------------------------------------------------
 
-try:
-    import pytesseract
 
-    TESSERACT_AVAILABLE = PILLOW_AVAILABLE
-except ImportError:
-    pass
+class ExtractorError(Exception):
+    """提取失败的基类。库函数只抛出异常、从不退出进程：由调用方（CLI、
+    批量模式或嵌入的服务）决定是退出还是继续处理其他任务。"""
 
-try:
-    import easyocr
 
-    EASYOCR_AVAILABLE = True
-except ImportError:
-    EASYOCR_AVAILABLE = False
+class InvalidInputError(ExtractorError):
+    """无法识别的 URL / 视频 ID、未知引擎或无效选项。"""
 
-try:
-    from colorthief import ColorThief
 
-    COLORTHIEF_AVAILABLE = True
-except ImportError:
-    COLORTHIEF_AVAILABLE = False
+class DependencyError(ExtractorError):
+    """缺少必需的外部工具，或明确请求的可选后端未安装。"""
+
+
+class CommandError(ExtractorError):
+    """外部命令（yt-dlp、ffmpeg）失败或超时。"""
+
+
+# ---------------------------------------------------------------------------
+# 可选依赖与引擎注册表
+# ---------------------------------------------------------------------------
+
+# 可选导入 - 按需延迟导入，如果不可用则优雅降级。
+# easyocr 会拉入 torch，即使是 --help / --transcript-only 也要付出数秒的
+# 导入时间和数百 MB 内存，因此所有重量级后端只在选中的功能真正用到时
+# 才导入（见下方的引擎注册表）。
+
+
+class _LazyModule:
+    """首次访问属性时才导入目标模块的代理。"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def module_available(name: str) -> bool:
+    """检查模块是否已安装，但不导入它。"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+Image = _LazyModule("PIL.Image")
+pytesseract = _LazyModule("pytesseract")
+easyocr = _LazyModule("easyocr")
+colorthief = _LazyModule("colorthief")
+np = _LazyModule("numpy")
+
+PILLOW_AVAILABLE = module_available("PIL")
+TESSERACT_AVAILABLE = PILLOW_AVAILABLE and module_available("pytesseract")
+EASYOCR_AVAILABLE = module_available("easyocr")
+COLORTHIEF_AVAILABLE = module_available("colorthief")
+NUMPY_AVAILABLE = module_available("numpy")
+
+
+@dataclass(frozen=True)
+class EngineSpec:
+    """已注册的 OCR / 调色板后端。
+
+    `modules` 列出后端需要的可选模块，只在 `load_engine` 选中该后端时
+    才真正导入。`run` 处理一批帧（OCR 引擎的 `run` 按完成顺序逐帧产出
+    (帧, 文本)）；OCR 引擎的 `ocr_frame` 处理单个内存帧，
+    `config` 返回参与缓存键的配置描述。OCR 引擎识别失败时文本为 None
+    （与“没有文本”的空字符串区分），失败的结果不写入缓存。
+
+    注册的 OCR 引擎的 `run` / `ocr_frame` 接受 `ocr_options` 关键字，
+    `config` 接受一个 `OcrOptions`；`load_engine` 返回已绑定本次运行设置、
+    三者都无需再传入设置的规格。"""
+
+    kind: str
+    name: str
+    modules: tuple[str, ...]
+    install_hint: str
+    run: Callable
+    ocr_frame: Optional[Callable] = None
+    config: Optional[Callable[[], str]] = None
+    # 调色板引擎对单帧（路径或内存数组）的分析，结果可作为 run 的 precomputed
+    analyze_frame: Optional[Callable] = None
+    # 调色板引擎只需要均匀采样的帧数；0 表示使用全部帧
+    sample_frames: int = 0
+    thread_safe: bool = True
+    # 预先完成耗时的初始化（例如加载模型），供 --serve-ocr 在启动时调用
+    warmup: Optional[Callable[[], None]] = None
+    # 明确请求但缺失时直接退出，而不是跳过该功能
+    exit_if_missing: bool = False
+
+
+@dataclass(frozen=True)
+class OcrOptions:
+    """影响识别结果（因而参与 OCR 缓存键）的每次运行设置。
+
+    `preprocess` 对应 --ocr-preprocess：Tesseract 只识别裁剪、缩放并二值化
+    后的文本区域。设置随调用传递，而不是保存在模块状态中，同一进程内的
+    并发调用互不影响。"""
+
+    preprocess: bool = False
+
+
+DEFAULT_OCR_OPTIONS = OcrOptions()
+
+ENGINES: dict[str, dict[str, EngineSpec]] = {"ocr": {}, "palette": {}}
+
+
+def register_engine(spec: EngineSpec) -> EngineSpec:
+    """注册一个后端；同名后端会被覆盖，便于插入自定义实现。"""
+    ENGINES.setdefault(spec.kind, {})[spec.name] = spec
+    return spec
+
+
+def engine_available(kind: str, name: str) -> bool:
+    """后端的全部模块是否已安装（不导入）。"""
+    spec = ENGINES.get(kind, {}).get(name)
+    return spec is not None and all(module_available(m) for m in spec.modules)
+
+
+def load_engine(
+    kind: str,
+    name: str,
+    ocr_options: Optional[OcrOptions] = None,
+    daemon: Optional["OcrDaemonClient"] = None,
+) -> EngineSpec | None:
+    """导入所选后端需要的模块并返回其规格；不可用时返回 None。
+    OCR 引擎的规格绑定了 `ocr_options`（默认 `DEFAULT_OCR_OPTIONS`）；
+    本次运行连接的 OCR 守护进程 `daemon` 已按相同设置加载所选引擎时，
+    返回转发给守护进程的规格。"""
+    ocr_options = ocr_options or DEFAULT_OCR_OPTIONS
+    if kind == "ocr" and daemon is not None and daemon.serves(name, ocr_options):
+        return daemon.engine
+    spec = ENGINES.get(kind, {}).get(name)
+    if spec is None:
+        raise InvalidInputError(
+            f"未知的{kind}引擎：{name}（可选：{', '.join(ENGINES.get(kind, {}))}）"
+        )
+    try:
+        if not all(module_available(m) for m in spec.modules):
+            raise ImportError(", ".join(spec.modules))
+        for module in spec.modules:
+            importlib.import_module(module)
+    except ImportError as e:
+        if spec.exit_if_missing:
+            raise DependencyError(
+                f"明确请求了 {name} 但未安装（{e}）。\n  {spec.install_hint}"
+            ) from None
+        print(f"[!] 未安装 {name}（{e}），跳过。{spec.install_hint}")
+        return None
+    if kind == "ocr":
+        return replace(
+            spec,
+            run=functools.partial(spec.run, ocr_options=ocr_options),
+            ocr_frame=functools.partial(spec.ocr_frame, ocr_options=ocr_options),
+            config=functools.partial(spec.config, ocr_options),
+        )
+    return spec
+
+
+# 非线程安全后端的进程内调用锁：批量模式下多个视频可能同时运行同一后端
+_ENGINE_LOCKS: dict[str, threading.Lock] = {}
+
+
+def engine_lock(spec: EngineSpec):
+    """返回调用该后端时需要持有的锁；线程安全的后端返回空上下文。"""
+    if spec.thread_safe:
+        return contextlib.nullcontext()
+    return _ENGINE_LOCKS.setdefault(f"{spec.kind}:{spec.name}", threading.Lock())
+
+
+# ---------------------------------------------------------------------------
+# 性能剖析（--profile）
+# ---------------------------------------------------------------------------
+
+
+class Profiler:
+    """记录每个阶段 / 调用的墙钟时间、CPU 时间、峰值 RSS 和处理项目数。
+
+    每个区间记为一个 Chrome trace-event 完整事件（ph = "X"），可以直接在
+    chrome://tracing 或 Perfetto 中打开。`cpu_ms` 是当前线程的 CPU 时间；
+    `children_cpu_ms` 是期间结束并被回收的子进程（ffmpeg、tesseract、
+    yt-dlp）的 CPU 时间，属于进程级统计，区间并发时会互相包含。
+    峰值 RSS 是截至区间结束时的进程（或子进程）最高水位。"""
+
+    def __init__(self):
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._tids: dict[tuple, int] = {}
+
+    def _tid(self) -> int:
+        # 同一线程中并发的 asyncio 任务各用一条轨道，避免区间交叠
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = (threading.get_ident(), id(task) if task else 0)
+        with self._lock:
+            tid = self._tids.get(key)
+            if tid is None:
+                tid = self._tids[key] = len(self._tids) + 1
+                name = threading.current_thread().name
+                if task:
+                    name = f"{name} / {task.get_name()}"
+                self.events.append(
+                    {
+                        "ph": "M",
+                        "name": "thread_name",
+                        "pid": os.getpid(),
+                        "tid": tid,
+                        "args": {"name": name},
+                    }
+                )
+        return tid
+
+    @staticmethod
+    def _rusage() -> tuple[float, float, float]:
+        """返回 (子进程 CPU 秒, 本进程峰值 RSS MB, 子进程峰值 RSS MB)。"""
+        if resource is None:
+            return 0.0, 0.0, 0.0
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        # Linux 上 ru_maxrss 以 KB 为单位，macOS 上以字节为单位
+        scale = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024
+        return (
+            children.ru_utime + children.ru_stime,
+            own.ru_maxrss * scale,
+            children.ru_maxrss * scale,
+        )
+
+    @contextlib.contextmanager
+    def span(self, name: str, cat: str = "stage"):
+        """记录一个区间。yield 的字典中可以写入 "items"（处理项目数）。"""
+        info: dict = {}
+        tid = self._tid()
+        child_cpu0, _, _ = self._rusage()
+        cpu0 = time.thread_time()
+        t0 = time.perf_counter()
+        try:
+            yield info
+        finally:
+            wall = time.perf_counter() - t0
+            cpu = time.thread_time() - cpu0
+            child_cpu, rss, child_rss = self._rusage()
+            event = {
+                "ph": "X",
+                "name": name,
+                "cat": cat,
+                "pid": os.getpid(),
+                "tid": tid,
+                "ts": round((t0 - self._start) * 1e6),
+                "dur": round(wall * 1e6),
+                "args": {
+                    "cpu_ms": round(cpu * 1000, 1),
+                    "children_cpu_ms": round((child_cpu - child_cpu0) * 1000, 1),
+                    "peak_rss_mb": round(rss, 1),
+                    "children_peak_rss_mb": round(child_rss, 1),
+                    **info,
+                },
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def write_trace(self, path: Path) -> Path:
+        trace = {
+            "traceEvents": self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {"argv": sys.argv},
+        }
+        path.write_text(json.dumps(trace, indent=1), encoding="utf-8")
+        return path
+
+    def summary(self) -> list[dict]:
+        """按名称汇总区间，按总墙钟时间降序。"""
+        rows: dict[str, dict] = {}
+        for e in self.events:
+            if e["ph"] != "X":
+                continue
+            args = e["args"]
+            row = rows.setdefault(
+                e["name"],
+                {
+                    "name": e["name"],
+                    "cat": e["cat"],
+                    "calls": 0,
+                    "wall_s": 0.0,
+                    "cpu_s": 0.0,
+                    "children_cpu_s": 0.0,
+                    "peak_rss_mb": 0.0,
+                    "items": 0,
+                },
+            )
+            row["calls"] += 1
+            row["wall_s"] += e["dur"] / 1e6
+            row["cpu_s"] += args["cpu_ms"] / 1000
+            row["children_cpu_s"] += args["children_cpu_ms"] / 1000
+            row["peak_rss_mb"] = max(
+                row["peak_rss_mb"], args["peak_rss_mb"], args["children_peak_rss_mb"]
+            )
+            row["items"] += args.get("items", 0)
+        return sorted(rows.values(), key=lambda r: r["wall_s"], reverse=True)
+
+    def print_summary(self) -> None:
+        print(
+            f"{'阶段 / 调用':<30}{'次数':>6}{'墙钟 s':>10}{'CPU s':>9}"
+            f"{'子进程 s':>10}{'峰值 MB':>10}{'项目':>7}{'项目/s':>9}"
+        )
+        for r in self.summary():
+            rate = "-"
+            if r["items"] and r["wall_s"]:
+                rate = f"{r['items'] / r['wall_s']:.1f}"
+            print(
+                f"{r['name']:<30}{r['calls']:>6}{r['wall_s']:>10.2f}{r['cpu_s']:>9.2f}"
+                f"{r['children_cpu_s']:>10.2f}{r['peak_rss_mb']:>10.1f}"
+                f"{r['items'] or '-':>7}{rate:>9}"
+            )
+
+
+# 当前调用的剖析器（由 --profile 启用）；为 None 时所有剖析钩子都是空操作。
+# 上下文变量随 asyncio 任务和 `in_context` 包装的线程传递，同一进程内并发的
+# 调用各自记录到自己的剖析器
+_PROFILER: contextvars.ContextVar[Optional[Profiler]] = contextvars.ContextVar(
+    "profiler", default=None
+)
+
+
+@contextlib.contextmanager
+def profiling(profiler: Optional[Profiler]):
+    """在此上下文中（包括由它派生的任务和 `in_context` 线程）使用 `profiler`。"""
+    token = _PROFILER.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _PROFILER.reset(token)
+
+
+def in_context(fn: Callable) -> Callable:
+    """返回在调用方上下文（当前剖析器）的副本中运行 `fn` 的函数。
+    线程和线程池不会自动继承上下文变量；每次调用各用一个副本，
+    可以在多个线程中同时运行。"""
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def profile_span(name: str, cat: str = "stage"):
+    """未启用剖析时返回空上下文（yield 一个被丢弃的字典）。"""
+    profiler = _PROFILER.get()
+    if profiler is None:
+        return contextlib.nullcontext({})
+    return profiler.span(name, cat)
+
+
+def profiled(cat: str, items: Optional[Callable[..., int]] = None):
+    """装饰器：启用剖析时把每次调用记为一个区间（支持 async 函数）。
+
+    `items(result, *args, **kwargs)` 返回本次调用处理的项目数。"""
+
+    def decorate(fn):
+        def record(info, result, args, kwargs):
+            if items is not None and result is not None:
+                info["items"] = items(result, *args, **kwargs)
+
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                profiler = _PROFILER.get()
+                if profiler is None:
+                    return await fn(*args, **kwargs)
+                with profiler.span(fn.__name__, cat) as info:
+                    result = await fn(*args, **kwargs)
+                    record(info, result, args, kwargs)
+                    return result
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = _PROFILER.get()
+            if profiler is None:
+                return fn(*args, **kwargs)
+            with profiler.span(fn.__name__, cat) as info:
+                result = fn(*args, **kwargs)
+                record(info, result, args, kwargs)
+                return result
+
+        return wrapper
+
+    return decorate
+
+
+def _count(result, *_args, **_kwargs) -> int:
+    return len(result)
+
+
+def _one(_result, *_args, **_kwargs) -> int:
+    return 1
+
+
+def _count_frame_lists(result, *_args, **_kwargs) -> int:
+    # 帧提取函数返回 (帧列表, ...) 元组，只统计其中的帧列表
+    return sum(len(part) for part in result if isinstance(part, list))
+
+
+def _count_input_frames(_result, frames, *_args, precomputed=None, **_kwargs) -> int:
+    return len(frames) + len(precomputed or {})
+
 
 # ---------------------------------------------------------------------------
 # 字幕提取
@@ -95,11 +531,76 @@ def extract_video_id(url: str) -> str:
     # 也许用户传递的是原始 ID
     if re.match(r"^[a-zA-Z0-9_-]{11}$", url):
         return url
-    sys.exit(f"无法从以下 URL 提取视频 ID：{url}")
+    raise InvalidInputError(f"无法从以下 URL 提取视频 ID：{url}")
+
+
+async def run_command_async(cmd: list[str], timeout: float) -> tuple[int, str, str]:
+    """以异步子进程运行命令并捕获输出，返回 (退出代码, stdout, stderr)。
+
+    超时或所在任务被取消时会终止并回收子进程，不会留下孤儿进程；
+    超时抛出 asyncio.TimeoutError，取消则继续向上传播。"""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+        raise
+    return (
+        proc.returncode,
+        stdout.decode("utf-8", "replace"),
+        stderr.decode("utf-8", "replace"),
+    )
+
+
+async def run_blocking_async(fn: Callable, *args):
+    """在守护线程中运行阻塞调用并等待结果。
+
+    与 asyncio.to_thread 不同，超时或取消后事件循环不会在退出时等待
+    这个线程结束（线程无法被强制停止，只是被放弃）。"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(result, error):
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def target():
+        try:
+            result, error = fn(*args), None
+        except BaseException as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(deliver, result, error)
+        except RuntimeError:
+            pass  # 事件循环已关闭：调用方早已放弃等待
 
+    threading.Thread(target=in_context(target), daemon=True).start()
+    return await future
 
-def get_video_metadata(url: str) -> dict:
+
+def require_yt_dlp() -> None:
+    """yt-dlp 不在 PATH 上时抛出 DependencyError。只在确实要调用它时检查：
+    元数据和字幕都由缓存提供的 --transcript-only 运行不需要 yt-dlp。"""
+    if not shutil.which("yt-dlp"):
+        raise DependencyError(
+            "在 PATH 上找不到必需的工具 'yt-dlp'。安装方法：pip install yt-dlp"
+        )
+
+
+@profiled("network")
+async def get_video_metadata(url: str) -> dict:
     """使用 yt-dlp 提取标题、描述、章节、时长等信息。"""
+    require_yt_dlp()
     cmd = [
         "yt-dlp",
         "--dump-json",
@@ -109,19 +610,20 @@ def get_video_metadata(url: str) -> dict:
     ]
     print("[*] 正在获取视频元数据…")
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-    except subprocess.TimeoutExpired:
-        sys.exit("yt-dlp 元数据获取在 120 秒后超时。")
-    if result.returncode != 0:
-        sys.exit(f"yt-dlp 元数据获取失败：\n{result.stderr}")
+        returncode, stdout, stderr = await run_command_async(cmd, timeout=120)
+    except asyncio.TimeoutError:
+        raise CommandError("yt-dlp 元数据获取在 120 秒后超时。") from None
+    if returncode != 0:
+        raise CommandError(f"yt-dlp 元数据获取失败：\n{stderr}")
     try:
-        return json.loads(result.stdout)
+        return json.loads(stdout)
     except json.JSONDecodeError as e:
-        sys.exit(
-            f"yt-dlp 返回了无效的 JSON：{e}\n前 200 个字符：{result.stdout[:200]}"
-        )
+        raise CommandError(
+            f"yt-dlp 返回了无效的 JSON：{e}\n前 200 个字符：{stdout[:200]}"
+        ) from None
 
 
+@profiled("network", items=_count)
 def get_transcript(video_id: str) -> list[dict] | None:
     """通过 youtube-transcript-api 获取字幕。返回
     {text, start, duration} 字典列表，如果不可用则返回 None。"""
@@ -160,7 +662,8 @@ def get_transcript(video_id: str) -> list[dict] | None:
 # ---------------------------------------------------------------------------
 
 
-def download_video(url: str, out_dir: Path) -> Path:
+@profiled("network")
+async def download_video(url: str, out_dir: Path) -> Path:
     """下载视频，优先选择 720p 或更低。回退到可用的最佳质量。"""
     out_template = str(out_dir / "video.%(ext)s")
     cmd = [
@@ -176,50 +679,183 @@ def download_video(url: str, out_dir: Path) -> Path:
     ]
     print("[*] 正在下载视频（优先 720p）…")
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-    except subprocess.TimeoutExpired:
-        sys.exit(
+        returncode, _stdout, stderr = await run_command_async(cmd, timeout=600)
+    except asyncio.TimeoutError:
+        raise CommandError(
             "视频下载在 10 分钟后超时。"
             "视频可能太大或连接太慢。"
-        )
-    if result.returncode != 0:
-        sys.exit(f"yt-dlp 下载失败：\n{result.stderr}")
+        ) from None
+    if returncode != 0:
+        raise CommandError(f"yt-dlp 下载失败：\n{stderr}")
 
     # 查找下载的文件
     for f in out_dir.iterdir():
         if f.name.startswith("video.") and f.suffix in (".mp4", ".mkv", ".webm"):
             return f
-    sys.exit("下载成功但无法找到视频文件。")
+    raise CommandError("下载成功但无法找到视频文件。")
+
+
+@dataclass
+class VideoStream:
+    """正在向 stdout 写入视频数据的下载进程，以及在后台收集其 stderr 的线程。"""
+
+    proc: subprocess.Popen
+    stderr_lines: list[str]
+    stderr_thread: threading.Thread
+
+
+# 帧提取的输入：已下载的视频文件，或正在向 stdout 写入视频数据的
+# 下载进程（见 `open_video_stream`）。
+VideoSource = Path | VideoStream
+
+# 管道输入只能顺序读取：优先选择单文件（无需合并）且 moov 位于文件头的
+# 渐进式 MP4，其次是任何 ≤720p 的单文件格式。
+STREAM_FORMAT = "best[height<=720][ext=mp4]/best[height<=720]/best"
+
+
+def open_video_stream(url: str, source_cmd: Optional[str] = None) -> VideoStream:
+    """启动把视频数据写到 stdout 的下载进程，供 ffmpeg 边下载边解码。
+
+    默认使用 `yt-dlp -o -`。`source_cmd` 可替换为任意把视频写到 stdout
+    的命令（`{url}` 会被替换为 URL），例如用 `cat local.mp4` 在不访问
+    YouTube 的情况下测试管道路径。本地 MP4 需要 faststart（moov 在前）。
+    """
+    if source_cmd:
+        cmd = shlex.split(source_cmd.replace("{url}", shlex.quote(url)))
+    else:
+        cmd = [
+            "yt-dlp",
+            "-f",
+            STREAM_FORMAT,
+            "-o",
+            "-",
+            "--no-playlist",
+            "--no-progress",
+            url,
+        ]
+    print(f"[*] 正在流式下载视频（{' '.join(cmd[:1])} → ffmpeg）…")
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except OSError as e:
+        raise CommandError(f"无法启动视频流命令 {cmd[0]}：{e}") from None
+    stderr_lines: list[str] = []
+    return VideoStream(proc, stderr_lines, _drain_stderr(proc, stderr_lines))
+
+
+def close_video_stream(stream: VideoStream, timeout: int = 30) -> bool:
+    """关闭下载进程的管道并等待其退出。下载失败时打印错误并返回 False。"""
+    proc = stream.proc
+    proc.stdout.close()
+    try:
+        returncode = proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        returncode = proc.wait()
+    stream.stderr_thread.join(timeout=5)
+    # ffmpeg 已读完所需数据后提前关闭管道时，下载进程会收到 SIGPIPE
+    if returncode not in (0, -13):
+        stderr = "".join(stream.stderr_lines)
+        print(f"[!] 视频流下载失败（退出代码 {returncode}）：")
+        print(f"    {stderr[:500]}")
+        return False
+    return True
+
+
+def ffmpeg_input_args(video: VideoSource) -> list[str]:
+    """返回 ffmpeg 的输入参数；下载进程从 stdin 管道读取。"""
+    if isinstance(video, VideoStream):
+        return ["-i", "pipe:0"]
+    return ["-i", str(video)]
+
+
+def ffmpeg_stdin(video: VideoSource):
+    """返回应连接到 ffmpeg stdin 的文件对象（文件输入时为 None）。"""
+    if isinstance(video, VideoStream):
+        return video.proc.stdout
+    return None
+
+
+@dataclass(frozen=True)
+class FrameFormat:
+    """帧图像的输出格式。`quality` 为 1-100，对 png 无效。
+
+    PNG 是无损格式，ffmpeg 的 -q:v 对它不起作用；长视频的数千帧 PNG 会
+    占用大量磁盘，JPEG / WebP 通常只有其 1/3 到 1/10。"""
+
+    ext: str = "png"
+    quality: int = 90
+
+    def ffmpeg_args(self) -> list[str]:
+        """ffmpeg 图像序列输出的编码参数（放在对应输出文件之前）。"""
+        if self.ext == "jpg":
+            # mjpeg 的 qscale 范围为 2（最好）到 31（最差）
+            return ["-q:v", str(round(2 + (100 - self.quality) * 29 / 99))]
+        if self.ext == "webp":
+            return ["-c:v", "libwebp", "-quality", str(self.quality)]
+        return []
+
+    def pattern(self, prefix: str) -> str:
+        return f"{prefix}_%04d.{self.ext}"
+
+    def glob(self, prefix: str) -> str:
+        return f"{prefix}_*.{self.ext}"
 
+    def name(self, prefix: str, index: int) -> str:
+        return f"{prefix}_{index:04d}.{self.ext}"
 
+    def save(self, img: "Image.Image", path: Path) -> None:
+        if self.ext == "png":
+            img.save(path)
+        else:
+            img.save(path, quality=self.quality)
+
+
+FRAME_FORMATS = ("png", "jpg", "webp")
+PNG_FRAMES = FrameFormat()
+
+
+@profiled("frames", items=_count)
 def extract_frames_interval(
-    video_path: Path, out_dir: Path, interval: int = 30
+    video_path: VideoSource,
+    out_dir: Path,
+    interval: int = 30,
+    frame_format: FrameFormat = PNG_FRAMES,
 ) -> list[Path]:
-    """每隔 `interval` 秒提取一帧。"""
+    """每隔 `interval` 秒提取一帧。ffmpeg 失败时抛出 `CommandError`。"""
     frames_dir = out_dir / "frames"
     frames_dir.mkdir(exist_ok=True)
-    pattern = str(frames_dir / "frame_%04d.png")
+    pattern = str(frames_dir / frame_format.pattern("frame"))
     cmd = [
         "ffmpeg",
-        "-i",
-        str(video_path),
+        *ffmpeg_input_args(video_path),
         "-vf",
         f"fps=1/{interval}",
-        "-q:v",
-        "2",
+        *frame_format.ffmpeg_args(),
         pattern,
         "-y",
     ]
     print(f"[*] 正在每隔 {interval} 秒提取帧…")
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        result = subprocess.run(
+            cmd,
+            stdin=ffmpeg_stdin(video_path),
+            capture_output=True,
+            text=True,
+            timeout=600,
+        )
     except subprocess.TimeoutExpired:
-        sys.exit("帧提取在 10 分钟后超时。")
+        raise CommandError("帧提取在 10 分钟后超时。") from None
     if result.returncode != 0:
-        print(f"[!] ffmpeg 帧提取失败（退出代码 {result.returncode}）：")
-        print(f"    {result.stderr[:500]}")
-        return []
-    frames = sorted(frames_dir.glob("frame_*.png"))
+        raise CommandError(
+            f"ffmpeg 帧提取失败（退出代码 {result.returncode}）：\n"
+            f"{result.stderr[:500]}"
+        )
+    frames = sorted(frames_dir.glob(frame_format.glob("frame")))
     if not frames:
         print(
             "[!] 警告：ffmpeg 运行了但没有产生帧。"
@@ -230,145 +866,2233 @@ def extract_frames_interval(
     return frames
 
 
+def interval_frame_timestamps(frames: list[Path], interval: int) -> dict[Path, float]:
+    """间隔帧按 `fps=1/interval` 输出，第 i 帧对应 i * interval 秒。"""
+    return {f: float(i * interval) for i, f in enumerate(frames)}
+
+
+def parse_showinfo_timestamps(stderr: str) -> list[float]:
+    """从 ffmpeg `showinfo` 滤镜的 stderr 输出中按顺序解析每帧的 pts_time。"""
+    times = []
+    for line in stderr.splitlines():
+        if "showinfo" not in line:
+            continue
+        m = re.search(r"\bpts_time:\s*(-?[0-9.]+)", line)
+        if m:
+            times.append(float(m.group(1)))
+    return times
+
+
+def scene_select(threshold: float) -> str:
+    """场景检测的 select 滤镜。除场景变化帧外总是选出第一帧（它的 scene
+    得分为 0，不会是真正的场景变化）：视频中没有场景变化时场景输出也不为空，
+    ffmpeg 正常退出，非零退出码总是真正的失败。这一帧由 `drop_scene_anchor`
+    删除。"""
+    return f"select='eq(n,0)+gt(scene,{threshold})'"
+
+
+def drop_scene_anchor(
+    frames: list[Path], times: list[float]
+) -> tuple[list[Path], list[float]]:
+    """删除 `scene_select` 额外选出的第一帧及其 showinfo 时间戳。"""
+    if frames:
+        frames[0].unlink(missing_ok=True)
+    return frames[1:], times[1:]
+
+
+def pair_frame_timestamps(frames: list[Path], times: list[float]) -> dict[Path, float]:
+    """将按顺序编号的帧文件与 showinfo 时间戳配对。
+    数量不一致时（例如 ffmpeg 提前中止）只配对共同的前缀。"""
+    if len(times) != len(frames):
+        print(
+            f"[!] 警告：场景帧数量（{len(frames)}）与时间戳数量"
+            f"（{len(times)}）不一致，仅配对前 {min(len(frames), len(times))} 个"
+        )
+    return dict(zip(frames, times))
+
+
+@profiled("frames", items=_count_frame_lists)
 def extract_frames_scene(
-    video_path: Path, out_dir: Path, threshold: float = 0.3
-) -> list[Path]:
-    """使用 ffmpeg 场景变化检测来捕获视觉上不同的帧。"""
+    video_path: VideoSource,
+    out_dir: Path,
+    threshold: float = 0.3,
+    frame_format: FrameFormat = PNG_FRAMES,
+) -> tuple[list[Path], dict[Path, float]]:
+    """使用 ffmpeg 场景变化检测来捕获视觉上不同的帧。
+    返回 (帧列表, {帧: 显示时间戳秒数})。"""
     frames_dir = out_dir / "frames_scene"
     frames_dir.mkdir(exist_ok=True)
-    pattern = str(frames_dir / "scene_%04d.png")
+    pattern = str(frames_dir / frame_format.pattern("scene"))
     cmd = [
         "ffmpeg",
-        "-i",
-        str(video_path),
+        *ffmpeg_input_args(video_path),
         "-vf",
-        f"select='gt(scene,{threshold})',showinfo",
+        f"{scene_select(threshold)},showinfo",
         "-vsync",
         "vfr",
-        "-q:v",
-        "2",
+        *frame_format.ffmpeg_args(),
         pattern,
         "-y",
     ]
     print(f"[*] 正在提取场景变化帧（阈值={threshold}）…")
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        result = subprocess.run(
+            cmd,
+            stdin=ffmpeg_stdin(video_path),
+            capture_output=True,
+            text=True,
+            timeout=600,
+        )
     except subprocess.TimeoutExpired:
-        sys.exit("场景变化帧提取在 10 分钟后超时。")
+        raise CommandError("场景变化帧提取在 10 分钟后超时。") from None
     if result.returncode != 0:
-        print(f"[!] ffmpeg 场景检测失败（退出代码 {result.returncode}）：")
-        print(f"    {result.stderr[:500]}")
-        return []
-    frames = sorted(frames_dir.glob("scene_*.png"))
+        raise CommandError(
+            f"ffmpeg 场景检测失败（退出代码 {result.returncode}）：\n"
+            f"{result.stderr[:500]}"
+        )
+    frames, times = drop_scene_anchor(
+        sorted(frames_dir.glob(frame_format.glob("scene"))),
+        parse_showinfo_timestamps(result.stderr),
+    )
     if not frames:
         print("[!] 未检测到场景变化帧（尝试降低 --scene-threshold）。")
-    else:
-        print(f"    → 捕获了 {len(frames)} 个场景变化帧")
-    return frames
-
-
-# ---------------------------------------------------------------------------
-# OCR 提取
-# ---------------------------------------------------------------------------
+        return [], {}
+    print(f"    → 捕获了 {len(frames)} 个场景变化帧")
+    return frames, pair_frame_timestamps(frames, times)
 
 
-def ocr_frame_tesseract(frame_path: Path) -> str:
-    """使用 Tesseract OCR 从帧中提取文本。首先转换为灰度。"""
-    if not TESSERACT_AVAILABLE:
-        return ""
-    try:
-        img = Image.open(frame_path)
-        if img.mode != "L":
-            img = img.convert("L")
-        text = pytesseract.image_to_string(img, config="--psm 6")
-        return text.strip()
-    except Exception as e:
-        print(f"[!] {frame_path} 的 OCR 失败：{e}")
-        return ""
+@profiled("frames", items=_count_frame_lists)
+def extract_frames_combined(
+    video_path: VideoSource,
+    out_dir: Path,
+    interval: int = 30,
+    threshold: float = 0.3,
+    frame_format: FrameFormat = PNG_FRAMES,
+) -> tuple[list[Path], list[Path], dict[Path, float]]:
+    """单次解码同时提取间隔帧和场景变化帧。
 
+    使用 split 滤镜图将解码后的视频分成两路：一路按 `fps=1/interval`
+    写入 frames/，另一路经场景检测 + showinfo 写入 frames_scene/。
+    与分别调用 `extract_frames_interval` 和 `extract_frames_scene`
+    相比，视频只需解码一次。
 
-def ocr_frame_easyocr(frame_path: Path, reader) -> str:
-    """使用 EasyOCR 从帧中提取文本（更适合样式化文本）。"""
+    返回 (间隔帧, 场景帧, {帧: 显示时间戳秒数})。
+    """
+    frames_dir = out_dir / "frames"
+    scene_dir = out_dir / "frames_scene"
+    frames_dir.mkdir(exist_ok=True)
+    scene_dir.mkdir(exist_ok=True)
+    filter_graph = (
+        "[0:v]split=2[iv_in][sv_in];"
+        f"[iv_in]fps=1/{interval}[iv];"
+        f"[sv_in]{scene_select(threshold)},showinfo[sv]"
+    )
+    cmd = [
+        "ffmpeg",
+        *ffmpeg_input_args(video_path),
+        "-filter_complex",
+        filter_graph,
+        "-map",
+        "[iv]",
+        *frame_format.ffmpeg_args(),
+        str(frames_dir / frame_format.pattern("frame")),
+        "-map",
+        "[sv]",
+        "-vsync",
+        "vfr",
+        *frame_format.ffmpeg_args(),
+        str(scene_dir / frame_format.pattern("scene")),
+        "-y",
+    ]
+    print(
+        f"[*] 正在单次解码提取帧（每隔 {interval} 秒 + 场景变化，阈值={threshold}）…"
+    )
     try:
-        results = reader.readtext(str(frame_path), detail=0)
-        return "\n".join(results).strip()
-    except Exception as e:
-        print(f"[!] {frame_path} 的 OCR 失败：{e}")
-        return ""
+        result = subprocess.run(
+            cmd,
+            stdin=ffmpeg_stdin(video_path),
+            capture_output=True,
+            text=True,
+            timeout=1200,
+        )
+    except subprocess.TimeoutExpired:
+        raise CommandError("帧提取在 20 分钟后超时。") from None
+    if result.returncode != 0:
+        raise CommandError(
+            f"ffmpeg 帧提取失败（退出代码 {result.returncode}）：\n"
+            f"{result.stderr[:500]}"
+        )
 
+    interval_frames = sorted(frames_dir.glob(frame_format.glob("frame")))
+    scene_frames, scene_times = drop_scene_anchor(
+        sorted(scene_dir.glob(frame_format.glob("scene"))),
+        parse_showinfo_timestamps(result.stderr),
+    )
+    frame_times = interval_frame_timestamps(interval_frames, interval)
+    if not interval_frames:
+        print(
+            "[!] 警告：ffmpeg 运行了但没有产生帧。"
+            "视频可能太短或损坏。"
+        )
+    else:
+        print(f"    → 捕获了 {len(interval_frames)} 帧")
+    if not scene_frames:
+        print("[!] 未检测到场景变化帧（尝试降低 --scene-threshold）。")
+    else:
+        print(f"    → 捕获了 {len(scene_frames)} 个场景变化帧")
+        frame_times.update(pair_frame_timestamps(scene_frames, scene_times))
+    return interval_frames, scene_frames, frame_times
 
-def run_ocr_on_frames(
-    frames: list[Path], ocr_engine: str = "tesseract", workers: int = 4
-) -> dict[Path, str]:
-    """对帧运行 OCR。Tesseract 并行运行；EasyOCR 顺序运行。
-    返回 {frame_path: text}。"""
-    if not frames:
-        return {}
 
-    results = {}
+# ---------------------------------------------------------------------------
+# 分段并行帧提取（--segments）
+# ---------------------------------------------------------------------------
 
-    if ocr_engine == "easyocr":
-        if not EASYOCR_AVAILABLE:
-            sys.exit(
-                "明确请求了 EasyOCR 但未安装。\n"
-                "  安装：pip install torch torchvision --index-url "
-                "https://download.pytorch.org/whl/cpu && pip install easyocr\n"
-                "  或使用：--ocr-engine tesseract"
-            )
-        else:
-            print("[*] 正在初始化 EasyOCR（这可能需要一点时间）…")
-            reader = easyocr.Reader(["en"], gpu=False, verbose=False)
+# 每段向前多解码的秒数：场景检测比较相邻帧，段首帧需要前一帧作参照，
+# 否则恰好落在分段点（通常也是关键帧）上的场景切换会被漏掉
+SEGMENT_PREROLL = 1.0
 
-    if ocr_engine == "tesseract" and not TESSERACT_AVAILABLE:
-        print("[!] 未安装 Tesseract/pytesseract，跳过 OCR")
-        return {}
 
-    print(f"[*] 正在 {len(frames)} 帧上运行 OCR（{ocr_engine}）…")
+def probe_keyframes(video_path: Path) -> list[float]:
+    """用 ffprobe 读取视频流中关键帧的时间戳（只解复用，不解码）。
+    ffprobe 不可用或失败时返回空列表。"""
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        str(video_path),
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    times = []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags:
+            try:
+                times.append(float(pts))
+            except ValueError:
+                continue
+    return sorted(times)
 
-    if ocr_engine == "easyocr":
-        # EasyOCR 不能很好地并行化，顺序运行
-        for i, frame in enumerate(frames):
-            results[frame] = ocr_frame_easyocr(frame, reader)
-            if (i + 1) % 10 == 0:
-                print(f"    → 已处理 {i + 1}/{len(frames)} 帧")
-    else:
-        # Tesseract 可以并行运行
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_frame = {
-                executor.submit(ocr_frame_tesseract, f): f for f in frames
-            }
-            for i, future in enumerate(as_completed(future_to_frame)):
-                frame = future_to_frame[future]
-                try:
-                    results[frame] = future.result()
-                except Exception as e:
-                    print(f"[!] {frame} 的 OCR 失败：{e}")
-                    results[frame] = ""
-                if (i + 1) % 10 == 0:
-                    print(f"    → 已处理 {i + 1}/{len(frames)} 帧")
 
-    # 统计有意义文本的帧
-    with_text = sum(1 for t in results.values() if len(t) > 10)
-    print(f"    → 在 {with_text}/{len(frames)} 帧中发现文本")
+def plan_segments(
+    duration: float, segments: int, keyframes: list[float]
+) -> list[tuple[float, float]]:
+    """把 [0, duration) 均分为 `segments` 段，分段点吸附到最近的关键帧。
 
-    return results
+    没有关键帧信息时直接使用均分点：输入端 -ss 是精确定位，结果不变，
+    只是每段要多解码一段 GOP 前缀。"""
+    bounds = [0.0]
+    for i in range(1, segments):
+        target = duration * i / segments
+        point = target
+        if keyframes:
+            j = bisect.bisect_left(keyframes, target)
+            near = keyframes[max(j - 1, 0) : j + 1]
+            point = min(near, key=lambda k: abs(k - target))
+        # 过短的段不值得单独启动一个 ffmpeg
+        if bounds[-1] + SEGMENT_PREROLL < point < duration - SEGMENT_PREROLL:
+            bounds.append(point)
+    bounds.append(duration)
+    return list(zip(bounds, bounds[1:]))
 
 
-# ---------------------------------------------------------------------------
-# 调色板提取
-# ---------------------------------------------------------------------------
+def _extract_segment(
+    video_path: Path,
+    seg_dir: Path,
+    start: float,
+    end: float,
+    last: bool,
+    interval: int,
+    threshold: Optional[float],
+    threads: int,
+    frame_format: FrameFormat = PNG_FRAMES,
+) -> dict:
+    """在一个 ffmpeg 进程中提取 [start, end) 内的间隔帧和场景帧。
+
+    间隔帧对齐全局网格（0、interval、2·interval…），场景帧时间戳换算为
+    全局时间。返回 {"interval": [(时间, 帧)], "scene": [(时间, 帧)]}，
+    ffmpeg 失败时返回 {"error": stderr}。"""
+    frames_dir = seg_dir / "frames"
+    scene_dir = seg_dir / "frames_scene"
+    frames_dir.mkdir(parents=True, exist_ok=True)
+    decode_from = max(start - SEGMENT_PREROLL, 0.0)
+    # 本段第一个网格点；trim 之后 fps 滤镜的第 0 帧即落在该点
+    grid_start = float(math.ceil(start / interval - 1e-6) * interval)
+    interval_chain = (
+        f"trim=start={grid_start - decode_from:.6f},setpts=PTS-STARTPTS,"
+        f"fps=1/{interval}"
+    )
+    # fps 滤镜为网格点 t 输出 t + interval/2 之前的最后一帧，因此非末段要多
+    # 解码半个间隔；场景分支在段尾截断，不为这部分做场景检测
+    decode_to = end if last else end + interval / 2 + 0.1
+    scene_chain = "" if last else f"trim=end={end - decode_from:.6f},"
+    outputs = ["-map", "[iv]", *frame_format.ffmpeg_args()]
+    outputs.append(str(frames_dir / frame_format.pattern("frame")))
+    if threshold is None:
+        filter_graph = f"[0:v]{interval_chain}[iv]"
+    else:
+        scene_dir.mkdir(parents=True, exist_ok=True)
+        filter_graph = (
+            "[0:v]split=2[iv_in][sv_in];"
+            f"[iv_in]{interval_chain}[iv];"
+            f"[sv_in]{scene_chain}{scene_select(threshold)},showinfo[sv]"
+        )
+        outputs += [
+            "-map",
+            "[sv]",
+            "-vsync",
+            "vfr",
+            *frame_format.ffmpeg_args(),
+            str(scene_dir / frame_format.pattern("scene")),
+        ]
+    cmd = [
+        "ffmpeg",
+        "-threads",
+        str(threads),
+        "-ss",
+        f"{decode_from:.6f}",
+    ]
+    if not last:
+        cmd += ["-t", f"{decode_to - decode_from:.6f}"]
+    cmd += ["-i", str(video_path), "-filter_complex", filter_graph, *outputs, "-y"]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=1200)
+    except subprocess.TimeoutExpired:
+        raise CommandError(
+            f"分段 {start:.1f}–{end:.1f}s 的帧提取在 20 分钟后超时。"
+        ) from None
+    if result.returncode != 0:
+        return {"error": f"退出代码 {result.returncode}：{result.stderr[:500]}"}
+
+    interval_frames = sorted(frames_dir.glob(frame_format.glob("frame")))
+    if not last:
+        # 多解码的半个间隔可能产生属于下一段的网格点
+        expected = max(math.ceil((end - grid_start) / interval - 1e-6), 0)
+        for extra in interval_frames[expected:]:
+            extra.unlink()
+        interval_frames = interval_frames[:expected]
+    scene = []
+    if threshold is not None:
+        scene_frames, times = drop_scene_anchor(
+            sorted(scene_dir.glob(frame_format.glob("scene"))),
+            parse_showinfo_timestamps(result.stderr),
+        )
+        for frame, t in pair_frame_timestamps(scene_frames, times).items():
+            t = round(t + decode_from, 6)
+            # 预解码部分和段尾之后的场景帧由相邻的段负责
+            if t >= start - 1e-6 and (last or t < end):
+                scene.append((t, frame))
+    return {
+        "interval": [
+            (grid_start + i * interval, f) for i, f in enumerate(interval_frames)
+        ],
+        "scene": scene,
+    }
+
+
+@profiled("frames", items=_count_frame_lists)
+def extract_frames_segmented(
+    video_path: Path,
+    out_dir: Path,
+    interval: int = 30,
+    threshold: Optional[float] = None,
+    segments: int = 4,
+    duration: float = 0,
+    frame_format: FrameFormat = PNG_FRAMES,
+) -> tuple[list[Path], list[Path], dict[Path, float]]:
+    """把视频按关键帧分成 `segments` 段，每段由一个 ffmpeg 进程并行提取。
+
+    每个进程用输入端 -ss/-t 定位到自己的时间范围；scene 滤镜基本是单线程
+    的，分段后吞吐量随核数近似线性增长。各段结果按全局时间戳合并并重新
+    编号，与 `extract_frames_combined`（或 `extract_frames_interval`）的
+    输出格式一致。`threshold` 为 None 时只提取间隔帧。
+
+    返回 (间隔帧, 场景帧, {帧: 显示时间戳秒数})。
+    """
+    if not duration:
+        info = probe_video(video_path)
+        duration = info["duration"] if info else 0
+    if not duration:
+        print("[!] 无法确定视频时长，回退到单进程帧提取")
+        if threshold is None:
+            frames = extract_frames_interval(
+                video_path, out_dir, interval=interval, frame_format=frame_format
+            )
+            return frames, [], interval_frame_timestamps(frames, interval)
+        return extract_frames_combined(
+            video_path, out_dir, interval, threshold, frame_format=frame_format
+        )
+
+    keyframes = probe_keyframes(video_path)
+    if not keyframes:
+        print("[!] 无法读取关键帧（需要 ffprobe），按时长均分")
+    plan = plan_segments(duration, segments, keyframes)
+    threads = max(1, (os.cpu_count() or 1) // len(plan))
+    print(
+        f"[*] 正在分 {len(plan)} 段并行提取帧（每隔 {interval} 秒"
+        + (f" + 场景变化，阈值={threshold}" if threshold is not None else "")
+        + "）…"
+    )
+
+    work_dir = out_dir / ".segments"
+    shutil.rmtree(work_dir, ignore_errors=True)
+    try:
+        with ThreadPoolExecutor(max_workers=len(plan)) as pool:
+            results = list(
+                pool.map(
+                    lambda i: _extract_segment(
+                        video_path,
+                        work_dir / f"{i:03d}",
+                        *plan[i],
+                        i == len(plan) - 1,
+                        interval,
+                        threshold,
+                        threads,
+                        frame_format,
+                    ),
+                    range(len(plan)),
+                )
+            )
+        for (start, end), res in zip(plan, results):
+            if "error" in res:
+                raise CommandError(
+                    f"ffmpeg 分段 {start:.1f}–{end:.1f}s 提取失败（{res['error']}）"
+                )
+
+        # 按段顺序（即时间顺序）移入最终目录并全局编号
+        frames_dir = out_dir / "frames"
+        scene_dir = out_dir / "frames_scene"
+        frames_dir.mkdir(exist_ok=True)
+        interval_frames, scene_frames, frame_times = [], [], {}
+        for res in results:
+            for t, f in res["interval"]:
+                dest = frames_dir / frame_format.name("frame", len(interval_frames) + 1)
+                f.replace(dest)
+                interval_frames.append(dest)
+                frame_times[dest] = t
+        if threshold is not None:
+            scene_dir.mkdir(exist_ok=True)
+            for res in results:
+                for t, f in res["scene"]:
+                    dest = scene_dir / frame_format.name("scene", len(scene_frames) + 1)
+                    f.replace(dest)
+                    scene_frames.append(dest)
+                    frame_times[dest] = t
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not interval_frames:
+        print(
+            "[!] 警告：ffmpeg 运行了但没有产生帧。"
+            "视频可能太短或损坏。"
+        )
+    else:
+        print(f"    → 捕获了 {len(interval_frames)} 帧")
+    if threshold is not None:
+        if not scene_frames:
+            print("[!] 未检测到场景变化帧（尝试降低 --scene-threshold）。")
+        else:
+            print(f"    → 捕获了 {len(scene_frames)} 个场景变化帧")
+    return interval_frames, scene_frames, frame_times
+
+
+# ---------------------------------------------------------------------------
+# 自适应帧采样（--adaptive）
+# ---------------------------------------------------------------------------
+
+# 运动信号的缩略图尺寸：只解码关键帧并缩小为灰度图，开销远小于完整解码
+ADAPTIVE_SIGNAL_SIZE = (64, 36)
+# 低于该值的平均灰度差（0-255）视为压缩噪声，不计入画面变化
+ADAPTIVE_NOISE_FLOOR = 2.0
+# 与上一采样之间累计的画面变化低于该值时视为同一画面，不再采样
+ADAPTIVE_MIN_CHANGE = 4.0
+# 相邻采样的最小间隔（秒）
+ADAPTIVE_MIN_GAP = 2.0
+# 采样吸附到之后关键帧的最大距离（秒）
+ADAPTIVE_SNAP = 5.0
+# 每个 ffmpeg 进程最多提取的采样帧数：每帧一个 -ss 定位的输入，省去逐帧
+# 启动进程的开销，同时限制单个进程同时打开的解码器数量
+ADAPTIVE_BATCH = 16
+# 采样密度中均匀覆盖、画面变化和字幕提示词三部分的权重
+ADAPTIVE_WEIGHTS = {"base": 0.25, "motion": 0.6, "cue": 0.15}
+# 讲者提示观众看画面的字幕用语
+ADAPTIVE_CUE_WORDS = re.compile(
+    r"\b(look at|as you can see|notice|on (?:the|my) screen|"
+    r"this (?:slide|screen|example|diagram|code|layout|design)|"
+    r"let'?s (?:see|look)|for example|diagram|demo)\b"
+    r"|看(?:一下|这里|这个)|如图|注意",
+    re.IGNORECASE,
+)
+
+
+def motion_signal(video_path: Path) -> list[tuple[float, float]]:
+    """只解码关键帧并缩小为灰度缩略图，返回 [(时间戳, 与上一关键帧的平均
+    灰度差)]。ffmpeg 失败时返回空列表。"""
+    width, height = ADAPTIVE_SIGNAL_SIZE
+    cmd = [
+        "ffmpeg",
+        "-skip_frame",
+        "nokey",
+        "-i",
+        str(video_path),
+        "-vf",
+        f"scale={width}:{height},format=gray,showinfo",
+        "-vsync",
+        "vfr",
+        "-f",
+        "rawvideo",
+        "-",
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=600)
+    except subprocess.TimeoutExpired:
+        print("[!] 运动信号计算在 10 分钟后超时")
+        return []
+    stderr = result.stderr.decode("utf-8", errors="replace")
+    if result.returncode != 0:
+        print(f"[!] ffmpeg 运动信号计算失败（退出代码 {result.returncode}）：")
+        print(f"    {stderr[:500]}")
+        return []
+    size = width * height
+    times = parse_showinfo_timestamps(stderr)
+    n = min(len(times), len(result.stdout) // size)
+    if not n:
+        return []
+    thumbs = np.frombuffer(result.stdout, np.uint8)[: n * size].reshape(n, size)
+    diffs = np.abs(np.diff(thumbs.astype(np.int16), axis=0)).mean(axis=1)
+    return list(zip(times[:n], [0.0, *diffs.tolist()]))
+
+
+def plan_adaptive_samples(
+    duration: float,
+    budget: int,
+    signal: list[tuple[float, float]],
+    chapters: list[dict],
+    transcript: Optional[list[dict]] = None,
+) -> list[float]:
+    """在 `budget` 帧以内选择采样时间戳（秒，升序）。
+
+    每个章节起点必选；其余采样按采样密度的累计分布等面积放置。密度由
+    均匀覆盖、画面变化（`motion_signal`）和含提示词的字幕三部分加权组成，
+    变化多或讲者正指着画面讲解的片段得到更多帧。采样吸附到其后最近的
+    关键帧（画面已切换完成，定位也最快）；关键帧间隔较长时，画面变化
+    被均摊到整个间隔，采样则吸附到带来这次变化的关键帧上，不论距离多远。
+    与上一采样之间几乎没有画面变化的采样被丢弃，因此静态片段只保留一帧，
+    通常用不满预算。"""
+    bins = max(1, math.ceil(duration))
+    motion = [0.0] * bins
+    prev = 0.0
+    for t, diff in signal:
+        # 变化发生在上一关键帧与该关键帧之间，均摊到其间的每秒
+        lo, hi = min(int(prev), bins - 1), min(int(t), bins - 1)
+        for b in range(lo, hi + 1):
+            motion[b] += max(0.0, diff - ADAPTIVE_NOISE_FLOOR) / (hi - lo + 1)
+        prev = t
+    cue = [0.0] * bins
+    for e in transcript or ():
+        if ADAPTIVE_CUE_WORDS.search(e["text"]):
+            lo = min(int(e["start"]), bins - 1)
+            hi = min(int(e["start"] + e.get("duration", 0)), bins - 1)
+            for b in range(lo, hi + 1):
+                cue[b] += 1
+    density = [0.0] * bins
+    for name, part in (("base", [1.0] * bins), ("motion", motion), ("cue", cue)):
+        total = sum(part)
+        if total:
+            weight = ADAPTIVE_WEIGHTS[name] / total
+            density = [d + weight * p for d, p in zip(density, part)]
+
+    keyframes = [t for t, _ in signal]
+    changed = [
+        0.0,
+        *itertools.accumulate(max(0.0, d - ADAPTIVE_NOISE_FLOOR) for _, d in signal),
+    ]
+
+    def snap(t: float, follow_change: bool = True) -> float:
+        """吸附到 `t` 之后的关键帧：距离不超过 `ADAPTIVE_SNAP`，或
+        `follow_change` 时该关键帧带来了画面变化（密度中 t 所在的变化
+        正是它的）。"""
+        i = bisect.bisect_left(keyframes, t)
+        if i < len(keyframes) and (
+            keyframes[i] - t <= ADAPTIVE_SNAP
+            or (follow_change and changed[i + 1] > changed[i])
+        ):
+            return keyframes[i]
+        return round(float(t), 3)
+
+    def change(a: float, b: float) -> float:
+        """关键帧时间在 (a, b] 内的累计画面变化。"""
+        return (
+            changed[bisect.bisect_right(keyframes, b)]
+            - changed[bisect.bisect_right(keyframes, a)]
+        )
+
+    # 章节起点只做近距离吸附，不移到远处的画面变化上
+    starts = [ch.get("start_time", 0) for ch in chapters] if chapters else [0.0]
+    forced = sorted({snap(t, follow_change=False) for t in starts})
+    forced = [t for t in forced if t < duration]
+    if len(forced) >= budget:
+        return [forced[i * len(forced) // budget] for i in range(budget)]
+
+    cumulative = list(itertools.accumulate(density))
+    total, n = cumulative[-1], budget - len(forced)
+    samples = set(forced)
+    for k in range(n):
+        target = (k + 0.5) * total / n
+        b = min(bisect.bisect_left(cumulative, target), bins - 1)
+        before = cumulative[b] - density[b]
+        frac = (target - before) / density[b] if density[b] else 0.0
+        samples.add(snap(min(b + frac, duration)))
+
+    kept: list[float] = []
+    for t in sorted(samples):
+        if kept and t not in forced:
+            if t - kept[-1] < ADAPTIVE_MIN_GAP:
+                continue
+            if signal and change(kept[-1], t) < ADAPTIVE_MIN_CHANGE:
+                continue
+        elif kept and t - kept[-1] < ADAPTIVE_MIN_GAP and kept[-1] not in forced:
+            kept.pop()
+        kept.append(t)
+    return kept[:budget]
+
+
+def _extract_frames_at(
+    video_path: Path, batch: list[tuple[float, Path]], frame_format: FrameFormat
+) -> Optional[str]:
+    """用一个 ffmpeg 进程提取 `batch` 中的每个 (时间戳, 目标文件)：每个
+    时间戳是一个输入端 -ss 定位的输入，只解码到该时间戳输出一帧。
+    成功时返回 None，否则返回错误信息。"""
+    cmd = ["ffmpeg"]
+    for t, _ in batch:
+        cmd += ["-ss", f"{t:.3f}", "-i", str(video_path)]
+    for i, (_, dest) in enumerate(batch):
+        cmd += ["-map", f"{i}:v:0", "-frames:v", "1", *frame_format.ffmpeg_args()]
+        cmd.append(str(dest))
+    cmd.append("-y")
+    try:
+        result = subprocess.run(
+            cmd, capture_output=True, text=True, timeout=120 * len(batch)
+        )
+    except subprocess.TimeoutExpired:
+        return "超时"
+    if result.returncode != 0 or not all(dest.exists() for _, dest in batch):
+        return f"退出代码 {result.returncode}：{result.stderr[-300:]}"
+    return None
+
+
+@profiled("frames", items=_count_frame_lists)
+def extract_frames_at(
+    video_path: Path,
+    out_dir: Path,
+    times: list[float],
+    frame_format: FrameFormat = PNG_FRAMES,
+) -> tuple[list[Path], dict[Path, float]]:
+    """在每个时间戳提取一帧到 frames/，编号与时间顺序一致。时间戳按
+    CPU 数分批，每批由一个 ffmpeg 进程逐个快速定位提取（每批最多
+    `ADAPTIVE_BATCH` 帧），各批并行；因此进程数约为
+    max(CPU 数, 帧数 / ADAPTIVE_BATCH)，而不是每帧一个。任一批提取失败时
+    抛出 `CommandError`（缺帧的结果不能作为完成的帧阶段）。
+
+    返回 (帧列表, {帧: 时间戳秒数})。"""
+    frames_dir = out_dir / "frames"
+    frames_dir.mkdir(exist_ok=True)
+    dests = [frames_dir / frame_format.name("frame", i + 1) for i in range(len(times))]
+    workers = max(1, min(len(times), os.cpu_count() or 1))
+    size = min(ADAPTIVE_BATCH, math.ceil(len(times) / workers))
+    pairs = list(zip(times, dests))
+    batches = [pairs[i : i + size] for i in range(0, len(pairs), size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        errors = list(
+            pool.map(
+                lambda batch: _extract_frames_at(video_path, batch, frame_format),
+                batches,
+            )
+        )
+    failed = [(batch, error) for batch, error in zip(batches, errors) if error]
+    if failed:
+        batch, error = failed[0]
+        raise CommandError(
+            f"{len(failed)}/{len(batches)} 批帧提取失败，例如 "
+            f"{fmt_timestamp(batch[0][0])}–{fmt_timestamp(batch[-1][0])}："
+            f"{error.strip()}"
+        )
+    print(f"    → 捕获了 {len(dests)} 帧")
+    return dests, dict(zip(dests, times))
+
+
+def extract_frames_adaptive(
+    video_path: Path,
+    out_dir: Path,
+    meta: dict,
+    transcript: Optional[list[dict]],
+    interval: int = 30,
+    budget: Optional[int] = None,
+    frame_format: FrameFormat = PNG_FRAMES,
+) -> tuple[list[Path], dict[Path, float]]:
+    """按章节、字幕提示词和低分辨率运动信号选择时间戳（见
+    `plan_adaptive_samples`），再逐帧快速定位提取。`budget` 默认为固定
+    间隔采样的帧数。返回 (帧列表, {帧: 时间戳秒数})。"""
+    duration = meta.get("duration") or (probe_video(video_path) or {}).get("duration")
+    if not duration:
+        print("[!] 无法确定视频时长，回退到固定间隔采样")
+        frames = extract_frames_interval(
+            video_path, out_dir, interval=interval, frame_format=frame_format
+        )
+        return frames, interval_frame_timestamps(frames, interval)
+    fixed = max(1, math.ceil(duration / interval))
+    budget = budget or fixed
+    print("[*] 正在计算运动信号（只解码关键帧）…")
+    signal = motion_signal(video_path)
+    if not signal:
+        print("[!] 没有运动信号，只按章节、字幕和均匀覆盖采样")
+    times = plan_adaptive_samples(
+        duration, budget, signal, meta.get("chapters") or [], transcript
+    )
+    print(
+        f"[*] 自适应采样：选择了 {len(times)} 个时间点"
+        f"（预算 {budget} 帧，固定间隔需要 {fixed} 帧）"
+    )
+    return extract_frames_at(video_path, out_dir, times, frame_format)
+
+
+# ---------------------------------------------------------------------------
+# 内存帧管道
+# ---------------------------------------------------------------------------
+
+
+def probe_video(video_path: Path) -> dict | None:
+    """使用 ffprobe 读取第一条视频流的宽、高和时长。失败时返回 None。"""
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "stream=width,height:format=duration",
+        "-of",
+        "json",
+        str(video_path),
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        info = json.loads(result.stdout)
+        stream = info["streams"][0]
+        return {
+            "width": int(stream["width"]),
+            "height": int(stream["height"]),
+            "duration": float(info.get("format", {}).get("duration") or 0),
+        }
+    except (OSError, subprocess.TimeoutExpired, ValueError, KeyError, IndexError):
+        return None
+
+
+def _read_exact(stream, view: memoryview) -> int:
+    """从管道读满 `view`，返回实际读取的字节数（EOF 时可能不足）。"""
+    total = 0
+    while total < len(view):
+        n = stream.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+
+def _drain_stderr(proc: subprocess.Popen, sink: list[str]) -> threading.Thread:
+    """在后台线程中读取 stderr，避免 showinfo 输出填满管道导致死锁。"""
+
+    def _run():
+        for line in iter(proc.stderr.readline, b""):
+            sink.append(line.decode("utf-8", "replace"))
+
+    t = threading.Thread(target=_run, daemon=True)
+    t.start()
+    return t
+
+
+def _process_raw_frame(
+    frame,
+    frame_path: Path,
+    engine: Optional[EngineSpec],
+    palette_engine: Optional[EngineSpec],
+    cache: Optional["DiskCache"] = None,
+    text_threshold: Optional[float] = None,
+    frame_format: FrameFormat = PNG_FRAMES,
+):
+    """在内存中对单帧运行 OCR / 调色板，然后仅编码一次写入磁盘。
+    返回 (文本, 调色板结果, 是否被文本预筛选跳过)。"""
+    text = ""
+    skipped = False
+    key = ocr_cache_key(frame, engine) if engine and cache else None
+    cached = cache.get(key) if key else None
+    if cached is not None:
+        text = cached
+    elif engine and text_threshold is not None:
+        skipped = float(text_scores([frame])[0]) < text_threshold
+    if engine and cached is None and not skipped:
+        with engine_lock(engine):
+            text = engine.ocr_frame(frame, label=frame_path)
+        if text is None:
+            # 识别失败：不写入缓存，下次运行重试
+            text = ""
+        elif key:
+            cache.put(key, text)
+    palette = None
+    if palette_engine:
+        palette = palette_engine.analyze_frame(frame, label=frame_path)
+    frame_format.save(Image.fromarray(frame), frame_path)
+    return text, palette, skipped
+
+
+def stream_frame_size(meta: dict) -> tuple[int, int] | None:
+    """根据元数据推算管道输入的帧尺寸：高度不超过 720，宽度为偶数。"""
+    width, height = meta.get("width"), meta.get("height")
+    if not width or not height:
+        return None
+    out_h = min(720, int(height))
+    out_w = int(round(width * out_h / height / 2)) * 2
+    return out_w, out_h - out_h % 2
+
+
+@profiled("frames", items=lambda r, *a, **k: len(r["interval_frames"]))
+def stream_frames_interval(
+    video_path: VideoSource,
+    out_dir: Path,
+    interval: int = 30,
+    scene_threshold: Optional[float] = None,
+    ocr_engine: Optional[str] = None,
+    palette_engine: Optional[EngineSpec] = None,
+    workers: int = 4,
+    frame_size: Optional[tuple[int, int]] = None,
+    duration: float = 0,
+    cache: Optional["DiskCache"] = None,
+    text_threshold: Optional[float] = None,
+    frame_format: FrameFormat = PNG_FRAMES,
+    ocr_options: Optional[OcrOptions] = None,
+    ocr_daemon: Optional["OcrDaemonClient"] = None,
+) -> dict | None:
+    """以 rawvideo 管道读取间隔帧，在内存中完成 OCR 和调色板分析。
+
+    ffmpeg 将 RGB24 帧写到 stdout，帧被读入一组可复用的 NumPy 缓冲区后
+    直接交给 OCR / 调色板阶段，省去每帧的 PNG 编码-解码往返；只有
+    Markdown 引用的帧会被编码写入 frames/；提供 `cache` 时 OCR 先查缓存，
+    提供 `text_threshold` 时跳过文本得分低于阈值的帧；OCR 引擎按
+    `ocr_options` 和 `ocr_daemon` 加载（见 `load_engine`）。
+    指定 `scene_threshold` 时，场景帧在同一次解码中通过 split 滤镜写入
+    frames_scene/。
+
+    管道输入无法预先探测，此时需要传入 `frame_size`（宽, 高），帧会被
+    缩放到该尺寸以保证缓冲区大小固定；`duration` 用于均匀采样调色板帧
+    （仅当调色板引擎只采样部分帧时）。
+
+    返回包含 interval_frames、scene_frames、frame_times、ocr_results 和
+    palette_stats（{帧: 调色板引擎的单帧结果}）的字典；无法确定帧尺寸时返回 None，由调用方回退到
+    基于文件的提取。ffmpeg 失败时抛出 `CommandError`。
+    """
+    if frame_size:
+        width, height = frame_size
+    else:
+        info = None
+        if not isinstance(video_path, VideoStream):
+            info = probe_video(video_path)
+        if not info:
+            print("[!] 无法探测视频尺寸，回退到基于文件的帧提取")
+            return None
+        width, height = info["width"], info["height"]
+        duration = duration or info["duration"]
+    frame_bytes = width * height * 3
+    # 显式缩放保证每帧恰好 width*height*3 字节
+    interval_chain = f"fps=1/{interval},scale={width}:{height}"
+
+    frames_dir = out_dir / "frames"
+    frames_dir.mkdir(exist_ok=True)
+    raw_out = ["-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+    if scene_threshold is not None:
+        scene_dir = out_dir / "frames_scene"
+        scene_dir.mkdir(exist_ok=True)
+        filter_graph = (
+            "[0:v]split=2[iv_in][sv_in];"
+            f"[iv_in]{interval_chain}[iv];"
+            f"[sv_in]{scene_select(scene_threshold)},showinfo[sv]"
+        )
+        cmd = ["ffmpeg", *ffmpeg_input_args(video_path)]
+        cmd += ["-filter_complex", filter_graph, "-map", "[iv]", *raw_out]
+        cmd += ["-map", "[sv]", "-vsync", "vfr", *frame_format.ffmpeg_args()]
+        cmd.append(str(scene_dir / frame_format.pattern("scene")))
+    else:
+        cmd = ["ffmpeg", *ffmpeg_input_args(video_path)]
+        cmd += ["-vf", interval_chain, *raw_out]
+    cmd.append("-y")
+
+    engine = None
+    if ocr_engine:
+        engine = load_engine("ocr", ocr_engine, ocr_options, ocr_daemon)
+    if engine and not engine.thread_safe:
+        workers = 1
+
+    palette_step = 1
+    if palette_engine and palette_engine.sample_frames and duration:
+        expected = int(duration // interval) + 1
+        palette_step = max(1, expected // palette_engine.sample_frames)
+
+    print(f"[*] 正在以内存帧流每隔 {interval} 秒提取帧（{width}x{height}）…")
+    proc = subprocess.Popen(
+        cmd,
+        stdin=ffmpeg_stdin(video_path) or subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stderr_lines: list[str] = []
+    stderr_thread = _drain_stderr(proc, stderr_lines)
+
+    # 可复用缓冲区池：读取端阻塞在空闲队列上，为解码提供背压
+    free_buffers: queue.Queue = queue.Queue()
+    for _ in range(workers + 2):
+        free_buffers.put(np.empty((height, width, 3), dtype=np.uint8))
+
+    interval_frames: list[Path] = []
+    ocr_results: dict[Path, str] = {}
+    palette_stats: dict[Path, object] = {}
+    text_skipped = 0
+    futures = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            buf = free_buffers.get()
+            if _read_exact(proc.stdout, memoryview(buf).cast("B")) < frame_bytes:
+                break
+            idx = len(interval_frames)
+            frame_path = frames_dir / frame_format.name("frame", idx + 1)
+            interval_frames.append(frame_path)
+            future = executor.submit(
+                in_context(_process_raw_frame),
+                buf,
+                frame_path,
+                engine,
+                palette_engine if idx % palette_step == 0 else None,
+                cache,
+                text_threshold,
+                frame_format,
+            )
+            future.add_done_callback(lambda _f, b=buf: free_buffers.put(b))
+            futures[future] = frame_path
+        for future in as_completed(futures):
+            frame_path = futures[future]
+            try:
+                text, palette, skipped = future.result()
+            except Exception as e:
+                print(f"[!] {frame_path} 的帧处理失败：{e}")
+                text, palette, skipped = "", None, False
+            text_skipped += skipped
+            if engine:
+                ocr_results[frame_path] = text
+            if palette is not None:
+                palette_stats[frame_path] = palette
+
+    proc.stdout.close()
+    returncode = proc.wait()
+    stderr_thread.join(timeout=5)
+    stderr = "".join(stderr_lines)
+    if returncode != 0:
+        # 已读到的帧和 OCR 结果不完整，不能交给后续阶段记录
+        raise CommandError(f"ffmpeg 帧提取失败（退出代码 {returncode}）：\n{stderr[:500]}")
+
+    frame_times = interval_frame_timestamps(interval_frames, interval)
+    print(f"    → 捕获了 {len(interval_frames)} 帧")
+    scene_frames: list[Path] = []
+    if scene_threshold is not None:
+        scene_frames, scene_times = drop_scene_anchor(
+            sorted((out_dir / "frames_scene").glob(frame_format.glob("scene"))),
+            parse_showinfo_timestamps(stderr),
+        )
+        if scene_frames:
+            print(f"    → 捕获了 {len(scene_frames)} 个场景变化帧")
+            frame_times.update(pair_frame_timestamps(scene_frames, scene_times))
+        else:
+            print("[!] 未检测到场景变化帧（尝试降低 --scene-threshold）。")
+    if engine:
+        if text_threshold is not None:
+            print(
+                f"    → 文本预筛选跳过 {text_skipped}/{len(interval_frames)} 帧的 OCR"
+            )
+        with_text = sum(1 for t in ocr_results.values() if len(t) > 10)
+        print(f"    → 在 {with_text}/{len(interval_frames)} 帧中发现文本")
+
+    return {
+        "interval_frames": interval_frames,
+        "scene_frames": scene_frames,
+        "frame_times": frame_times,
+        "ocr_results": ocr_results,
+        "palette_stats": palette_stats,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 打包帧存储（--frame-store）
+# ---------------------------------------------------------------------------
+
+# 打包存储的帧宽度：去重、文本预筛选和调色板统计都在不超过该宽度的图像上
+# 进行；OCR 需要全分辨率，仍读取单独的帧文件
+FRAME_STORE_WIDTH = 640
+
+
+class FrameStore:
+    """把所有帧缩小后打包进单个 .npy 数组文件，附带按时间排序的索引。
+
+    frames.npy 是形状为 (N, 高, 宽, 3) 的 uint8 数组，以内存映射方式打开，
+    后续阶段和重复运行可以直接切片，无需逐个打开和解码数千个图像文件；
+    frames-index.json 记录每行对应的帧文件（相对路径）和时间戳（行按
+    时间戳排序，按时间顺序处理的阶段顺序读取数组），以及产生这些帧的
+    帧阶段运行（清单中的 `run_id`）。"""
+
+    ARRAY = "frames.npy"
+    INDEX = "frames-index.json"
+
+    def __init__(self, out_dir: Path, index: dict, array: "np.ndarray"):
+        self.out_dir = out_dir
+        self.width = index["width"]
+        self.frames = [out_dir / f for f in index["frames"]]
+        self.times = index["times"]
+        self.array = array
+        self._rows = {f: i for i, f in enumerate(self.frames)}
+
+    @classmethod
+    def build(
+        cls,
+        out_dir: Path,
+        frames: list[Path],
+        frame_times: dict[Path, float],
+        width: int = FRAME_STORE_WIDTH,
+        run_id: Optional[str] = None,
+    ) -> Optional["FrameStore"]:
+        """解码每帧一次，缩小到 `width` 宽后写入内存映射数组。
+        `run_id` 标识产生这些帧的帧阶段运行，供 `open` 判断存储是否过期。"""
+        if not frames:
+            return None
+        # 无时间戳的帧排在最后
+        ordered = sorted(frames, key=lambda f: frame_times.get(f, float("inf")))
+        with Image.open(ordered[0]) as img:
+            src_w, src_h = img.size
+        scale = min(1.0, width / src_w)
+        size = (round(src_w * scale), round(src_h * scale))
+        print(f"[*] 正在打包 {len(ordered)} 帧（{size[0]}x{size[1]}）→ {cls.ARRAY}")
+        array = np.lib.format.open_memmap(
+            out_dir / cls.ARRAY,
+            mode="w+",
+            dtype=np.uint8,
+            shape=(len(ordered), size[1], size[0], 3),
+        )
+        for i, frame in enumerate(ordered):
+            img = Image.open(frame)
+            img.draft("RGB", size)
+            img = img.convert("RGB")
+            if img.size != size:
+                img = img.resize(size, Image.BILINEAR)
+            array[i] = np.asarray(img)
+        array.flush()
+        index = {
+            "width": width,
+            "run_id": run_id,
+            "frames": [os.path.relpath(f, out_dir) for f in ordered],
+            "times": [frame_times.get(f) for f in ordered],
+        }
+        (out_dir / cls.INDEX).write_text(json.dumps(index, indent=1), encoding="utf-8")
+        return cls(out_dir, index, np.load(out_dir / cls.ARRAY, mmap_mode="r"))
+
+    @classmethod
+    def open(
+        cls,
+        out_dir: Path,
+        frames: list[Path],
+        width: int = FRAME_STORE_WIDTH,
+        run_id: Optional[str] = None,
+    ) -> Optional["FrameStore"]:
+        """打开已有的存储；与当前帧列表、宽度或帧阶段运行不一致时返回 None。
+        帧文件名只由序号决定：以不同参数（例如新的 --frame-format）重新提取
+        的同名帧必须按 `run_id` 识别。"""
+        try:
+            index = json.loads((out_dir / cls.INDEX).read_text(encoding="utf-8"))
+            array = np.load(out_dir / cls.ARRAY, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if index.get("width") != width or len(index.get("frames", ())) != len(array):
+            return None
+        if run_id is None or index.get("run_id") != run_id:
+            return None
+        expected = {os.path.relpath(f, out_dir) for f in frames}
+        if set(index["frames"]) != expected:
+            return None
+        return cls(out_dir, index, array)
+
+    def __contains__(self, frame: Path) -> bool:
+        return frame in self._rows
+
+    def __getitem__(self, frame: Path) -> "np.ndarray":
+        return self.array[self._rows[frame]]
+
+    def images(self, frames: list[Path]) -> list:
+        """按 `frames` 的顺序返回存储中的数组；不在存储中的帧保留为路径。"""
+        return [self[f] if f in self._rows else f for f in frames]
+
+
+# ---------------------------------------------------------------------------
+# 帧去重（感知哈希）
+# ---------------------------------------------------------------------------
+
+HASH_METHODS = ("dhash", "phash")
+
+
+def _load_gray_stack(frames: list, size: tuple[int, int]) -> "np.ndarray":
+    """把帧缩小为 `size`（宽, 高）的灰度图并堆叠为 (N, 高, 宽) 的 float32 数组。
+    帧可以是图像路径或内存中的 RGB 数组。"""
+    stack = np.empty((len(frames), size[1], size[0]), dtype=np.float32)
+    for i, frame in enumerate(frames):
+        if isinstance(frame, (str, Path)):
+            img = Image.open(frame)
+            # JPEG 等格式可在解码时直接缩小，避免解码全分辨率
+            img.draft("L", (size[0] * 4, size[1] * 4))
+        else:
+            img = Image.fromarray(frame)
+        stack[i] = np.asarray(img.convert("L").resize(size, Image.BILINEAR))
+    return stack
+
+
+def _dct_matrix(n: int) -> "np.ndarray":
+    """n 点 DCT-II 变换矩阵，用于批量计算二维 DCT（C @ X @ C.T）。"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * x + 1) * k / (2 * n)).astype(np.float32)
+
+
+def compute_frame_hashes(frames: list, method: str = "dhash") -> "np.ndarray":
+    """计算每帧的 64 位感知哈希，返回 uint64 数组。
+
+    dhash：9x8 灰度图中相邻像素的水平梯度符号。
+    phash：32x32 灰度图二维 DCT 左上 8x8 低频系数与其中位数比较。
+    两者都对整批帧做向量化计算。"""
+    if not frames:
+        return np.empty(0, dtype=np.uint64)
+    if method == "phash":
+        stack = _load_gray_stack(frames, (32, 32))
+        c = _dct_matrix(32)
+        low = (c @ stack @ c.T)[:, :8, :8].reshape(len(frames), 64)
+        bits = low > np.median(low, axis=1, keepdims=True)
+    else:
+        stack = _load_gray_stack(frames, (9, 8))
+        bits = (stack[:, :, 1:] > stack[:, :, :-1]).reshape(len(frames), 64)
+    return np.packbits(bits, axis=1).view(">u8").astype(np.uint64).ravel()
+
+
+def hamming_distances(value: "np.uint64", hashes: "np.ndarray") -> "np.ndarray":
+    """一个哈希与一组哈希之间的汉明距离（向量化 popcount）。"""
+    xor = np.bitwise_xor(hashes, value)
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+@profiled("dedup", items=_count_input_frames)
+def dedupe_frames(
+    frames: list[Path],
+    threshold: int = 6,
+    method: str = "dhash",
+    store: Optional[FrameStore] = None,
+) -> dict[Path, Path]:
+    """将近似相同的帧折叠到同一代表帧。
+
+    按顺序遍历帧，若与任一已有代表帧的哈希汉明距离不超过 `threshold`，
+    则映射到最近的代表帧，否则成为新的代表帧。返回 {帧: 代表帧}，
+    代表帧映射到自身。提供 `store` 时从打包存储读取帧。"""
+    if not frames:
+        return {}
+    print(f"[*] 正在计算 {len(frames)} 帧的感知哈希（{method}）…")
+    hashes = compute_frame_hashes(store.images(frames) if store else frames, method)
+    rep_hashes = np.empty(len(frames), dtype=np.uint64)
+    rep_frames: list[Path] = []
+    mapping: dict[Path, Path] = {}
+    for frame, value in zip(frames, hashes):
+        if rep_frames:
+            dists = hamming_distances(value, rep_hashes[: len(rep_frames)])
+            best = int(dists.argmin())
+            if dists[best] <= threshold:
+                mapping[frame] = rep_frames[best]
+                continue
+        rep_hashes[len(rep_frames)] = value
+        rep_frames.append(frame)
+        mapping[frame] = frame
+    print(f"    → {len(frames)} 帧去重为 {len(rep_frames)} 个代表帧")
+    return mapping
+
+
+# ---------------------------------------------------------------------------
+# 文本预筛选
+# ---------------------------------------------------------------------------
+
+# 评分前把帧缩放到的宽度：720p 中常见的 20-30px 字号缩放后笔画约 1-3px
+TEXT_SCORE_WIDTH = 640
+# 视为笔画边缘的最小灰度跳变（0-255）
+TEXT_EDGE_MIN = 40
+# 笔画的最大宽度（缩放后像素）：两侧边缘方向相反且间距不超过该值
+TEXT_STROKE_MAX = 4
+# 每批评分的帧数，限制缩放后灰度栈的内存占用
+TEXT_SCORE_BATCH = 32
+# --text-threshold 的默认值（‰）：一行 28px 字幕约 1.6‰，人脸和纯色画面为 0
+TEXT_SCORE_THRESHOLD = 0.5
+
+
+def _stroke_pairs(diff: "np.ndarray", axis: int) -> "np.ndarray":
+    """沿 `axis` 标记“上升沿后很快出现下降沿”（或相反）的位置，即笔画。"""
+    rise = diff > TEXT_EDGE_MIN
+    fall = diff < -TEXT_EDGE_MIN
+    n = diff.shape[axis]
+    pairs = np.zeros_like(rise)
+    for w in range(1, min(TEXT_STROKE_MAX, n - 1) + 1):
+        head = [slice(None)] * diff.ndim
+        tail = [slice(None)] * diff.ndim
+        head[axis] = slice(0, n - w)
+        tail[axis] = slice(w, n)
+        head, tail = tuple(head), tuple(tail)
+        pairs[head] |= (rise[head] & fall[tail]) | (fall[head] & rise[tail])
+    return pairs
+
+
+def text_scores(frames: list) -> "np.ndarray":
+    """估计每帧含有文本的可能性，返回 float32 数组（笔画边缘对的密度，‰）。
+
+    文字由大量宽度只有几个像素的笔画组成，笔画两侧是方向相反的强边缘；
+    人脸、渐变和大色块只有孤立的边缘。在缩小的灰度图上沿水平和垂直方向
+    向量化地统计这种边缘对，开销远小于一次 OCR。"""
+    if not frames:
+        return np.empty(0, dtype=np.float32)
+    first = frames[0]
+    if isinstance(first, (str, Path)):
+        with Image.open(first) as img:
+            width, height = img.size
+    else:
+        height, width = first.shape[:2]
+    scale = min(1.0, TEXT_SCORE_WIDTH / width)
+    size = (max(2, round(width * scale)), max(2, round(height * scale)))
+    scores = np.empty(len(frames), dtype=np.float32)
+    for i in range(0, len(frames), TEXT_SCORE_BATCH):
+        stack = _load_gray_stack(frames[i : i + TEXT_SCORE_BATCH], size)
+        horizontal = _stroke_pairs(np.diff(stack, axis=2), axis=2)
+        vertical = _stroke_pairs(np.diff(stack, axis=1), axis=1)
+        density = (horizontal.mean(axis=(1, 2)) + vertical.mean(axis=(1, 2))) / 2
+        scores[i : i + TEXT_SCORE_BATCH] = density * 1000
+    return scores
+
+
+@profiled("ocr", items=_count_input_frames)
+def prefilter_text_frames(
+    frames: list, threshold: float, store: Optional["FrameStore"] = None
+) -> tuple[list, list]:
+    """按 `text_scores` 把帧分为 (需要 OCR 的帧, 跳过的帧)。
+    提供 `store` 时从打包存储读取帧。"""
+    scores = text_scores(store.images(frames) if store else frames)
+    keep = [f for f, s in zip(frames, scores) if s >= threshold]
+    skipped = [f for f, s in zip(frames, scores) if s < threshold]
+    return keep, skipped
+
+
+# ---------------------------------------------------------------------------
+# 持久化缓存
+# ---------------------------------------------------------------------------
+
+
+def default_cache_dir() -> Path:
+    """跨运行共享的缓存目录：$XDG_CACHE_HOME/yt-design-extractor。"""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "yt-design-extractor"
+
+
+class DiskCache:
+    """基于 SQLite 的持久化字符串键值缓存，按总大小做 LRU 淘汰。
+
+    命中只在内存中记下最近使用时间，在下次写入、关闭或累计 `TOUCH_BATCH`
+    次命中时一次性写回，读路径不必每次提交事务；写入后若总大小超过
+    `max_bytes`，按最近使用时间从旧到新删除条目。总大小在打开时统计一次，
+    之后随写入累加；其他进程的写入不计入，因此超限时先重新统计再淘汰。
+    WAL 模式允许多个进程同时读写同一个缓存文件。"""
+
+    TOUCH_BATCH = 256
+
+    def __init__(self, path: Path, max_bytes: int = 256 * 1024 * 1024):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 尚未写回的命中：{键: 最近使用时间}
+        self._touched: dict[str, float] = {}
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)"
+        )
+        self._conn.commit()
+        self._total = self._stored_size()
+
+    def _stored_size(self) -> int:
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.TOUCH_BATCH:
+                self._flush_touched()
+                self._conn.commit()
+            return row[0]
+
+    def _flush_touched(self) -> None:
+        """把累计的命中时间写回（由调用方提交）。"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE entries SET last_used = ? WHERE key = ?",
+                [(t, key) for key, t in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def put(self, key: str, value: str) -> None:
+        size = len(key) + len(value.encode("utf-8"))
+        with self._lock:
+            # 淘汰按最近使用时间排序，先写回累计的命中
+            self._flush_touched()
+            old = self._conn.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_used)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._total += size - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._stored_size()
+        self._total = total
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_used"
+        ):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+        self._total = total
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+
+class MemoryCache:
+    """与 `DiskCache` 接口相同的进程内 LRU 缓存。用作不需要持久化时或
+    离线测试时的替身后端（例如预先填入元数据，完全不访问网络）。"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._size = 0
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(key) + len(old.encode("utf-8"))
+            self._entries[key] = value
+            self._size += len(key) + len(value.encode("utf-8"))
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                stale, text = self._entries.popitem(last=False)
+                self._size -= len(stale) + len(text.encode("utf-8"))
+
+    def close(self) -> None:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# 元数据 / 字幕缓存
+# ---------------------------------------------------------------------------
+
+META_CACHE_FILE = "meta-cache.sqlite3"
+
+
+class MetadataCache:
+    """按视频 ID 缓存 yt-dlp 元数据和字幕条目，超过 `ttl` 秒的条目视为过期。
+
+    `store` 是 `DiskCache`（跨运行、跨进程共享，按大小 LRU 淘汰）或接口
+    相同的替身后端（如 `MemoryCache`）。条目连同获取时间一起以 JSON 存储；
+    过期条目在下次获取成功后被覆盖。"""
+
+    def __init__(self, store, ttl: float):
+        self.store = store
+        self.ttl = ttl
+
+    def get(self, kind: str, video_id: str):
+        """返回未过期的缓存值；未命中或已过期时返回 None。"""
+        raw = self.store.get(f"{kind}:{video_id}")
+        if raw is None:
+            return None
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            return None
+        if time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        return entry["value"]
+
+    def put(self, kind: str, video_id: str, value) -> None:
+        entry = {"fetched_at": time.time(), "value": value}
+        self.store.put(
+            f"{kind}:{video_id}", json.dumps(entry, ensure_ascii=False, default=str)
+        )
+
+    def close(self) -> None:
+        self.store.close()
+
+
+# ---------------------------------------------------------------------------
+# OCR 预处理（--ocr-preprocess）
+# ---------------------------------------------------------------------------
+
+# Tesseract 在大写字母高约 30px 时准确率最好；更大的文字缩小到该行高不损失
+# 准确率，而识别耗时大致与像素数成正比
+OCR_TARGET_LINE_HEIGHT = 40
+OCR_SCALE_RANGE = (0.25, 2.0)
+
+
+def _runs(flags: "np.ndarray", max_gap: int) -> list[tuple[int, int]]:
+    """返回布尔序列中为真的区间 [start, end)，间隔不超过 `max_gap` 的区间合并。"""
+    idx = np.flatnonzero(flags)
+    if not len(idx):
+        return []
+    breaks = np.flatnonzero(np.diff(idx) > max_gap + 1)
+    starts = np.concatenate(([idx[0]], idx[breaks + 1]))
+    ends = np.concatenate((idx[breaks], [idx[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def find_text_regions(gray: "np.ndarray") -> list[tuple[int, int, int, int]]:
+    """在灰度帧中定位文本行，返回 (x0, y0, x1, y1) 列表（按阅读顺序）。
+
+    在缩小的图像上标记竖直笔画（见 `_stroke_pairs`），按行投影得到文本行
+    带，再在每个行带内按列投影切分，间隔大于行高的列视为不同的文本块。"""
+    height, width = gray.shape
+    scale = min(1.0, TEXT_SCORE_WIDTH / width)
+    small_size = (max(2, round(width * scale)), max(2, round(height * scale)))
+    small = np.asarray(
+        Image.fromarray(gray).resize(small_size, Image.BILINEAR), dtype=np.float32
+    )
+    strokes = _stroke_pairs(np.diff(small, axis=1), axis=1)
+    regions = []
+    for top, bottom in _runs(strokes.sum(axis=1) >= 2, max_gap=1):
+        band = bottom - top
+        if band < 3:
+            continue
+        for left, right in _runs(strokes[top:bottom].any(axis=0), max_gap=band):
+            if right - left < band:
+                continue
+            pad = band // 3 + 1
+            regions.append(
+                (
+                    max(0, int((left - pad) / scale)),
+                    max(0, int((top - pad) / scale)),
+                    min(width, int((right + pad) / scale) + 1),
+                    min(height, int((bottom + pad) / scale) + 1),
+                )
+            )
+    return regions
 
 
-def extract_color_palette(frame_path: Path, color_count: int = 6) -> list[tuple]:
-    """从帧中提取主要颜色。返回 RGB 元组列表。"""
+def otsu_threshold(gray: "np.ndarray") -> int:
+    """Otsu 阈值：使前景 / 背景类间方差最大的灰度级（直方图上向量化计算）。"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    omega = np.cumsum(hist) / hist.sum()
+    mu = np.cumsum(hist * np.arange(256)) / hist.sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mu[-1] * omega - mu) ** 2 / (omega * (1 - omega))
+    return int(np.nanargmax(between)) if np.isfinite(between).any() else 127
+
+
+def binarize(gray: "np.ndarray") -> "np.ndarray":
+    """Otsu 二值化，统一输出白底黑字（Tesseract 对深色文字最可靠）。"""
+    ink = gray > otsu_threshold(gray)
+    # 文字笔画占的像素少于背景：占多数的一侧是背景
+    if ink.mean() > 0.5:
+        ink = ~ink
+    return np.where(ink, 0, 255).astype(np.uint8)
+
+
+def preprocess_for_ocr(gray: "np.ndarray") -> Optional["np.ndarray"]:
+    """裁出文本区域，按行高缩放到 `OCR_TARGET_LINE_HEIGHT` 并二值化，
+    再按阅读顺序竖直拼接为一张图，只调用一次 OCR 引擎。
+    未检测到文本区域时返回 None，由调用方识别整帧。"""
+    regions = find_text_regions(gray)
+    if not regions:
+        return None
+    low, high = OCR_SCALE_RANGE
+    crops = []
+    for x0, y0, x1, y1 in regions:
+        # 区域含上下各约 1/3 行高的留白
+        line_height = (y1 - y0) * 3 / 5
+        scale = min(high, max(low, OCR_TARGET_LINE_HEIGHT / line_height))
+        crop = Image.fromarray(gray[y0:y1, x0:x1])
+        size = (max(1, round(crop.width * scale)), max(1, round(crop.height * scale)))
+        crops.append(binarize(np.asarray(crop.resize(size, Image.BILINEAR))))
+    gap = OCR_TARGET_LINE_HEIGHT // 2
+    height = sum(c.shape[0] for c in crops) + gap * (len(crops) + 1)
+    width = max(c.shape[1] for c in crops) + 2 * gap
+    canvas = np.full((height, width), 255, dtype=np.uint8)
+    y = gap
+    for crop in crops:
+        canvas[y : y + crop.shape[0], gap : gap + crop.shape[1]] = crop
+        y += crop.shape[0] + gap
+    return canvas
+
+
+# ---------------------------------------------------------------------------
+# OCR 提取
+# ---------------------------------------------------------------------------
+
+TESSERACT_CONFIG = "--psm 6"
+# 每个工作线程 / 进程最多在途的任务数：保持工作者忙碌，同时限制排队的任务和
+# 尚未消费的结果占用的内存
+OCR_IN_FLIGHT = 2
+
+
+def bounded_map(executor, fn: Callable, items: Iterable, limit: int) -> Iterator:
+    """把 `items` 逐个提交给 `executor` 执行 `fn`，但最多 `limit` 个任务在途，
+    按完成顺序产出 (item, 结果, 异常)。
+
+    与一次性提交全部任务不同，只有任务完成（且结果已被消费）后才提交下一个，
+    因此 future 和结果的内存占用与帧数无关。"""
+    if isinstance(executor, ThreadPoolExecutor):
+        # 进程池的任务必须可 pickle，子进程里也没有调用方的剖析器
+        fn = in_context(fn)
+    items = iter(items)
+    in_flight = {
+        executor.submit(fn, item): item for item in itertools.islice(items, limit)
+    }
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = in_flight.pop(future)
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+            for nxt in itertools.islice(items, 1):
+                in_flight[executor.submit(fn, nxt)] = nxt
+
+
+@profiled("ocr", items=_one)
+def ocr_frame_tesseract(
+    frame_path,
+    label: Optional[Path] = None,
+    ocr_options: OcrOptions = DEFAULT_OCR_OPTIONS,
+) -> Optional[str]:
+    """使用 Tesseract OCR 从帧中提取文本。首先转换为灰度；
+    `ocr_options.preprocess` 为真时只识别裁剪、缩放并二值化后的文本区域。
+
+    `frame_path` 可以是图像文件路径，也可以是内存中的 RGB 数组
+    （此时用 `label` 标识该帧以便输出错误）。识别失败（例如找不到
+    tesseract 可执行文件）时返回 None。"""
+    if not TESSERACT_AVAILABLE:
+        return None
+    try:
+        if isinstance(frame_path, (str, Path)):
+            img = Image.open(frame_path)
+        else:
+            img = Image.fromarray(frame_path)
+        if img.mode != "L":
+            img = img.convert("L")
+        if ocr_options.preprocess:
+            prepared = preprocess_for_ocr(np.asarray(img))
+            if prepared is not None:
+                img = Image.fromarray(prepared)
+        text = pytesseract.image_to_string(img, config=TESSERACT_CONFIG)
+        return text.strip()
+    except Exception as e:
+        print(f"[!] {label or frame_path} 的 OCR 失败：{e}")
+        return None
+
+
+@profiled("ocr", items=_one)
+def ocr_frame_easyocr(
+    frame_path, reader, label: Optional[Path] = None
+) -> Optional[str]:
+    """使用 EasyOCR 从帧中提取文本（更适合样式化文本）。
+    接受图像路径或内存中的 RGB 数组。识别失败时返回 None。"""
+    try:
+        image = str(frame_path) if isinstance(frame_path, Path) else frame_path
+        results = reader.readtext(image, detail=0)
+        return "\n".join(results).strip()
+    except Exception as e:
+        print(f"[!] {label or frame_path} 的 OCR 失败：{e}")
+        return None
+
+
+_EASYOCR_READER = None
+_EASYOCR_LOCK = threading.Lock()
+
+
+def get_easyocr_reader():
+    """返回进程内共享的 EasyOCR Reader，模型只在首次调用时加载。"""
+    global _EASYOCR_READER
+    with _EASYOCR_LOCK:
+        if _EASYOCR_READER is None:
+            print("[*] 正在初始化 EasyOCR（这可能需要一点时间）…")
+            _EASYOCR_READER = easyocr.Reader(["en"], gpu=False, verbose=False)
+        return _EASYOCR_READER
+
+
+@profiled("ocr", items=_count)
+def ocr_frames_easyocr_batched(
+    frames: list[Path], reader, batch_size: int = 8
+) -> list[Optional[str]]:
+    """使用 EasyOCR 的批量推理接口识别一批帧（同一视频的帧尺寸相同）。
+    整批失败时逐帧回退，返回与 `frames` 对应的文本列表（失败的帧为 None）。"""
+    try:
+        batches = reader.readtext_batched(
+            [str(f) for f in frames], detail=0, batch_size=batch_size
+        )
+        return ["\n".join(lines).strip() for lines in batches]
+    except Exception as e:
+        print(f"[!] EasyOCR 批量识别失败，逐帧重试：{e}")
+        return [ocr_frame_easyocr(f, reader) for f in frames]
+
+
+def _easyocr_worker_init(threads: int) -> None:
+    """进程池初始化：限制每个工作进程的 torch 线程数并预加载模型。"""
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    get_easyocr_reader()
+
+
+def _easyocr_worker_run(frames: list[Path], batch_size: int) -> list[Optional[str]]:
+    return ocr_frames_easyocr_batched(frames, get_easyocr_reader(), batch_size)
+
+
+def run_easyocr_batched(
+    frames: list[Path], batch_size: int = 8, procs: int = 1, **_options
+) -> Iterator[tuple[Path, Optional[str]]]:
+    """分批运行 EasyOCR，按完成顺序逐帧产出 (帧, 文本)。`procs` > 1 时
+    每个工作进程加载一次模型，并按批次处理分片，吞吐量随核心数扩展；
+    最多 2×procs 个分片在途。"""
+    shards = [frames[i : i + batch_size] for i in range(0, len(frames), batch_size)]
+    done = 0
+    if procs <= 1:
+        reader = get_easyocr_reader()
+        for shard in shards:
+            yield from zip(shard, ocr_frames_easyocr_batched(shard, reader, batch_size))
+            done += len(shard)
+            print(f"    → 已处理 {done}/{len(frames)} 帧")
+        return
+
+    threads = max(1, (os.cpu_count() or procs) // procs)
+    print(f"[*] 正在启动 {procs} 个 EasyOCR 工作进程（每个 {threads} 线程）…")
+    with ProcessPoolExecutor(
+        max_workers=procs,
+        initializer=_easyocr_worker_init,
+        initargs=(threads,),
+    ) as executor:
+        worker = functools.partial(_easyocr_worker_run, batch_size=batch_size)
+        tasks = bounded_map(executor, worker, shards, OCR_IN_FLIGHT * procs)
+        for shard, texts, error in tasks:
+            if error is not None:
+                print(f"[!] EasyOCR 工作进程失败：{error}")
+                texts = [None] * len(shard)
+            yield from zip(shard, texts)
+            done += len(shard)
+            print(f"    → 已处理 {done}/{len(frames)} 帧")
+
+
+def run_tesseract(
+    frames: list[Path],
+    workers: int = 4,
+    ocr_options: OcrOptions = DEFAULT_OCR_OPTIONS,
+    **_options,
+) -> Iterator[tuple[Path, Optional[str]]]:
+    """Tesseract 是外部进程，可以在线程池中并行运行。
+    最多 2×workers 帧在途，按完成顺序逐帧产出 (帧, 文本)。"""
+    recognize = functools.partial(ocr_frame_tesseract, ocr_options=ocr_options)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tasks = bounded_map(executor, recognize, frames, OCR_IN_FLIGHT * workers)
+        for i, (frame, text, error) in enumerate(tasks):
+            if error is not None:
+                print(f"[!] {frame} 的 OCR 失败：{error}")
+                text = None
+            yield frame, text
+            if (i + 1) % 10 == 0:
+                print(f"    → 已处理 {i + 1}/{len(frames)} 帧")
+
+
+def _easyocr_frame(frame, label: Optional[Path] = None, **_options) -> Optional[str]:
+    return ocr_frame_easyocr(frame, get_easyocr_reader(), label=label)
+
+
+register_engine(
+    EngineSpec(
+        kind="ocr",
+        name="tesseract",
+        modules=("PIL", "pytesseract"),
+        install_hint="安装：pip install Pillow pytesseract && apt install tesseract-ocr",
+        run=run_tesseract,
+        ocr_frame=ocr_frame_tesseract,
+        config=lambda o: TESSERACT_CONFIG + (";preprocess" if o.preprocess else ""),
+    )
+)
+register_engine(
+    EngineSpec(
+        kind="ocr",
+        name="easyocr",
+        modules=("easyocr",),
+        install_hint=(
+            "安装：pip install torch torchvision --index-url "
+            "https://download.pytorch.org/whl/cpu && pip install easyocr\n"
+            "  或使用：--ocr-engine tesseract"
+        ),
+        run=run_easyocr_batched,
+        ocr_frame=_easyocr_frame,
+        # EasyOCR 自带文本检测，--ocr-preprocess 对它不起作用
+        config=lambda _o: f"langs=en;version={getattr(easyocr, '__version__', '')}",
+        # 共享的 Reader 不是线程安全的
+        thread_safe=False,
+        warmup=get_easyocr_reader,
+        exit_if_missing=True,
+    )
+)
+
+
+def ocr_engine_config(
+    ocr_engine: str,
+    ocr_options: OcrOptions = DEFAULT_OCR_OPTIONS,
+    daemon: Optional["OcrDaemonClient"] = None,
+) -> str:
+    """描述引擎按 `ocr_options` 运行时的配置字符串，作为 OCR 缓存键的一部分。
+    配置变化（例如 Tesseract 参数）会使旧的缓存条目自然失效。"""
+    if daemon is not None and daemon.serves(ocr_engine, ocr_options):
+        return daemon.info["config"]
+    spec = ENGINES["ocr"].get(ocr_engine)
+    return spec.config(ocr_options) if spec and spec.config else ""
+
+
+def ocr_cache_key(frame, engine: EngineSpec) -> str:
+    """按帧内容哈希 + 引擎 + 引擎配置生成缓存键（`engine` 是 `load_engine`
+    返回的、已绑定本次运行设置的规格）。
+
+    文件帧对文件字节做哈希（无需解码）；内存帧对像素字节和形状做哈希。"""
+    h = hashlib.sha256()
+    if isinstance(frame, (str, Path)):
+        with open(frame, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                h.update(block)
+    else:
+        h.update(repr(frame.shape).encode())
+        h.update(memoryview(frame).cast("B"))
+    return f"{engine.name}|{engine.config()}|{h.hexdigest()}"
+
+
+def iter_ocr_on_frames(
+    frames: list[Path],
+    ocr_engine: str = "tesseract",
+    workers: int = 4,
+    cache: Optional["DiskCache"] = None,
+    batch_size: int = 8,
+    procs: int = 1,
+    text_threshold: Optional[float] = None,
+    store: Optional[FrameStore] = None,
+    ocr_options: Optional[OcrOptions] = None,
+    ocr_daemon: Optional["OcrDaemonClient"] = None,
+) -> Iterator[tuple[Path, str]]:
+    """对帧运行 OCR，按完成顺序逐帧产出 (frame_path, text)。
+
+    Tesseract 以线程池并行；EasyOCR 使用批量推理，`procs` > 1 时分片到
+    多个工作进程。提交给引擎的帧数有上限（见 `bounded_map`），结果不在
+    内存中累积，调用方可以边识别边落盘。
+    提供 `cache` 时先按内容哈希查找缓存，只对未命中的帧调用引擎；每个成功的
+    结果完成后立即写入缓存，识别失败的帧产出空文本但不写入缓存（下次运行
+    重试）。提供 `text_threshold` 时，文本得分（见 `text_scores`）低于阈值的
+    帧不调用引擎，结果记为空文本，也不写入缓存。`ocr_options` 是影响识别
+    结果的本次运行设置（见 `OcrOptions`），`ocr_daemon` 是本次运行连接的
+    OCR 守护进程。"""
+    if not frames:
+        return
+
+    engine = load_engine("ocr", ocr_engine, ocr_options, ocr_daemon)
+    if engine is None:
+        return
+
+    with_text = failed = 0
+    cache_keys: dict[Path, str] = {}
+    pending = frames
+    if cache is not None:
+        pending = []
+        hits = 0
+        for f in frames:
+            key = ocr_cache_key(f, engine)
+            cached = cache.get(key)
+            if cached is None:
+                cache_keys[f] = key
+                pending.append(f)
+                continue
+            hits += 1
+            with_text += len(cached) > 10
+            yield f, cached
+        print(f"[*] OCR 缓存命中 {hits}/{len(frames)} 帧")
+
+    skipped: list[Path] = []
+    if pending and text_threshold is not None:
+        pending, skipped = prefilter_text_frames(pending, text_threshold, store)
+        print(
+            f"[*] 文本预筛选跳过 {len(skipped)}/{len(pending) + len(skipped)} 帧"
+            f"（得分 < {text_threshold}‰）"
+        )
+        for f in skipped:
+            yield f, ""
+
+    if pending:
+        print(f"[*] 正在 {len(pending)} 帧上运行 OCR（{ocr_engine}）…")
+        # 多进程分片时每个进程有自己的模型，无需串行化
+        lock = engine_lock(engine) if procs <= 1 else contextlib.nullcontext()
+        with lock:
+            for f, text in engine.run(
+                pending, workers=workers, batch_size=batch_size, procs=procs
+            ):
+                if text is None:
+                    failed += 1
+                    text = ""
+                elif cache is not None:
+                    cache.put(cache_keys[f], text)
+                with_text += len(text) > 10
+                yield f, text
+
+    # 统计有意义文本的帧
+    print(f"    → 在 {with_text}/{len(frames)} 帧中发现文本")
+    if failed:
+        print(f"[!] {failed} 帧 OCR 失败，结果为空且未写入缓存")
+    if skipped:
+        print(f"    → 其中 {len(skipped)} 帧经文本预筛选跳过，未调用 OCR 引擎")
+
+
+@profiled("ocr", items=_count_input_frames)
+def run_ocr_on_frames(frames: list[Path], **options) -> dict[Path, str]:
+    """对帧运行 OCR（参数见 `iter_ocr_on_frames`），返回 {frame_path: text}。"""
+    return dict(iter_ocr_on_frames(frames, **options))
+
+
+# ---------------------------------------------------------------------------
+# 增量 OCR 结果（ocr-results.jsonl）
+# ---------------------------------------------------------------------------
+
+OCR_LOG = "ocr-results.jsonl"
+
+
+class OcrLog:
+    """按完成顺序逐行追加 OCR 结果的 JSONL 文件，每行写入后立即 flush。
+
+    首行 {"key": ...} 标识产生这些结果的 OCR 参数和上游帧；之后每行是
+    {"frame": 相对路径, "text": ...}，或重复帧的 {"frame": ..., "same_as": ...}。
+    运行在中途失败时已完成的结果保留在文件中：键相同的下一次运行会截掉
+    写了一半的末行，沿用已有结果（`done`），只识别剩余的帧。"""
+
+    def __init__(self, path: Path, out_dir: Path, key: str, resume: bool = True):
+        self.path = path
+        self.out_dir = out_dir
+        self.key = key
+        self.resume = resume
+        self.done: set[Path] = set()
+        self._fh = None
+
+    def __enter__(self) -> "OcrLog":
+        end = self._scan() if self.resume and self.path.exists() else None
+        if end is None:
+            self.done.clear()
+            self._fh = open(self.path, "wb")
+            self._write({"key": self.key})
+        else:
+            os.truncate(self.path, end)
+            self._fh = open(self.path, "ab")
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self._fh.close()
+
+    def _scan(self) -> Optional[int]:
+        """读取已有文件，返回最后一个完整行的结束偏移；键不一致时返回 None。"""
+        with open(self.path, "rb") as fh:
+            try:
+                if json.loads(fh.readline()).get("key") != self.key:
+                    return None
+            except ValueError:
+                return None
+            end = fh.tell()
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                self.done.add(self.out_dir / rec["frame"])
+                end += len(line)
+        return end
+
+    def _write(self, rec: dict) -> None:
+        self._fh.write(json.dumps(rec, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._fh.flush()
+
+    def _rel(self, frame: Path) -> str:
+        return os.path.relpath(frame, self.out_dir)
+
+    def append(self, frame: Path, text: str) -> None:
+        self._write({"frame": self._rel(frame), "text": text})
+        self.done.add(frame)
+
+    def alias(self, frame: Path, same_as: Path) -> None:
+        """记录重复帧使用代表帧 `same_as` 的文本。"""
+        self._write({"frame": self._rel(frame), "same_as": self._rel(same_as)})
+        self.done.add(frame)
+
+
+class OcrResults(Mapping):
+    """ocr-results.jsonl 的只读映射 {frame_path: text}。
+
+    打开时流式扫描一遍文件，内存中只保留每帧所在行的偏移量；文本在访问
+    时才从文件读出，因此生成 Markdown 时不必把全部 OCR 文本载入内存。
+    每次读取各自短暂地打开文件，映射本身不持有文件描述符，可以随任务
+    结果长期保留（批量模式、库调用、重建索引）。"""
+
+    def __init__(self, path: Path, out_dir: Path):
+        self.path = path
+        self.out_dir = out_dir
+        self._offsets: dict[Path, int] = {}
+        with open(path, "rb") as fh:
+            offset = len(fh.readline())
+            for line in fh:
+                if not line.endswith(b"\n"):
+                    break
+                # 同一帧出现多次时以最后一行为准
+                self._offsets[out_dir / json.loads(line)["frame"]] = offset
+                offset += len(line)
+
+    def _record(self, frame: Path) -> dict:
+        offset = self._offsets[frame]
+        with open(self.path, "rb") as fh:
+            fh.seek(offset)
+            return json.loads(fh.readline())
+
+    def __getitem__(self, frame: Path) -> str:
+        rec = self._record(frame)
+        if "same_as" in rec:
+            return self.get(self.out_dir / rec["same_as"], "")
+        return rec["text"]
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+
+def write_ocr_json(path: Path, frames: list[Path], results: Mapping) -> None:
+    """逐帧写出 ocr-results.json（{帧路径: 文本}），不在内存中构建整个字典。"""
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write("{")
+        for i, f in enumerate(frames):
+            fh.write(",\n  " if i else "\n  ")
+            fh.write(f"{json.dumps(str(f))}: {json.dumps(results.get(f, ''))}")
+        fh.write("\n}" if frames else "}")
+
+
+# ---------------------------------------------------------------------------
+# OCR 守护进程（--serve-ocr）
+# ---------------------------------------------------------------------------
+
+OCR_SOCKET = "ocr.sock"
+# 探测守护进程的超时（秒）：没有响应时本次运行在本地识别
+OCR_DAEMON_PING_TIMEOUT = 1.0
+
+
+def _send_message(sock: socket.socket, header: dict, payload: bytes = b"") -> None:
+    """一条消息是一行 JSON 头，紧随其后是 `payload` 字节（长度记在头中）。"""
+    line = json.dumps({**header, "bytes": len(payload)}, ensure_ascii=False)
+    sock.sendall(line.encode("utf-8") + b"\n" + payload)
+
+
+def _recv_message(fh) -> tuple[dict, bytes]:
+    line = fh.readline()
+    if not line:
+        raise ConnectionError("连接已关闭")
+    header = json.loads(line)
+    payload = fh.read(header.pop("bytes", 0))
+    return header, payload
+
+
+def _daemon_recognize(
+    engine: EngineSpec, header: dict, payload: bytes
+) -> list[Optional[str]]:
+    """识别一个批次：`frames` 是图像文件路径，`arrays` 是 payload 中依次
+    排列的 uint8 RGB 缓冲区的形状。识别失败的帧为 None（JSON null）。"""
+    with engine_lock(engine):
+        if "frames" in header:
+            frames = [Path(f) for f in header["frames"]]
+            texts = dict(engine.run(frames, batch_size=len(frames)))
+            return [texts.get(f) for f in frames]
+        texts, offset = [], 0
+        for shape in header["arrays"]:
+            size = math.prod(shape)
+            frame = np.frombuffer(payload, np.uint8, size, offset).reshape(shape)
+            texts.append(engine.ocr_frame(frame))
+            offset += size
+        return texts
+
+
+class _OcrRequestHandler(socketserver.StreamRequestHandler):
+    """处理一个连接上的请求（ping / ocr），直到客户端关闭连接。"""
+
+    def handle(self) -> None:
+        engine = self.server.ocr_engine
+        while True:
+            try:
+                header, payload = _recv_message(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            try:
+                if header.get("op") == "ping":
+                    reply = {
+                        "engine": engine.name,
+                        "config": engine.config(),
+                        "preprocess": self.server.ocr_options.preprocess,
+                        "pid": os.getpid(),
+                    }
+                elif header.get("op") == "ocr":
+                    reply = {"texts": _daemon_recognize(engine, header, payload)}
+                    print(f"    → 已识别 {len(reply['texts'])} 帧")
+                else:
+                    reply = {"error": f"未知的请求：{header.get('op')}"}
+            except Exception as e:
+                reply = {"error": str(e)}
+            _send_message(self.connection, reply)
+
+
+def serve_ocr(
+    socket_path: Path,
+    ocr_engine: str,
+    ocr_options: OcrOptions = DEFAULT_OCR_OPTIONS,
+) -> None:
+    """在前台运行 OCR 守护进程，直到 Ctrl-C。
+
+    引擎只在启动时按 `ocr_options` 加载一次（EasyOCR 的模型加载通常要数秒
+    到数十秒），之后连续运行的 CLI 通过 Unix 套接字提交批次，省去各自的
+    初始化；设置不同的运行不会连接它。"""
+    if not hasattr(socket, "AF_UNIX"):
+        raise DependencyError("--serve-ocr 需要支持 Unix 套接字的平台")
+    if OcrDaemonClient.connect(socket_path) is not None:
+        raise ExtractorError(f"已有 OCR 守护进程在 {socket_path} 上运行")
+    engine = load_engine("ocr", ocr_engine, ocr_options)
+    if engine is None:
+        raise DependencyError(f"OCR 引擎 {ocr_engine} 不可用")
+    if engine.warmup:
+        engine.warmup()
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    # 上次未正常退出留下的套接字文件
+    socket_path.unlink(missing_ok=True)
+    # 帧路径可以指向任意文件，只允许当前用户连接。套接字文件在 bind 时
+    # 按 umask 创建，事后再 chmod 会留下其他用户可以连接的窗口
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(
+            str(socket_path), _OcrRequestHandler
+        )
+    finally:
+        os.umask(umask)
+    with server:
+        server.daemon_threads = True
+        server.ocr_engine = engine
+        server.ocr_options = ocr_options
+        print(f"[✓] OCR 守护进程（{ocr_engine}）正在监听 {socket_path}，Ctrl-C 停止")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n[*] 正在停止 OCR 守护进程…")
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+class OcrDaemonClient:
+    """运行中的 OCR 守护进程的客户端。
+
+    `engine` 是转发给守护进程的引擎规格：`run` 把帧路径分批发送（最多
+    `workers` 个批次在途），`ocr_frame` 发送内存帧的原始 RGB 缓冲区。
+    守护进程中途不可用时，剩余的帧回退到本地引擎。"""
+
+    def __init__(self, path: Path, info: dict):
+        self.path = path
+        self.info = info
+        self._lock = threading.Lock()
+        self.engine = EngineSpec(
+            kind="ocr",
+            name=info["engine"],
+            modules=(),
+            install_hint="",
+            run=self.run,
+            ocr_frame=self.ocr_frame,
+            config=lambda: info["config"],
+        )
+        self._local = None
+
+    @classmethod
+    def connect(cls, path: Path) -> Optional["OcrDaemonClient"]:
+        """守护进程在运行且有响应时返回客户端，否则返回 None。"""
+        if not hasattr(socket, "AF_UNIX") or not path.exists():
+            return None
+        client = cls(path, {"engine": "", "config": ""})
+        try:
+            info = client.request({"op": "ping"}, timeout=OCR_DAEMON_PING_TIMEOUT)
+        except (OSError, ValueError, ExtractorError):
+            return None
+        return cls(path, info)
+
+    def serves(self, ocr_engine: str, ocr_options: OcrOptions) -> bool:
+        """守护进程加载的引擎和预处理设置是否与本次运行一致。"""
+        return (
+            self.info["engine"] == ocr_engine
+            and self.info.get("preprocess") == ocr_options.preprocess
+        )
+
+    def request(
+        self, header: dict, payload: bytes = b"", timeout: Optional[float] = None
+    ) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(self.path))
+            _send_message(sock, header, payload)
+            with sock.makefile("rb") as fh:
+                reply, _ = _recv_message(fh)
+        if "error" in reply:
+            raise CommandError(f"OCR 守护进程：{reply['error']}")
+        return reply
+
+    def local_engine(self, error: Exception) -> Optional[EngineSpec]:
+        """守护进程失败后不再使用它，改为按守护进程的设置加载本地引擎
+        （只打印一次）。"""
+        with self._lock:
+            if self._local is None:
+                print(f"[!] OCR 守护进程不可用（{error}），改为本地识别")
+                options = OcrOptions(preprocess=bool(self.info.get("preprocess")))
+                self._local = load_engine("ocr", self.info["engine"], options) or False
+        return self._local or None
+
+    def _recognize(self, frames: list[Path]) -> list[Optional[str]]:
+        if self._local is not None:
+            raise ConnectionError("守护进程已停用")
+        paths = [str(f.resolve()) for f in frames]
+        return self.request({"op": "ocr", "frames": paths})["texts"]
+
+    def run(
+        self, frames: list[Path], workers: int = 4, batch_size: int = 8, **_options
+    ) -> Iterator[tuple[Path, Optional[str]]]:
+        batches = [
+            frames[i : i + batch_size] for i in range(0, len(frames), batch_size)
+        ]
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch, texts, error in bounded_map(
+                executor, self._recognize, batches, workers
+            ):
+                if error is not None:
+                    local = self.local_engine(error)
+                    if local is None:
+                        texts = [None] * len(batch)
+                    else:
+                        with engine_lock(local):
+                            results = dict(local.run(batch, workers=workers))
+                        texts = [results.get(f) for f in batch]
+                yield from zip(batch, texts)
+                done += len(batch)
+                print(f"    → 已处理 {done}/{len(frames)} 帧")
+
+    def ocr_frame(
+        self, frame, label: Optional[Path] = None, **_options
+    ) -> Optional[str]:
+        if self._local is None:
+            frame = np.ascontiguousarray(frame, dtype=np.uint8)
+            header = {"op": "ocr", "arrays": [list(frame.shape)]}
+            try:
+                return self.request(header, frame.tobytes())["texts"][0]
+            except (OSError, ValueError, ExtractorError) as e:
+                self.local_engine(e)
+        if not self._local:
+            return None
+        with engine_lock(self._local):
+            return self._local.ocr_frame(frame, label=label)
+
+
+# ---------------------------------------------------------------------------
+# 调色板提取
+# ---------------------------------------------------------------------------
+
+
+def extract_color_palette(
+    frame_path, color_count: int = 6, label: Optional[Path] = None
+) -> list[tuple]:
+    """从帧中提取主要颜色。返回 RGB 元组列表。
+
+    `frame_path` 也可以是内存中的 RGB 数组：此时跳过图像解码，按与
+    ColorThief 相同的规则（每 5 个像素取 1 个、忽略近白色）直接量化。"""
     if not COLORTHIEF_AVAILABLE:
         return []
     try:
-        ct = ColorThief(str(frame_path))
-        palette = ct.get_palette(color_count=color_count, quality=5)
-        return palette
+        if isinstance(frame_path, (str, Path)):
+            ct = colorthief.ColorThief(str(frame_path))
+            return ct.get_palette(color_count=color_count, quality=5)
+        pixels = frame_path.reshape(-1, 3)[::5]
+        pixels = pixels[~(pixels > 250).all(axis=1)]
+        valid_pixels = [tuple(p) for p in pixels.tolist()]
+        cmap = colorthief.MMCQ.quantize(valid_pixels, color_count)
+        return cmap.palette if cmap else []
     except Exception as e:
-        print(f"[!] {frame_path} 的颜色提取失败：{e}")
+        print(f"[!] {label or frame_path} 的颜色提取失败：{e}")
         return []
 
 
@@ -377,23 +3101,33 @@ def rgb_to_hex(rgb: tuple) -> str:
     return "#{:02x}{:02x}{:02x}".format(*rgb)
 
 
-def analyze_color_palettes(frames: list[Path], sample_size: int = 10) -> dict:
-    """分析跨采样帧的调色板。"""
+@profiled("palette", items=_count_input_frames)
+def analyze_color_palettes(
+    frames: list[Path],
+    sample_size: int = 10,
+    precomputed: Optional[dict[Path, list[tuple]]] = None,
+    **_options,
+) -> dict:
+    """分析跨采样帧的调色板。
+
+    `precomputed` 是已在内存帧管道中逐帧提取的调色板，会与 `frames`
+    的采样结果合并。"""
     if not COLORTHIEF_AVAILABLE:
         return {}
-    if not frames:
+    all_colors = [c for palette in (precomputed or {}).values() for c in palette]
+    if not frames and not all_colors:
         return {}
 
-    # 在视频中均匀采样帧
-    step = max(1, len(frames) // sample_size)
-    sampled = frames[::step][:sample_size]
+    if frames:
+        # 在视频中均匀采样帧
+        step = max(1, len(frames) // sample_size)
+        sampled = frames[::step][:sample_size]
 
-    print(f"[*] 正在从 {len(sampled)} 帧中提取调色板…")
+        print(f"[*] 正在从 {len(sampled)} 帧中提取调色板…")
 
-    all_colors = []
-    for frame in sampled:
-        palette = extract_color_palette(frame)
-        all_colors.extend(palette)
+        for frame in sampled:
+            palette = extract_color_palette(frame)
+            all_colors.extend(palette)
 
     if not all_colors:
         return {}
@@ -411,6 +3145,317 @@ def analyze_color_palettes(frames: list[Path], sample_size: int = 10) -> dict:
     }
 
 
+register_engine(
+    EngineSpec(
+        kind="palette",
+        name="colorthief",
+        modules=("PIL", "colorthief"),
+        install_hint="安装：pip install colorthief",
+        run=analyze_color_palettes,
+        analyze_frame=extract_color_palette,
+        sample_frames=10,
+    )
+)
+
+
+# 每通道量化位数：5 位 = 32 级，直方图共 32768 个桶
+HIST_BITS = 5
+
+
+def load_rgb_array(frame, max_side: int = 160) -> "np.ndarray":
+    """把帧读为缩小后的 RGB uint8 数组，供直方图统计使用。
+    内存帧按步长抽样，文件帧在解码后用 reduce 缩小。"""
+    if not isinstance(frame, (str, Path)):
+        step = max(1, max(frame.shape[:2]) // max_side)
+        return frame[::step, ::step]
+    img = Image.open(frame)
+    img.draft("RGB", (max_side * 2, max_side * 2))
+    img = img.convert("RGB")
+    factor = max(1, max(img.size) // max_side)
+    if factor > 1:
+        img = img.reduce(factor)
+    return np.asarray(img)
+
+
+def color_histogram(frame, label: Optional[Path] = None) -> "np.ndarray":
+    """统计单帧的量化三维颜色直方图（展平为一维，长度 2^(3*HIST_BITS)）。"""
+    try:
+        pixels = load_rgb_array(frame).reshape(-1, 3)
+    except Exception as e:
+        print(f"[!] {label or frame} 的颜色提取失败：{e}")
+        return np.zeros(1 << (3 * HIST_BITS), dtype=np.int64)
+    q = (pixels >> (8 - HIST_BITS)).astype(np.int32)
+    idx = (q[:, 0] << (2 * HIST_BITS)) | (q[:, 1] << HIST_BITS) | q[:, 2]
+    return np.bincount(idx, minlength=1 << (3 * HIST_BITS))
+
+
+@profiled("palette")
+def video_color_histogram(
+    video_path: Path,
+    fps: float = 1.0,
+    size: tuple[int, int] = (160, 90),
+    timeline: Optional["PaletteTimeline"] = None,
+) -> "np.ndarray | None":
+    """以低分辨率 rawvideo 流解码整段视频并累计颜色直方图。
+
+    颜色统计与宽高比无关，因此直接缩放到固定尺寸以保证每帧字节数固定。
+    提供 `timeline` 时，第 i 帧按时间 i / fps 同时累计到所属片段。"""
+    width, height = size
+    cmd = [
+        "ffmpeg",
+        "-i",
+        str(video_path),
+        "-vf",
+        f"fps={fps},scale={width}:{height}",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "rgb24",
+        "pipe:1",
+    ]
+    print(f"[*] 正在以 {fps} fps / {width}x{height} 解码整段视频统计颜色…")
+    proc = subprocess.Popen(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    hist = np.zeros(1 << (3 * HIST_BITS), dtype=np.int64)
+    buf = np.empty((height, width, 3), dtype=np.uint8)
+    frames = 0
+    while _read_exact(proc.stdout, memoryview(buf).cast("B")) == buf.nbytes:
+        frame_hist = color_histogram(buf)
+        hist += frame_hist
+        if timeline is not None:
+            timeline.add(frames / fps, frame_hist)
+        frames += 1
+    proc.stdout.close()
+    if proc.wait() != 0 or not frames:
+        print("[!] 整段视频颜色统计失败，回退到逐帧统计")
+        return None
+    print(f"    → 统计了 {frames} 个低分辨率帧")
+    return hist
+
+
+def weighted_kmeans(
+    points: "np.ndarray", weights: "np.ndarray", k: int, iters: int = 25
+) -> tuple["np.ndarray", "np.ndarray"]:
+    """带权 k-means（k-means++ 初始化，固定随机种子保证结果可复现）。
+    返回 (聚类中心, 每个中心的总权重)。"""
+    rng = np.random.default_rng(0)
+    k = min(k, len(points))
+    centers = [points[int(weights.argmax())]]
+    d2 = ((points - centers[0]) ** 2).sum(axis=1)
+    while len(centers) < k:
+        p = d2 * weights
+        if p.sum() <= 0:
+            break
+        nxt = points[rng.choice(len(points), p=p / p.sum())]
+        centers.append(nxt)
+        d2 = np.minimum(d2, ((points - nxt) ** 2).sum(axis=1))
+    centers = np.array(centers, dtype=np.float64)
+    n = len(centers)
+    for _ in range(iters):
+        labels = ((points[:, None, :] - centers[None]) ** 2).sum(axis=2).argmin(axis=1)
+        totals = np.bincount(labels, weights=weights, minlength=n)
+        sums = np.stack(
+            [
+                np.bincount(labels, weights=weights * points[:, c], minlength=n)
+                for c in range(3)
+            ],
+            axis=1,
+        )
+        moved = np.where(
+            totals[:, None] > 0, sums / np.maximum(totals, 1)[:, None], centers
+        )
+        converged = np.allclose(moved, centers, atol=0.5)
+        centers = moved
+        if converged:
+            break
+    labels = ((points[:, None, :] - centers[None]) ** 2).sum(axis=2).argmin(axis=1)
+    return centers, np.bincount(labels, weights=weights, minlength=n)
+
+
+def palette_from_histogram(
+    hist: "np.ndarray", color_count: int = 6, bits: int = HIST_BITS
+) -> list[tuple[tuple, float]]:
+    """对直方图的非空桶做带权 k-means，返回按占比降序的 [(RGB, 占比)]。"""
+    bins = np.flatnonzero(hist)
+    if not len(bins):
+        return []
+    mask = (1 << bits) - 1
+    scale = 1 << (8 - bits)
+    points = np.stack(
+        [(bins >> (2 * bits)) & mask, (bins >> bits) & mask, bins & mask],
+        axis=1,
+    )
+    # 桶中心颜色
+    points = points * scale + scale / 2
+    weights = hist[bins].astype(np.float64)
+    centers, totals = weighted_kmeans(points, weights, color_count)
+    total = totals.sum()
+    return [
+        (tuple(int(round(min(255.0, c))) for c in centers[i]), float(totals[i] / total))
+        for i in np.argsort(-totals)
+        if totals[i] > 0
+    ]
+
+
+# 分段直方图使用每通道 4 位（4096 桶），数百个场景片段也只占用几十 MB
+TIMELINE_BITS = 4
+
+
+class PaletteTimeline:
+    """在单次遍历中按章节和场景片段累计颜色直方图。
+
+    每个带时间戳的帧直方图通过 `add` 用二分查找归入所属章节和场景片段，
+    最后对每个片段的直方图各做一次 k-means，无需为任何时间范围重新解码。
+    场景片段从每个场景变化帧开始，到下一个场景变化帧（或视频结尾）为止；
+    第一个场景变化之前的部分记为场景 0。"""
+
+    def __init__(self, chapters: list[dict], scene_times: list[float], duration: float):
+        self.duration = duration
+        self.chapters = [
+            {
+                "title": ch.get("title", ""),
+                "start": float(ch.get("start_time", 0)),
+                "end": float(ch.get("end_time") or duration),
+            }
+            for ch in sorted(chapters, key=lambda c: c.get("start_time", 0))
+        ]
+        # 场景编号与 Markdown 中的“场景 N”一致，0 表示第一个场景变化之前
+        starts = sorted(scene_times)
+        numbered = list(enumerate(starts, 1))
+        if not starts or starts[0] > 0:
+            numbered.insert(0, (0, 0.0))
+        self.scenes = [
+            {
+                "scene": n,
+                "start": start,
+                "end": numbered[i + 1][1] if i + 1 < len(numbered) else duration,
+            }
+            for i, (n, start) in enumerate(numbered)
+        ]
+        self._chapter_starts = [c["start"] for c in self.chapters]
+        self._scene_starts = [seg["start"] for seg in self.scenes]
+        size = 1 << (3 * TIMELINE_BITS)
+        self._chapter_hists = np.zeros((len(self.chapters), size), dtype=np.int64)
+        self._scene_hists = np.zeros((len(self.scenes), size), dtype=np.int64)
+
+    @staticmethod
+    def _coarsen(hist: "np.ndarray") -> "np.ndarray":
+        """把 HIST_BITS 位直方图合并为 TIMELINE_BITS 位。"""
+        n = 1 << HIST_BITS
+        f = 1 << (HIST_BITS - TIMELINE_BITS)
+        m = n // f
+        return hist.reshape(m, f, m, f, m, f).sum(axis=(1, 3, 5)).ravel()
+
+    def add(self, t: float, hist: "np.ndarray") -> None:
+        if not self.chapters and not self.scenes:
+            return
+        coarse = self._coarsen(hist)
+        i = bisect.bisect_right(self._chapter_starts, t) - 1
+        if 0 <= i < len(self.chapters):
+            self._chapter_hists[i] += coarse
+        j = bisect.bisect_right(self._scene_starts, t) - 1
+        if 0 <= j < len(self.scenes):
+            self._scene_hists[j] += coarse
+
+    def summary(self, color_count: int = 4) -> dict:
+        """返回 {"chapters": [...], "scenes": [...]}，每项带主要颜色及占比。"""
+
+        def describe(segments, hists):
+            out = []
+            for seg, hist in zip(segments, hists):
+                palette = palette_from_histogram(hist, color_count, bits=TIMELINE_BITS)
+                if not palette:
+                    continue
+                out.append(
+                    {
+                        **seg,
+                        "dominant_colors": [rgb_to_hex(c) for c, _ in palette],
+                        "shares": [round(share, 4) for _, share in palette],
+                    }
+                )
+            return out
+
+        return {
+            "chapters": describe(self.chapters, self._chapter_hists),
+            "scenes": describe(self.scenes, self._scene_hists),
+        }
+
+
+@profiled("palette", items=_count_input_frames)
+def analyze_color_histograms(
+    frames: list[Path],
+    precomputed: Optional[dict[Path, "np.ndarray"]] = None,
+    color_count: int = 6,
+    frame_times: Optional[dict[Path, float]] = None,
+    timeline: Optional[PaletteTimeline] = None,
+    duplicates: Optional[dict[Path, Path]] = None,
+    **_options,
+) -> dict:
+    """基于每一帧（或整段视频的低分辨率流）的量化颜色直方图分析调色板。
+
+    与只采样 10 帧的 ColorThief 路径不同，这里覆盖全部帧：每帧只做一次
+    向量化 bincount，最后对合并的直方图做一次 k-means。`precomputed` 是
+    内存帧管道或整段视频流已统计好的直方图。提供 `timeline` 时，带
+    时间戳（`frame_times`）的帧直方图同时累计到所属章节和场景片段；
+    `duplicates`（{帧: 代表帧}）中被去重的帧不单独统计，而是在各自的
+    时间点上计入代表帧的直方图，使每个片段的颜色不因去重而缺失。"""
+    precomputed = precomputed or {}
+    frame_times = frame_times or {}
+    if not frames and not precomputed:
+        return {}
+    hist = np.zeros(1 << (3 * HIST_BITS), dtype=np.int64)
+    # 代表帧 → 被它代表的重复帧的时间戳
+    copies: dict[Path, list[float]] = {}
+    for frame, rep in (duplicates or {}).items():
+        if rep != frame and frame in frame_times:
+            copies.setdefault(rep, []).append(frame_times[frame])
+
+    def accumulate(frame, frame_hist):
+        nonlocal hist
+        hist += frame_hist
+        if timeline is not None and frame in frame_times:
+            timeline.add(frame_times[frame], frame_hist)
+            for t in copies.get(frame, ()):
+                timeline.add(t, frame_hist)
+
+    for frame, frame_hist in precomputed.items():
+        accumulate(frame, frame_hist)
+    if frames:
+        print(f"[*] 正在统计 {len(frames)} 帧的颜色直方图…")
+        for frame in frames:
+            accumulate(frame, color_histogram(frame))
+    palette = palette_from_histogram(hist, color_count)
+    if not palette:
+        return {}
+    result = {
+        "dominant_colors": [rgb_to_hex(c) for c, _ in palette],
+        "color_frequencies": [
+            {"color": rgb_to_hex(c), "share": round(share, 4)} for c, share in palette
+        ],
+    }
+    if timeline is not None:
+        result["timeline"] = timeline.summary()
+    return result
+
+
+register_engine(
+    EngineSpec(
+        kind="palette",
+        name="histogram",
+        modules=("PIL", "numpy"),
+        install_hint="安装：pip install numpy Pillow",
+        run=analyze_color_histograms,
+        analyze_frame=color_histogram,
+    )
+)
+
+
+def default_palette_engine() -> str:
+    """优先使用覆盖全部帧的直方图引擎，缺少 numpy 时回退到 ColorThief。"""
+    return "histogram" if engine_available("palette", "histogram") else "colorthief"
+
+
 # ---------------------------------------------------------------------------
 # Markdown 组装
 # ---------------------------------------------------------------------------
@@ -429,30 +3474,156 @@ def group_transcript(entries: list[dict], chunk_seconds: int = 60) -> list[dict]
     if not entries:
         return []
     groups = []
-    current = {"start": entries[0]["start"], "text": ""}
+    start, parts = entries[0]["start"], []
     for e in entries:
-        if e["start"] - current["start"] >= chunk_seconds and current["text"]:
-            groups.append(current)
-            current = {"start": e["start"], "text": ""}
-        current["text"] += " " + e["text"]
-    if current["text"]:
-        groups.append(current)
-    for g in groups:
-        g["text"] = g["text"].strip()
+        if e["start"] - start >= chunk_seconds and parts:
+            groups.append({"start": start, "text": " ".join(parts).strip()})
+            start, parts = e["start"], []
+        parts.append(e["text"])
+    if parts:
+        groups.append({"start": start, "text": " ".join(parts).strip()})
     return groups
 
 
+# 超过此时长（秒）的字幕片段单独索引：普通片段的查询只需回看这么长，
+# 个别覆盖整段视频的长片段不会拖慢每次查询
+TRANSCRIPT_LONG_SEGMENT = 60.0
+
+
+class TranscriptIndex:
+    """字幕片段的时间索引，按时间段查询与之重叠的片段。
+
+    `segments` 是 (start, duration, text) 三元组。开始时间和结束时间存为
+    紧凑的 float 数组，文本只保存引用；输入已按时间排序时（YouTube 字幕
+    总是如此）构建是线性的，数万条片段的长直播也只占用几 MB。
+
+    不长于 `TRANSCRIPT_LONG_SEGMENT` 的片段在查询起点之前只需回看这么长，
+    每次查询为 O(log n + k)；更长的片段（通常只有几条）另存一份列表，
+    每次查询逐条检查。"""
+
+    def __init__(self, segments: Iterable[tuple[float, float, str]]):
+        self.starts = array("d")
+        self.ends = array("d")
+        self.texts: list[str] = []
+        for start, duration, text in segments:
+            self.starts.append(start)
+            self.ends.append(start + (duration or 0))
+            self.texts.append(text)
+        if any(a > b for a, b in itertools.pairwise(self.starts)):
+            order = sorted(range(len(self.starts)), key=self.starts.__getitem__)
+            self.starts = array("d", (self.starts[i] for i in order))
+            self.ends = array("d", (self.ends[i] for i in order))
+            self.texts = [self.texts[i] for i in order]
+        self._long = [
+            i
+            for i in range(len(self.starts))
+            if self.ends[i] - self.starts[i] > TRANSCRIPT_LONG_SEGMENT
+        ]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def overlapping(self, start: float, end: float) -> list[int]:
+        """与 [start, end) 重叠的片段下标（按时间顺序）。"""
+        lo = bisect.bisect_left(self.starts, start - TRANSCRIPT_LONG_SEGMENT)
+        hi = bisect.bisect_left(self.starts, end)
+        hits = [
+            i
+            for i in range(lo, hi)
+            if self.ends[i] > start
+            and self.ends[i] - self.starts[i] <= TRANSCRIPT_LONG_SEGMENT
+        ]
+        long = [i for i in self._long if self.starts[i] < end and self.ends[i] > start]
+        return sorted(hits + long) if long else hits
+
+    def text(self, start: float, end: float) -> str:
+        """与 [start, end) 重叠的片段文本，空白规范化后以空格连接。"""
+        return " ".join(
+            " ".join(self.texts[i] for i in self.overlapping(start, end)).split()
+        )
+
+
+def frame_spans(
+    frames: list[Path],
+    frame_times: dict[Path, float],
+    end: Optional[float] = None,
+    step: float = 0,
+) -> list[Optional[tuple[float, float]]]:
+    """每帧所代表的时间段：从该帧的时间戳到同一列表中下一帧的时间戳，
+    最后一帧到 `end`（视频时长，未知时到字幕结尾）。
+
+    没有时间戳的帧按 i * `step` 计；`step` 为 0 时该帧的时间段为 None。"""
+    times = [
+        frame_times.get(f, i * step if step else None) for i, f in enumerate(frames)
+    ]
+    spans: list[Optional[tuple[float, float]]] = []
+    for i, t in enumerate(times):
+        if t is None:
+            spans.append(None)
+            continue
+        stop = times[i + 1] if i + 1 < len(times) else None
+        if stop is None:
+            stop = end if end and end > t else math.inf
+        spans.append((t, max(t, stop)))
+    return spans
+
+
+THUMBNAIL_DIR = "thumbs"
+
+
+def make_thumbnails(
+    frames: list[Path],
+    out_dir: Path,
+    width: int = 320,
+    frame_format: FrameFormat = PNG_FRAMES,
+    workers: int = 4,
+) -> dict[Path, Path]:
+    """为 Markdown 生成 `width` 宽的缩略图（thumbs/），返回 {帧: 缩略图}。
+
+    PNG 帧的缩略图使用 JPEG；比对应帧更新的缩略图不重新生成。"""
+    thumbs_dir = out_dir / THUMBNAIL_DIR
+    thumbs_dir.mkdir(exist_ok=True)
+    thumb_format = frame_format
+    if thumb_format.ext == "png":
+        thumb_format = FrameFormat("jpg", 80)
+
+    def make(frame: Path) -> Path:
+        thumb = thumbs_dir / f"{frame.stem}.{thumb_format.ext}"
+        if thumb.exists() and thumb.stat().st_mtime >= frame.stat().st_mtime:
+            return thumb
+        img = Image.open(frame)
+        img.draft("RGB", (width, width))
+        img = img.convert("RGB")
+        img.thumbnail((width, img.height))
+        thumb_format.save(img, thumb)
+        return thumb
+
+    frames = [f for f in frames if f.exists()]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(frames, executor.map(make, frames)))
+
+
+@profiled("markdown")
 def build_markdown(
     meta: dict,
     transcript: list[dict] | None,
     interval_frames: list[Path],
     scene_frames: list[Path],
     out_dir: Path,
-    interval: int,
-    ocr_results: Optional[dict[Path, str]] = None,
+    interval: Optional[int],
+    ocr_results: Optional[Mapping[Path, str]] = None,
     color_analysis: Optional[dict] = None,
+    frame_times: Optional[dict[Path, float]] = None,
+    duplicates: Optional[dict[Path, Path]] = None,
+    thumbnails: Optional[dict[Path, Path]] = None,
 ) -> Path:
-    """组装最终的参考 markdown 文档。"""
+    """组装最终的参考 markdown 文档。
+
+    `frame_times` 提供每帧的实际显示时间戳（秒）；缺失时间隔帧
+    回退为 i * interval，场景帧不显示时间戳；`interval` 为 None 表示
+    间隔帧来自自适应采样。`duplicates` 是
+    `dedupe_frames` 的 {帧: 代表帧} 映射，重复帧复用代表帧的 OCR 文本。
+    `thumbnails` 中有缩略图的帧显示缩略图并链接到原帧。"""
     title = meta.get("title", "Untitled Video")
     channel = meta.get("channel", meta.get("uploader", "Unknown"))
     duration = meta.get("duration", 0)
@@ -463,6 +3634,38 @@ def build_markdown(
 
     ocr_results = ocr_results or {}
     color_analysis = color_analysis or {}
+    frame_times = frame_times or {}
+    duplicates = duplicates or {}
+    thumbnails = thumbnails or {}
+    index = (
+        TranscriptIndex(
+            (e["start"], e.get("duration", 0), e["text"]) for e in transcript
+        )
+        if transcript
+        else None
+    )
+
+    def ocr_text_for(frame: Path) -> str:
+        return ocr_results.get(duplicates.get(frame, frame), "").strip()
+
+    def image(alt: str, frame: Path, rel: str) -> str:
+        thumb = thumbnails.get(frame)
+        if thumb is None:
+            return f"![{alt}]({rel})\n"
+        return f"[![{alt}]({os.path.relpath(thumb, out_dir)})]({rel})\n"
+
+    def spoken(span: Optional[tuple[float, float]]) -> None:
+        """在帧下方附上该帧所代表时间段内的字幕。"""
+        text = index.text(*span) if index is not None and span else ""
+        if text:
+            start, end = span
+            until = fmt_timestamp(end) if math.isfinite(end) else "结尾"
+            lines.append(
+                f"<details><summary>🗣️ `{fmt_timestamp(start)}`–`{until}` "
+                "的字幕</summary>\n"
+            )
+            lines.append(f"{text}\n")
+            lines.append("</details>\n")
 
     lines: list[str] = []
 
@@ -480,15 +3683,53 @@ def build_markdown(
         lines.append("## 调色板\n")
         lines.append("视频中检测到的主要颜色：\n")
         colors = color_analysis["dominant_colors"]
-        # 创建颜色样本表格
-        lines.append("| 颜色 | 十六进制 |")
-        lines.append("|-------|---------|")
+        shares = {
+            f["color"]: f["share"] for f in color_analysis.get("color_frequencies", [])
+        }
+        # 创建颜色样本表格（直方图引擎额外给出每种颜色的占比）
+        if shares:
+            lines.append("| 颜色 | 十六进制 | 占比 |")
+            lines.append("|-------|---------|------|")
+        else:
+            lines.append("| 颜色 | 十六进制 |")
+            lines.append("|-------|---------|")
         for hex_color in colors:
             # Unicode 块用于颜色预览（不会显示实际颜色但作为占位符）
-            lines.append(f"| ████ | `{hex_color}` |")
+            if shares:
+                lines.append(f"| ████ | `{hex_color}` | {shares[hex_color]:.1%} |")
+            else:
+                lines.append(f"| ████ | `{hex_color}` |")
         lines.append("")
         lines.append(f"*完整调色板：{', '.join(f'`{c}`' for c in colors)}*\n")
 
+    # --- 调色板时间线（直方图引擎按章节和场景分段统计）---
+    timeline = color_analysis.get("timeline") or {}
+    if timeline.get("chapters") or timeline.get("scenes"):
+        lines.append("## 调色板时间线\n")
+        lines.append("每个章节和场景片段各自的主要颜色，可用于追踪配色的变化。\n")
+        sections = [
+            ("章节", timeline.get("chapters") or [], lambda seg: seg["title"]),
+            (
+                "场景",
+                timeline.get("scenes") or [],
+                lambda seg: f"场景 {seg['scene']}" if seg["scene"] else "开头",
+            ),
+        ]
+        for heading, segments, label in sections:
+            if not segments:
+                continue
+            lines.append(f"### 按{heading}\n")
+            lines.append(f"| 时间段 | {heading} | 主要颜色 |")
+            lines.append("|-----------|-------|----------|")
+            for seg in segments:
+                span = f"{fmt_timestamp(seg['start'])}–{fmt_timestamp(seg['end'])}"
+                swatches = " ".join(
+                    f"`{c}` {share:.0%}"
+                    for c, share in zip(seg["dominant_colors"], seg["shares"])
+                )
+                lines.append(f"| `{span}` | {label(seg)} | {swatches} |")
+            lines.append("")
+
     # --- 描述 ---
     if description:
         lines.append("## 视频描述\n")
@@ -531,35 +3772,48 @@ def build_markdown(
     # --- 关键帧 ---
     all_frames = []
     if interval_frames:
-        lines.append(f"## 关键帧（每 {interval} 秒）\n")
-        lines.append("以固定间隔捕获的视觉参考帧。\n")
-        for i, f in enumerate(interval_frames):
+        if interval:
+            lines.append(f"## 关键帧（每 {interval} 秒）\n")
+            lines.append("以固定间隔捕获的视觉参考帧。\n")
+        else:
+            lines.append("## 关键帧（自适应采样）\n")
+            lines.append("按章节、字幕提示词和画面变化选择的视觉参考帧。\n")
+        step = interval or 0
+        spans = frame_spans(interval_frames, frame_times, duration, step=step)
+        for i, (f, span) in enumerate(zip(interval_frames, spans)):
             rel = os.path.relpath(f, out_dir)
-            ts = fmt_timestamp(i * interval)
+            ts = fmt_timestamp(frame_times.get(f, i * step))
             lines.append(f"### `{ts}` 处的帧\n")
-            lines.append(f"![frame-{ts}]({rel})\n")
+            lines.append(image(f"frame-{ts}", f, rel))
             # 包含 OCR 文本（如果有）
-            ocr_text = ocr_results.get(f, "").strip()
+            ocr_text = ocr_text_for(f)
             if ocr_text and len(ocr_text) > 5:
                 lines.append("<details><summary>📝 帧中检测到的文本</summary>\n")
                 lines.append(f"```\n{ocr_text}\n```")
                 lines.append("</details>\n")
+            spoken(span)
             all_frames.append((ts, rel, ocr_text))
         lines.append("")
 
     if scene_frames:
         lines.append("## 场景变化帧\n")
         lines.append("视觉内容发生显著变化时捕获的帧。\n")
-        for i, f in enumerate(scene_frames):
+        spans = frame_spans(scene_frames, frame_times, duration)
+        for i, (f, span) in enumerate(zip(scene_frames, spans)):
             rel = os.path.relpath(f, out_dir)
-            lines.append(f"### 场景 {i + 1}\n")
-            lines.append(f"![scene-{i + 1}]({rel})\n")
+            if f in frame_times:
+                ts = fmt_timestamp(frame_times[f])
+                lines.append(f"### 场景 {i + 1}（`{ts}`）\n")
+            else:
+                lines.append(f"### 场景 {i + 1}\n")
+            lines.append(image(f"scene-{i + 1}", f, rel))
             # 包含 OCR 文本（如果有）
-            ocr_text = ocr_results.get(f, "").strip()
+            ocr_text = ocr_text_for(f)
             if ocr_text and len(ocr_text) > 5:
                 lines.append("<details><summary>📝 帧中检测到的文本</summary>\n")
                 lines.append(f"```\n{ocr_text}\n```")
                 lines.append("</details>\n")
+            spoken(span)
         lines.append("")
 
     # --- 视觉文本索引（OCR 摘要）---
@@ -597,23 +3851,1313 @@ def build_markdown(
             lines.append(f"| `{ts}` | `{rel}` | {has_text} |")
         lines.append("")
 
-    # --- 页脚 ---
-    lines.append("---\n")
-    lines.append("*由 `yt-design-extractor.py` 生成 — 请审查和整理 ")
-    lines.append("上述内容，然后将此文件提供给您的 agent。*\n")
+    # --- 页脚 ---
+    lines.append("---\n")
+    lines.append("*由 `yt-design-extractor.py` 生成 — 请审查和整理 ")
+    lines.append("上述内容，然后将此文件提供给您的 agent。*\n")
+
+    md_path = out_dir / "extracted-reference.md"
+    md_path.write_text("\n".join(lines), encoding="utf-8")
+    print(f"[✓] Markdown 参考已写入 {md_path}")
+    return md_path
+
+
+# ---------------------------------------------------------------------------
+# 阶段清单（可恢复的提取）
+# ---------------------------------------------------------------------------
+
+MANIFEST_VERSION = 1
+MANIFEST_STAGES = ("metadata", "transcript", "frames", "ocr", "palette")
+
+# 每个阶段依赖的上游阶段：上游重新运行后，下游阶段自动失效
+STAGE_DEPS: dict[str, tuple[str, ...]] = {
+    "metadata": (),
+    "transcript": (),
+    "frames": (),
+    "ocr": ("frames",),
+    "palette": ("frames", "metadata"),
+}
+
+
+class StageManifest:
+    """输出目录中的 manifest.json，记录每个阶段的参数哈希、输入和输出。
+
+    重新运行时，参数哈希和上游输入都未变化、且输出文件仍然存在的阶段
+    会被跳过并复用上次的结果。每个阶段完成后立即写入清单，因此超时或
+    中断之前已完成的阶段在下次运行时不会重做。"""
+
+    def __init__(self, out_dir: Path, force: Optional[list[str]] = None):
+        self.out_dir = out_dir
+        self.path = out_dir / "manifest.json"
+        force = set(force or ())
+        self.force = set(MANIFEST_STAGES) if "all" in force else force
+        self.stages: dict[str, dict] = {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == MANIFEST_VERSION:
+                self.stages = data.get("stages", {})
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def params_hash(params: dict) -> str:
+        blob = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(blob).hexdigest()[:16]
+
+    def _inputs(self, stage: str) -> dict[str, str]:
+        return {
+            dep: self.stages[dep]["run_id"]
+            for dep in STAGE_DEPS[stage]
+            if dep in self.stages
+        }
+
+    def run_key(self, stage: str, params: dict) -> str:
+        """参数和上游输入的组合哈希，标识阶段中途写出的部分结果属于哪次运行。"""
+        return self.params_hash({"params": params, "inputs": self._inputs(stage)})
+
+    def fresh(self, stage: str, params: dict) -> bool:
+        """该阶段是否可以跳过。没有记录任何帧的帧阶段（早期版本会在提取
+        失败后照常记录）总是重做。"""
+        rec = self.stages.get(stage)
+        if rec is None or stage in self.force:
+            return False
+        if stage == "frames" and not rec["files"]:
+            return False
+        return (
+            rec["params_hash"] == self.params_hash(params)
+            and rec["inputs"] == self._inputs(stage)
+            and all((self.out_dir / f).exists() for f in rec["files"])
+        )
+
+    def outputs(self, stage: str):
+        return self.stages[stage].get("outputs")
+
+    def run_id(self, stage: str) -> Optional[str]:
+        rec = self.stages.get(stage)
+        return rec["run_id"] if rec else None
+
+    def record(
+        self, stage: str, params: dict, files: list[Path], outputs=None
+    ) -> None:
+        """记录阶段完成并立即写回清单（先写临时文件再原子替换）。"""
+        self.stages[stage] = {
+            "params_hash": self.params_hash(params),
+            "params": params,
+            "inputs": self._inputs(stage),
+            "files": [os.path.relpath(f, self.out_dir) for f in files],
+            "outputs": outputs,
+            "run_id": f"{time.time_ns():x}",
+            "completed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        # 本次强制运行已完成，同一进程内后续检查不再视为强制
+        self.force.discard(stage)
+        data = {"version": MANIFEST_VERSION, "stages": self.stages}
+        tmp = self.path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def stage_params(
+    args, video_id: str, ocr_daemon: Optional["OcrDaemonClient"] = None
+) -> dict[str, dict]:
+    """各阶段参与参数哈希的选项。只包含影响输出内容的选项：
+    例如 --stream-frames 与基于文件的提取产出相同的帧，因此不计入。"""
+    dedup = (
+        {"threshold": args.dedup_threshold, "method": args.hash_method}
+        if args.dedup
+        else None
+    )
+    return {
+        "metadata": {"video_id": video_id},
+        "transcript": {"video_id": video_id},
+        "frames": {
+            "video_id": video_id,
+            "interval": args.interval,
+            "scene_threshold": args.scene_threshold if args.scene_detect else None,
+            # 采样所依据的章节和字幕的哈希在获取后由 fetch_stage_async
+            # 加入（"sources"，见 `adaptive_sources`）
+            **({"adaptive": args.frame_budget} if args.adaptive else {}),
+            # 只在非默认格式时加入，不使已有的 PNG 清单失效
+            **(
+                {"format": args.frame_format, "quality": args.frame_quality}
+                if args.frame_format != "png"
+                else {}
+            ),
+        },
+        "ocr": {
+            "engine": args.ocr_engine,
+            "config": ocr_engine_config(
+                args.ocr_engine, ocr_options_for(args), ocr_daemon
+            ),
+            "dedup": dedup,
+            # 只在启用时加入，不使未启用预筛选的已有清单失效
+            **({"text_filter": args.text_threshold} if args.text_filter else {}),
+        },
+        "palette": {
+            "engine": args.palette_engine or default_palette_engine(),
+            "source": args.palette_source,
+            "dedup": dedup,
+        },
+    }
+
+
+def adaptive_sources(meta: dict, transcript: Optional[list[dict]]) -> str:
+    """自适应采样所依据的章节和字幕的哈希：它们变化（例如作者补充了章节、
+    字幕从无到有）时帧阶段随之失效。"""
+    return StageManifest.params_hash(
+        {"chapters": meta.get("chapters") or [], "transcript": transcript or []}
+    )
+
+
+def clear_frames(out_dir: Path) -> None:
+    """删除上次提取留下的帧（任何格式）、缩略图和打包存储，
+    避免参数变化后旧帧混入新结果。"""
+    patterns = (
+        "frames/frame_*.*",
+        "frames_scene/scene_*.*",
+        f"{THUMBNAIL_DIR}/*",
+        FrameStore.ARRAY,
+        FrameStore.INDEX,
+    )
+    for pattern in patterns:
+        for f in out_dir.glob(pattern):
+            f.unlink(missing_ok=True)
+
+
+def rebase_frame(out_dir: Path, frame: str) -> Path:
+    """把结果文件中记录的帧路径映射到当前输出目录（帧总在一级子目录中）。"""
+    p = Path(frame)
+    return out_dir / p.parent.name / p.name
+
+
+# ---------------------------------------------------------------------------
+# 提取阶段
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class VideoJob:
+    """一个视频在各提取阶段之间传递的状态。
+
+    单视频模式按顺序调用 `STAGES` 中的三个阶段；批量模式把同样的
+    阶段放进 `run_batch` 的流水线。"""
+
+    url: str
+    video_id: str
+    out_dir: Path
+    meta: dict = field(default_factory=dict)
+    transcript: Optional[list[dict]] = None
+    video_path: Optional[VideoSource] = None
+    palette_engine: Optional[EngineSpec] = None
+    interval_frames: list[Path] = field(default_factory=list)
+    scene_frames: list[Path] = field(default_factory=list)
+    frame_times: dict[Path, float] = field(default_factory=dict)
+    duplicates: dict[Path, Path] = field(default_factory=dict)
+    unique_frames: list[Path] = field(default_factory=list)
+    streamed: Optional[dict] = None
+    palette_stats: dict = field(default_factory=dict)
+    palette_timeline: Optional[PaletteTimeline] = None
+    frame_store: Optional[FrameStore] = None
+    thumbnails: dict[Path, Path] = field(default_factory=dict)
+    ocr_results: Mapping[Path, str] = field(default_factory=dict)
+    color_analysis: dict = field(default_factory=dict)
+    md_path: Optional[Path] = None
+    manifest: Optional[StageManifest] = None
+    params: dict[str, dict] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+@dataclass
+class RunContext:
+    """一次提取调用（单个视频或整个批次）使用的资源，作为第三个参数传给
+    每个阶段。
+
+    同一进程内的多次调用（例如嵌入的服务并发调用 `extract_async`）各有
+    自己的上下文，互不影响对方的 OCR 守护进程、缓存和剖析结果。`close`
+    只关闭由 `open_run_context` 打开的缓存，调用方传入的共享缓存保持打开。"""
+
+    ocr_cache: Optional[DiskCache] = None
+    meta_cache: Optional[MetadataCache] = None
+    ocr_daemon: Optional["OcrDaemonClient"] = None
+    profiler: Optional[Profiler] = None
+    owned: list = field(default_factory=list)
+
+    def close(self) -> None:
+        while self.owned:
+            self.owned.pop().close()
+
+
+# youtube-transcript-api 是阻塞调用，在守护线程中运行；超时后不再等待其结果
+TRANSCRIPT_TIMEOUT = 120
+
+
+async def fetch_stage_async(job: VideoJob, args, ctx: RunContext) -> None:
+    """网络阶段：并发获取元数据、字幕，以及（非流式时）下载视频文件。
+
+    三者互不依赖，用 gather(return_exceptions=True) 同时运行：某一项失败
+    不会取消其他项，已成功的元数据和字幕仍会写入清单，下次运行可复用。
+    清单中已完成且输入未变化的部分直接复用。"""
+    job.out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = job.manifest = StageManifest(job.out_dir, args.force_stage)
+    params = job.params = stage_params(args, job.video_id, ctx.ocr_daemon)
+    meta_path = job.out_dir / "metadata.json"
+    transcript_path = job.out_dir / "transcript.json"
+
+    cache = ctx.meta_cache
+    cached = {}
+    for stage in ("metadata", "transcript"):
+        # --force-stage 要求重新获取时不读取缓存（结果仍写回缓存）
+        if cache is None or stage in manifest.force:
+            continue
+        if not manifest.fresh(stage, params[stage]):
+            cached[stage] = cache.get(stage, job.video_id)
+
+    tasks = {}
+    if manifest.fresh("metadata", params["metadata"]):
+        print("[*] 元数据已是最新，复用 metadata.json")
+        job.meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    elif cached.get("metadata") is not None:
+        print("[*] 元数据缓存命中，跳过 yt-dlp")
+        tasks["metadata"] = asyncio.sleep(0, cached["metadata"])
+    else:
+        tasks["metadata"] = get_video_metadata(job.url)
+    if manifest.fresh("transcript", params["transcript"]):
+        print("[*] 字幕已是最新，复用 transcript.json")
+        job.transcript = json.loads(transcript_path.read_text(encoding="utf-8"))
+    elif cached.get("transcript") is not None:
+        print("[*] 字幕缓存命中，跳过字幕获取")
+        tasks["transcript"] = asyncio.sleep(0, cached["transcript"])
+    else:
+        tasks["transcript"] = asyncio.wait_for(
+            run_blocking_async(get_transcript, job.video_id), TRANSCRIPT_TIMEOUT
+        )
+    if args.adaptive:
+        # 章节和字幕都不经网络获取时，自适应帧的参数此时已知；否则帧阶段
+        # 视为需要重新提取，获取后再按实际内容判断
+        sources = {
+            stage: cached[stage] if stage in tasks else value
+            for stage, value in (("metadata", job.meta), ("transcript", job.transcript))
+            if stage not in tasks or cached.get(stage) is not None
+        }
+        if len(sources) == 2:
+            params["frames"]["sources"] = adaptive_sources(
+                sources["metadata"], sources["transcript"]
+            )
+    if args.transcript_only:
+        print("[*] --transcript-only：跳过视频下载")
+    elif args.stream_download:
+        pass
+    elif needs_video(job, args, refetch_meta="metadata" in tasks):
+        tasks["video"] = download_video(job.url, job.out_dir)
+    else:
+        print("[*] 帧已是最新，跳过视频下载")
+
+    results = dict(
+        zip(tasks, await asyncio.gather(*tasks.values(), return_exceptions=True))
+    )
+
+    # 1. 元数据
+    meta = results.get("metadata")
+    if isinstance(meta, dict):
+        job.meta = meta
+        if cache is not None and meta is not cached.get("metadata"):
+            cache.put("metadata", job.video_id, meta)
+        # 将原始元数据转储以供将来参考
+        meta_path.write_text(
+            json.dumps(job.meta, indent=2, default=str), encoding="utf-8"
+        )
+        manifest.record("metadata", params["metadata"], [meta_path])
+
+    # 2. 字幕
+    transcript = results.get("transcript")
+    if isinstance(transcript, BaseException):
+        print(f"[!] 字幕获取失败（{transcript or '超时'}）。将在没有字幕的情况下继续。")
+    elif "transcript" in results:
+        job.transcript = transcript
+        # 获取失败（可能是暂时的）不记录，下次运行重试
+        if transcript is not None:
+            if cache is not None and transcript is not cached.get("transcript"):
+                cache.put("transcript", job.video_id, transcript)
+            transcript_path.write_text(
+                json.dumps(transcript, indent=2, ensure_ascii=False),
+                encoding="utf-8",
+            )
+            manifest.record("transcript", params["transcript"], [transcript_path])
+
+    video = results.get("video")
+    if isinstance(video, Path):
+        job.video_path = video
+    if isinstance(meta, BaseException):
+        raise meta
+    if args.adaptive:
+        params["frames"]["sources"] = adaptive_sources(job.meta, job.transcript)
+    if isinstance(video, BaseException):
+        raise video
+    print(f"    标题：    {job.meta.get('title')}")
+    print(f"    频道：  {job.meta.get('channel', job.meta.get('uploader'))}")
+    print(f"    时长：{fmt_timestamp(job.meta.get('duration', 0))}")
+
+
+def fetch_stage(job: VideoJob, args, ctx: RunContext) -> None:
+    """`fetch_stage_async` 的同步入口；批量模式下每个下载线程各自运行事件循环。"""
+    try:
+        asyncio.run(fetch_stage_async(job, args, ctx))
+    except BaseException:
+        # 元数据失败时并发下载的视频已无用
+        release_video(job, args)
+        raise
+
+
+def needs_video(job: VideoJob, args, refetch_meta: bool = False) -> bool:
+    """帧需要重新提取，或整段视频调色板需要重新统计时才需要视频。
+    `refetch_meta` 表示元数据将被重新获取，依赖它的调色板随之失效。"""
+    manifest, params = job.manifest, job.params
+    if not manifest.fresh("frames", params["frames"]):
+        return True
+    return (
+        args.colors
+        and args.palette_source == "video"
+        and params["palette"]["engine"] == "histogram"
+        and (refetch_meta or not manifest.fresh("palette", params["palette"]))
+    )
+
+
+def decode_stage(job: VideoJob, args, ctx: RunContext) -> None:
+    """解码阶段：提取关键帧（内存帧管道会顺带完成间隔帧的 OCR/调色板），
+    清理视频，然后对帧去重。"""
+    if args.transcript_only:
+        return
+    meta, manifest, params = job.meta, job.manifest, job.params
+    if args.colors:
+        job.palette_engine = load_engine("palette", params["palette"]["engine"])
+    palette_engine = job.palette_engine
+    frame_format = FrameFormat(args.frame_format, args.frame_quality)
+    frames_fresh = manifest.fresh("frames", params["frames"])
+    if args.stream_download and not frames_fresh:
+        # 边下载边解码：ffmpeg 直接读取下载进程的 stdout
+        job.video_path = open_video_stream(job.url, args.source_cmd)
+    video_path = job.video_path
+
+    # 3. 关键帧
+    try:
+        if frames_fresh:
+            print("[*] 帧已是最新，复用上次提取的帧")
+            outputs = manifest.outputs("frames")
+            job.interval_frames = [job.out_dir / f for f in outputs["interval"]]
+            job.scene_frames = [job.out_dir / f for f in outputs["scene"]]
+            job.frame_times = {
+                job.out_dir / f: t for f, t in outputs["frame_times"].items()
+            }
+        else:
+            clear_frames(job.out_dir)
+        if args.stream_frames and not frames_fresh:
+            job.streamed = stream_frames_interval(
+                video_path,
+                job.out_dir,
+                interval=args.interval,
+                scene_threshold=args.scene_threshold if args.scene_detect else None,
+                ocr_engine=args.ocr_engine if args.ocr else None,
+                palette_engine=palette_engine,
+                frame_size=stream_frame_size(meta) if args.stream_download else None,
+                duration=meta.get("duration") or 0,
+                cache=ctx.ocr_cache,
+                text_threshold=args.text_threshold if args.text_filter else None,
+                frame_format=frame_format,
+                ocr_options=ocr_options_for(args),
+                ocr_daemon=ctx.ocr_daemon,
+            )
+        if job.streamed is not None:
+            job.interval_frames = job.streamed["interval_frames"]
+            job.scene_frames = job.streamed["scene_frames"]
+            job.frame_times = job.streamed["frame_times"]
+            job.palette_stats = job.streamed["palette_stats"]
+        elif frames_fresh:
+            pass
+        elif args.adaptive:
+            # 按内容选择时间点逐帧定位提取；场景帧仍由场景检测单独提取
+            job.interval_frames, job.frame_times = extract_frames_adaptive(
+                video_path,
+                job.out_dir,
+                meta,
+                job.transcript,
+                interval=args.interval,
+                budget=args.frame_budget,
+                frame_format=frame_format,
+            )
+            if args.scene_detect:
+                job.scene_frames, scene_times = extract_frames_scene(
+                    video_path,
+                    job.out_dir,
+                    threshold=args.scene_threshold,
+                    frame_format=frame_format,
+                )
+                job.frame_times.update(scene_times)
+        elif args.segments > 1 and isinstance(video_path, Path):
+            # 按关键帧分段，多个 ffmpeg 进程并行解码
+            job.interval_frames, job.scene_frames, job.frame_times = (
+                extract_frames_segmented(
+                    video_path,
+                    job.out_dir,
+                    interval=args.interval,
+                    threshold=args.scene_threshold if args.scene_detect else None,
+                    segments=args.segments,
+                    duration=meta.get("duration") or 0,
+                    frame_format=frame_format,
+                )
+            )
+        elif args.scene_detect:
+            # 单次解码同时产出间隔帧和场景帧
+            job.interval_frames, job.scene_frames, job.frame_times = (
+                extract_frames_combined(
+                    video_path,
+                    job.out_dir,
+                    interval=args.interval,
+                    threshold=args.scene_threshold,
+                    frame_format=frame_format,
+                )
+            )
+        else:
+            job.interval_frames = extract_frames_interval(
+                video_path,
+                job.out_dir,
+                interval=args.interval,
+                frame_format=frame_format,
+            )
+            job.frame_times = interval_frame_timestamps(
+                job.interval_frames, args.interval
+            )
+        frame_times = job.frame_times
+        # 流式下载在帧提取后即可关闭；下载失败或中途截断时帧集合不完整，
+        # 不能作为已完成的阶段写入清单
+        if args.stream_download and not release_video(job, args):
+            raise CommandError("视频流下载失败或被截断，提取的帧不完整")
+        # 提取失败时上面已抛出 CommandError；没有产生帧（视频过短或损坏）
+        # 也不记录，下次运行重新提取
+        if not frames_fresh and job.interval_frames:
+            extracted = job.interval_frames + job.scene_frames
+            rel = {f: os.path.relpath(f, job.out_dir) for f in extracted}
+            manifest.record(
+                "frames",
+                params["frames"],
+                extracted,
+                outputs={
+                    "interval": [rel[f] for f in job.interval_frames],
+                    "scene": [rel[f] for f in job.scene_frames],
+                    "frame_times": {rel[f]: t for f, t in frame_times.items()},
+                },
+            )
+        palette_pending = not manifest.fresh("palette", params["palette"])
+        if palette_engine and palette_engine.name == "histogram" and palette_pending:
+            # 章节和场景边界此时已知，颜色统计按片段同步累计
+            scene_times = [frame_times[f] for f in job.scene_frames if f in frame_times]
+            timeline_args = (
+                meta.get("chapters") or [],
+                scene_times,
+                meta.get("duration") or max(frame_times.values(), default=0),
+            )
+            job.palette_timeline = PaletteTimeline(*timeline_args)
+        if job.palette_timeline and args.palette_source == "video":
+            if video_path is None or args.stream_download:
+                print("[!] --palette-source video 需要已下载的视频文件，改用逐帧统计")
+            else:
+                hist = video_color_histogram(video_path, timeline=job.palette_timeline)
+                if hist is not None:
+                    # 整段视频的直方图已覆盖所有帧，无需再逐帧统计
+                    job.palette_stats = {video_path: hist}
+                else:
+                    # 丢弃失败解码中途累计的片段统计
+                    job.palette_timeline = PaletteTimeline(*timeline_args)
+    finally:
+        release_video(job, args)
+
+    all_frames = job.interval_frames + job.scene_frames
+    if args.frame_store:
+        # 帧已是最新时直接复用上次打包的存储
+        run_id = manifest.run_id("frames")
+        job.frame_store = FrameStore.open(
+            job.out_dir, all_frames, args.frame_store, run_id
+        )
+        if job.frame_store is None:
+            job.frame_store = FrameStore.build(
+                job.out_dir, all_frames, job.frame_times, args.frame_store, run_id
+            )
+    ocr_pending = args.ocr and not manifest.fresh("ocr", params["ocr"])
+    palette_pending = palette_engine and not manifest.fresh(
+        "palette", params["palette"]
+    )
+    if args.dedup and (ocr_pending or palette_pending):
+        if NUMPY_AVAILABLE and PILLOW_AVAILABLE:
+            job.duplicates = dedupe_frames(
+                all_frames,
+                threshold=args.dedup_threshold,
+                method=args.hash_method,
+                store=job.frame_store,
+            )
+        else:
+            print("[!] --dedup 需要 numpy 和 Pillow，跳过帧去重")
+    job.unique_frames = [f for f in all_frames if job.duplicates.get(f, f) == f]
+
+
+def release_video(job: VideoJob, args) -> bool:
+    """关闭下载流或删除已下载的视频文件。
+    流式下载失败或被截断时返回 False（读到的视频数据不完整）。"""
+    if job.video_path is None:
+        return True
+    ok = True
+    if args.stream_download:
+        ok = close_video_stream(job.video_path)
+    else:
+        # 始终清理视频文件以节省空间
+        print("[*] 正在删除下载的视频以节省空间…")
+        job.video_path.unlink(missing_ok=True)
+    job.video_path = None
+    return ok
+
+
+def analyze_stage(job: VideoJob, args, ctx: RunContext) -> None:
+    """分析阶段：OCR、调色板分析，最后构建 markdown。"""
+    if not args.transcript_only:
+        all_frames = job.interval_frames + job.scene_frames
+
+        manifest, params = job.manifest, job.params
+
+        # 4. OCR 提取
+        ocr_path = job.out_dir / "ocr-results.json"
+        ocr_log_path = job.out_dir / OCR_LOG
+        if args.ocr and manifest.fresh("ocr", params["ocr"]):
+            print("[*] OCR 结果已是最新，复用 ocr-results.json")
+            if ocr_log_path.exists():
+                job.ocr_results = OcrResults(ocr_log_path, job.out_dir)
+            else:
+                # 旧版本的输出目录只有 ocr-results.json
+                ocr_json = json.loads(ocr_path.read_text(encoding="utf-8"))
+                job.ocr_results = {
+                    rebase_frame(job.out_dir, f): text for f, text in ocr_json.items()
+                }
+        elif args.ocr:
+            log = OcrLog(
+                ocr_log_path,
+                job.out_dir,
+                manifest.run_key("ocr", params["ocr"]),
+                resume="ocr" not in manifest.force,
+            )
+            with log:
+                if log.done:
+                    print(
+                        f"[*] 沿用上次中断前的 {len(log.done)} 帧 OCR 结果（{OCR_LOG}）"
+                    )
+                if job.streamed is not None:
+                    # 间隔帧已在内存管道中完成 OCR
+                    for f, text in job.streamed["ocr_results"].items():
+                        if f not in log.done:
+                            log.append(f, text)
+                # 每个结果完成后立即追加到 ocr-results.jsonl；生成器不能用
+                # @profiled 计时，在这里把整个识别循环记为一个区间
+                pending = [f for f in job.unique_frames if f not in log.done]
+                with profile_span("iter_ocr_on_frames", "ocr") as info:
+                    for f, text in iter_ocr_on_frames(
+                        pending,
+                        ocr_engine=args.ocr_engine,
+                        cache=ctx.ocr_cache,
+                        batch_size=args.ocr_batch_size,
+                        procs=args.ocr_procs,
+                        text_threshold=(
+                            args.text_threshold if args.text_filter else None
+                        ),
+                        store=job.frame_store,
+                        ocr_options=ocr_options_for(args),
+                        ocr_daemon=ctx.ocr_daemon,
+                    ):
+                        log.append(f, text)
+                    info["items"] = len(pending)
+                for f, rep in job.duplicates.items():
+                    if rep != f and f not in log.done:
+                        log.alias(f, rep)
+            job.ocr_results = OcrResults(ocr_log_path, job.out_dir)
+            # ocr-results.json 供外部工具使用（重复帧使用代表帧的文本）
+            write_ocr_json(ocr_path, all_frames, job.ocr_results)
+            manifest.record("ocr", params["ocr"], [ocr_log_path, ocr_path])
+
+        # 5. 调色板分析
+        palette_path = job.out_dir / "color-palette.json"
+        if job.palette_engine and manifest.fresh("palette", params["palette"]):
+            print("[*] 调色板已是最新，复用 color-palette.json")
+            if palette_path.exists():
+                job.color_analysis = json.loads(
+                    palette_path.read_text(encoding="utf-8")
+                )
+        elif job.palette_engine:
+            palette_frames = job.unique_frames
+            if args.palette_source == "video" and job.palette_stats:
+                palette_frames = []
+            elif job.streamed is not None:
+                # 间隔帧已在内存管道中完成统计，只需处理场景帧
+                scene_set = set(job.scene_frames)
+                palette_frames = [f for f in job.unique_frames if f in scene_set]
+            store = job.frame_store
+            if store and not job.palette_engine.sample_frames:
+                # 逐帧统计的引擎直接读取打包存储中的缩小帧
+                print(f"[*] 正在从 {FrameStore.ARRAY} 统计 {len(palette_frames)} 帧")
+                for f in palette_frames:
+                    if f in store:
+                        job.palette_stats[f] = job.palette_engine.analyze_frame(
+                            store[f], label=f
+                        )
+                palette_frames = [f for f in palette_frames if f not in store]
+            job.color_analysis = job.palette_engine.run(
+                palette_frames,
+                precomputed=job.palette_stats,
+                frame_times=job.frame_times,
+                timeline=job.palette_timeline,
+                duplicates=job.duplicates,
+            )
+            files = []
+            if job.color_analysis:
+                palette_path.write_text(
+                    json.dumps(job.color_analysis, indent=2), encoding="utf-8"
+                )
+                files.append(palette_path)
+            manifest.record("palette", params["palette"], files)
+
+    # 6. 构建 markdown
+    if args.thumbnails and not args.transcript_only:
+        job.thumbnails = make_thumbnails(
+            job.interval_frames + job.scene_frames,
+            job.out_dir,
+            width=args.thumbnails,
+            frame_format=FrameFormat(args.frame_format, args.frame_quality),
+        )
+    job.md_path = build_markdown(
+        job.meta,
+        job.transcript,
+        job.interval_frames,
+        job.scene_frames,
+        job.out_dir,
+        None if args.adaptive else args.interval,
+        ocr_results=job.ocr_results,
+        color_analysis=job.color_analysis,
+        frame_times=job.frame_times,
+        duplicates=job.duplicates,
+        thumbnails=job.thumbnails,
+    )
+
+    # 7. 更新跨视频全文索引
+    if not args.no_search_index:
+        index_job(job, args)
+
+
+# (阶段名, 阶段函数)：网络 → ffmpeg → OCR/CPU
+STAGES = (
+    ("下载", fetch_stage),
+    ("解码", decode_stage),
+    ("分析", analyze_stage),
+)
+
+
+def print_summary(result: "ExtractionResult") -> None:
+    out_dir = result.out_dir
+    print("\n" + "=" * 60)
+    print("完成！输出目录：", out_dir)
+    print("=" * 60)
+    print(f"  参考文档  : {result.reference}")
+    print(f"  元数据       : {out_dir / 'metadata.json'}")
+    interval_frames = sum(1 for f in result.frames if f.kind == "interval")
+    scene_frames = len(result.frames) - interval_frames
+    if interval_frames:
+        print(f"  间隔帧：{interval_frames} 在 frames/ 中")
+    if scene_frames:
+        print(f"  场景帧   : {scene_frames} 在 frames_scene/ 中")
+    if result.ocr:
+        texts = {hit.frame: hit.text for hit in result.ocr}
+        frames_with_text = sum(
+            1
+            for f in result.frames
+            if len(texts.get(f.duplicate_of or f.path, "")) > 10
+        )
+        print(
+            f"  OCR 结果    : {frames_with_text} 帧有文本 → ocr-results.json"
+        )
+    if result.palette:
+        print(
+            f"  调色板  : {len(result.palette.get('dominant_colors', []))} 种颜色 → color-palette.json"
+        )
+    print()
+    print("下一步：")
+    print("  1. 审查 extracted-reference.md")
+    print("  2. 为您的 agent 整理/注释内容")
+    print("  3. 将文件提供给 Claude 以生成 SKILL.md 或 agent 定义")
+
+
+# ---------------------------------------------------------------------------
+# 批量 / 播放列表模式
+# ---------------------------------------------------------------------------
+
+
+def is_playlist_url(url: str) -> bool:
+    """只带播放列表参数、不指向具体视频的 URL 视为播放列表。"""
+    return bool(re.search(r"[?&]list=|/playlist\b", url)) and not re.search(
+        r"(?:v=|youtu\.be/|shorts/|embed/)", url
+    )
+
+
+def expand_playlist(url: str) -> list[str]:
+    """使用 yt-dlp 的扁平模式列出播放列表中的视频 ID（不下载任何视频）。"""
+    require_yt_dlp()
+    cmd = ["yt-dlp", "--flat-playlist", "--print", "id", url]
+    print(f"[*] 正在展开播放列表：{url}")
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    except subprocess.TimeoutExpired:
+        raise CommandError(f"展开播放列表超时：{url}") from None
+    if result.returncode != 0:
+        raise CommandError(f"yt-dlp 播放列表展开失败：\n{result.stderr}")
+    ids = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+    print(f"    → {len(ids)} 个视频")
+    return ids
+
+
+def read_batch_file(path: str) -> list[str]:
+    """读取批量文件（`-` 表示 stdin）：每行一个 URL 或 ID，忽略空行和 # 注释行。"""
+    text = sys.stdin.read() if path == "-" else Path(path).read_text(encoding="utf-8")
+    return [
+        line.strip()
+        for line in text.splitlines()
+        if line.strip() and not line.lstrip().startswith("#")
+    ]
+
+
+def collect_jobs(urls: list[str], root: Path) -> list[VideoJob]:
+    """展开播放列表并去除重复视频；每个视频的输出目录位于 `root` 下。"""
+    jobs: list[VideoJob] = []
+    seen: set[str] = set()
+    for url in urls:
+        try:
+            entries = expand_playlist(url) if is_playlist_url(url) else [url]
+            for entry in entries:
+                video_id = extract_video_id(entry)
+                if video_id in seen:
+                    continue
+                seen.add(video_id)
+                jobs.append(
+                    VideoJob(
+                        url=entry,
+                        video_id=video_id,
+                        out_dir=root / f"yt-extract-{video_id}",
+                    )
+                )
+        except ExtractorError as e:
+            print(f"[!] 跳过 {url}：{e}")
+    return jobs
+
+
+def run_batch(
+    jobs: list[VideoJob], args, ctx: RunContext
+) -> list[VideoJob]:
+    """以流水线方式处理多个视频。
+
+    每个阶段有各自的工作线程数（下载 / 解码 / 分析），阶段之间用容量为
+    `args.queue_size` 的有界队列连接：下游变慢时上游的 put 会阻塞，
+    因此等待解码的已下载视频数量有上限，而网络、ffmpeg 和 OCR 可以
+    同时忙碌。某个阶段失败的视频记录错误后直接流过后续阶段。"""
+    done = object()
+    counts = (args.download_workers, args.decode_workers, args.ocr_workers)
+    queues = [queue.Queue(maxsize=max(1, args.queue_size)) for _ in STAGES]
+    finished = queue.Queue()
+    queues.append(finished)
+    total = len(jobs)
+
+    def worker(index: int) -> None:
+        name, stage = STAGES[index]
+        inbox, outbox = queues[index], queues[index + 1]
+        while True:
+            job = inbox.get()
+            if job is done:
+                return
+            if job.error is None:
+                print(f"[*] [{job.video_id}] 开始{name}阶段")
+                try:
+                    with profile_span(f"{name}阶段"):
+                        stage(job, args, ctx)
+                except Exception as e:
+                    job.error = f"{name}阶段失败：{e}"
+                    print(f"[!] [{job.video_id}] {job.error}")
+                    release_video(job, args)
+            outbox.put(job)
+            if outbox is finished:
+                status = "失败" if job.error else "完成"
+                print(f"[✓] [{job.video_id}] {status}（{finished.qsize()}/{total}）")
+
+    print(
+        f"[*] 批量处理 {total} 个视频"
+        f"（下载 {counts[0]} / 解码 {counts[1]} / 分析 {counts[2]} 个工作线程）"
+    )
+    pools = []
+    for index, count in enumerate(counts):
+        threads = [
+            threading.Thread(target=in_context(worker), args=(index,), daemon=True)
+            for _ in range(max(1, count))
+        ]
+        for t in threads:
+            t.start()
+        pools.append(threads)
+
+    # 入口队列同样有界，喂入速度受下载阶段约束
+    for job in jobs:
+        queues[0].put(job)
+    # 逐阶段关闭：某阶段的线程全部退出后，才向下一阶段发送结束标记
+    for index, threads in enumerate(pools):
+        for _ in threads:
+            queues[index].put(done)
+        for t in threads:
+            t.join()
+    return jobs
+
+
+def write_batch_summary(jobs: list[VideoJob], root: Path) -> Path:
+    """写入 batch-summary.json 并打印每个视频的结果。"""
+    summary = [
+        {
+            "url": job.url,
+            "video_id": job.video_id,
+            "output_dir": str(job.out_dir),
+            "title": job.meta.get("title"),
+            "reference": str(job.md_path) if job.md_path else None,
+            "error": job.error,
+        }
+        for job in jobs
+    ]
+    path = root / "batch-summary.json"
+    path.write_text(
+        json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8"
+    )
+
+    failed = sum(1 for job in jobs if job.error)
+    print("\n" + "=" * 60)
+    print(f"批量完成：{len(jobs) - failed}/{len(jobs)} 个视频成功")
+    print("=" * 60)
+    for job in jobs:
+        mark = "✗" if job.error else "✓"
+        print(f"  [{mark}] {job.video_id}  {job.error or job.meta.get('title', '')}")
+    print(f"\n  摘要 : {path}")
+    return path
+
+
+def write_profile(out_dir: Path, profiler: Optional[Profiler]) -> None:
+    """启用 --profile 时写入本次调用的 trace 文件并打印汇总表。"""
+    if profiler is None or not out_dir.exists():
+        return
+    path = profiler.write_trace(out_dir / "profile-trace.json")
+    print("\n" + "=" * 60)
+    print("性能剖析（在 chrome://tracing 或 https://ui.perfetto.dev 中打开 trace）")
+    print("=" * 60)
+    profiler.print_summary()
+    print(f"\n  Trace : {path}")
+
+
+# ---------------------------------------------------------------------------
+# 跨视频全文索引（search 子命令）
+# ---------------------------------------------------------------------------
+
+SEARCH_INDEX = "search.sqlite3"
+# 索引中字幕块的最短时长（秒）：比 Markdown 的 60 秒块更短，命中的时间戳更精确
+SEARCH_CHUNK_SECONDS = 20
+SEARCH_KINDS = ("transcript", "ocr", "chapter", "metadata")
+
+
+def _ms(seconds: Optional[float]) -> Optional[int]:
+    return (
+        None if seconds is None or not math.isfinite(seconds) else round(seconds * 1000)
+    )
+
+
+def search_documents(
+    meta: dict,
+    transcript: Optional[list[dict]],
+    frames: list[tuple[Path, Optional[float]]],
+    ocr_results: Mapping[Path, str],
+    out_dir: Path,
+) -> Iterator[tuple[str, Optional[float], Optional[float], Optional[str], str]]:
+    """产出一个视频的待索引文档 (kind, 开始秒, 结束秒, 帧相对路径, 文本)。
+
+    字幕按 `SEARCH_CHUNK_SECONDS` 分块；OCR 文本按帧时间排序，连续相同的
+    文本（同一张幻灯片、去重折叠的帧）合并为一个覆盖整段时间的文档。"""
+    duration = meta.get("duration") or None
+    head = [meta.get("title") or "", meta.get("description") or ""]
+    head.append(" ".join(meta.get("tags") or []))
+    yield "metadata", 0.0, duration, None, "\n".join(t for t in head if t)
+
+    for ch in meta.get("chapters") or []:
+        title = ch.get("title")
+        if title:
+            yield "chapter", ch.get("start_time", 0), ch.get("end_time"), None, title
+
+    if transcript:
+        chunks = group_transcript(transcript, SEARCH_CHUNK_SECONDS)
+        last = transcript[-1]
+        tail = last["start"] + (last.get("duration") or 0)
+        for chunk, following in itertools.zip_longest(chunks, chunks[1:]):
+            end = following["start"] if following else tail
+            yield "transcript", chunk["start"], end, None, chunk["text"]
+
+    # 帧上的文本一直显示到下一个不同文本的帧（最后一段到视频结尾）
+    run: Optional[list] = None
+    for frame, t in sorted(frames, key=lambda ft: (ft[1] is None, ft[1] or 0)):
+        text = ocr_results.get(frame, "").strip()
+        if run is not None:
+            if text == run[4]:
+                continue
+            run[2] = t
+            yield tuple(run)
+            run = None
+        if len(text) > 5:
+            run = ["ocr", t, None, os.path.relpath(frame, out_dir), text]
+    if run is not None:
+        run[2] = duration
+        yield tuple(run)
+
+
+@dataclass(slots=True, frozen=True)
+class SearchHit:
+    """一条搜索结果。`snippet` 中命中的词用 [ ] 标出；时间为毫秒。"""
+
+    video_id: str
+    title: str
+    kind: str
+    start_ms: Optional[int]
+    end_ms: Optional[int]
+    snippet: str
+    frame: Optional[str]
+    out_dir: str
+
+    @property
+    def url(self) -> str:
+        seconds = (self.start_ms or 0) // 1000
+        return f"https://youtu.be/{self.video_id}?t={seconds}"
+
+
+# 含这些 FTS5 语法的查询原样交给 MATCH；其余查询按空白拆成词
+FTS_SYNTAX = re.compile(r'["()*^:]|\b(?:AND|OR|NOT|NEAR)\b')
+# trigram 分词器只能匹配至少这么多字符的词
+FTS_MIN_TERM = 3
+
+
+def fts_query(query: str) -> tuple[Optional[str], list[str]]:
+    """把用户查询拆成 (MATCH 表达式, LIKE 子串列表)，两者都要满足。
+
+    普通查询的每个词都作为子串匹配：不少于 `FTS_MIN_TERM` 个字符的词用
+    引号包成 FTS5 短语，更短的词（例如两个汉字的「颜色」）trigram 索引
+    无法匹配，改用 LIKE。"""
+    if FTS_SYNTAX.search(query):
+        return query, []
+    terms = query.split()
+    long = [t for t in terms if len(t) >= FTS_MIN_TERM]
+    match = " ".join('"' + t.replace('"', '""') + '"' for t in long) or None
+    return match, [t for t in terms if len(t) < FTS_MIN_TERM]
+
+
+class SearchIndex:
+    """跨视频的 SQLite FTS5 全文索引，覆盖字幕块、OCR 文本、章节和元数据。
+
+    `segments` 表保存文档及其视频和时间段，`segments_fts` 是以它为外部
+    内容的 FTS5 表，由触发器同步；按视频重建索引只需按 video_id 索引
+    删除该视频的行。WAL 模式允许批量模式的多个线程和多个进程同时写入。
+
+    FTS5 使用 trigram 分词器（SQLite 3.34+）按子串匹配：unicode61 把
+    连续的汉字当作一个词，「颜色」搜不到「今天我们讲颜色规范」。旧版用
+    unicode61 建立的索引在打开时按 `segments` 表重建。"""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS videos ("
+        " video_id TEXT PRIMARY KEY, title TEXT, channel TEXT, url TEXT,"
+        " out_dir TEXT, duration_ms INTEGER, indexed_at REAL)",
+        "CREATE TABLE IF NOT EXISTS segments ("
+        " id INTEGER PRIMARY KEY, video_id TEXT NOT NULL, kind TEXT NOT NULL,"
+        " start_ms INTEGER, end_ms INTEGER, frame TEXT, text TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS segments_video ON segments(video_id)",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5("
+        " text, content='segments', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN"
+        " INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text); END",
+        "CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN"
+        " INSERT INTO segments_fts(segments_fts, rowid, text)"
+        " VALUES ('delete', old.id, old.text); END",
+    )
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with self._conn:
+                row = self._conn.execute(
+                    "SELECT sql FROM sqlite_master WHERE name = 'segments_fts'"
+                ).fetchone()
+                rebuild = row is not None and "trigram" not in row[0]
+                if rebuild:
+                    self._conn.execute("DROP TABLE segments_fts")
+                for statement in self.SCHEMA:
+                    self._conn.execute(statement)
+                if rebuild:
+                    self._conn.execute(
+                        "INSERT INTO segments_fts(segments_fts) VALUES ('rebuild')"
+                    )
+        except sqlite3.OperationalError as e:
+            self._conn.close()
+            raise DependencyError(
+                f"SQLite 不支持 FTS5 trigram 全文索引（需要 3.34+）：{e}"
+            ) from None
+
+    def add_video(
+        self, video_id: str, url: str, out_dir: Path, meta: dict, documents
+    ) -> int:
+        """在一个事务中替换该视频的全部文档，返回写入的文档数。"""
+        rows = [
+            (video_id, kind, _ms(start), _ms(end), frame, text)
+            for kind, start, end, frame, text in documents
+            if text
+        ]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM segments WHERE video_id = ?", (video_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    video_id,
+                    meta.get("title"),
+                    meta.get("channel", meta.get("uploader")),
+                    url,
+                    str(out_dir.resolve()),
+                    _ms(meta.get("duration")),
+                    time.time(),
+                ),
+            )
+            self._conn.executemany(
+                "INSERT INTO segments (video_id, kind, start_ms, end_ms, frame, text)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        kind: Optional[str] = None,
+        video_id: Optional[str] = None,
+    ) -> list[SearchHit]:
+        """搜索同时包含各个词的文档（例如 `design tokens`、`颜色`），也接受
+        FTS5 查询语法（例如 `"color palette" NOT gradient`），按 BM25 相关度
+        排序；查询只含短词（见 `fts_query`）时按视频和时间排序。"""
+        match, substrings = fts_query(query)
+        if match is None and not substrings:
+            return []
+        columns = (
+            "SELECT s.video_id, COALESCE(v.title, ''), s.kind, s.start_ms, s.end_ms,"
+        )
+        if match is not None:
+            sql = (
+                f"{columns} snippet(segments_fts, 0, '[', ']', '…', 64), s.frame,"
+                " COALESCE(v.out_dir, '')"
+                " FROM segments_fts"
+                " JOIN segments s ON s.id = segments_fts.rowid"
+                " LEFT JOIN videos v ON v.video_id = s.video_id"
+                " WHERE segments_fts MATCH ?"
+            )
+            params: list = [match]
+            order = "rank"
+        else:
+            sql = (
+                f"{columns} substr(s.text, 1, 80), s.frame, COALESCE(v.out_dir, '')"
+                " FROM segments s"
+                " LEFT JOIN videos v ON v.video_id = s.video_id"
+                " WHERE 1"
+            )
+            params = []
+            order = "s.video_id, s.start_ms"
+        for term in substrings:
+            sql += " AND s.text LIKE ? ESCAPE '\\'"
+            params.append("%" + re.sub(r"([\\%_])", r"\\\1", term) + "%")
+        if kind:
+            sql += " AND s.kind = ?"
+            params.append(kind)
+        if video_id:
+            sql += " AND s.video_id = ?"
+            params.append(video_id)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            try:
+                rows = self._conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                raise InvalidInputError(f"无效的搜索查询 {query!r}：{e}") from None
+        return [SearchHit(*row) for row in rows]
+
+    def stats(self) -> tuple[int, int]:
+        """返回 (视频数, 文档数)。"""
+        with self._lock:
+            videos = self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+            docs = self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return videos, docs
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def search_index_path(args) -> Path:
+    if args.search_index:
+        return Path(args.search_index)
+    return cache_dir_for(args) / SEARCH_INDEX
+
+
+def index_job(job: VideoJob, args) -> None:
+    """提取完成后把该视频写入全文索引；索引失败不影响提取结果。"""
+    frames = [
+        (f, job.frame_times.get(f)) for f in job.interval_frames + job.scene_frames
+    ]
+    # 重复帧没有单独的 OCR 结果，使用代表帧的文本
+    ocr = {f: job.ocr_results.get(job.duplicates.get(f, f), "") for f, _ in frames}
+    try:
+        index = SearchIndex(search_index_path(args))
+        try:
+            count = index.add_video(
+                job.video_id,
+                job.url,
+                job.out_dir,
+                job.meta,
+                search_documents(job.meta, job.transcript, frames, ocr, job.out_dir),
+            )
+        finally:
+            index.close()
+    except (sqlite3.Error, ExtractorError) as e:
+        print(f"[!] 全文索引更新失败：{e}")
+        return
+    print(f"[✓] 已索引 {count} 个文档 → {index.path}")
+
+
+def index_output_dir(index: SearchIndex, out_dir: Path) -> int:
+    """从已有的输出目录（manifest.json 及各阶段输出）重建该视频的索引。"""
+    stages = json.loads((out_dir / "manifest.json").read_text(encoding="utf-8"))[
+        "stages"
+    ]
+
+    def load(name: str):
+        path = out_dir / name
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+    meta = load("metadata.json") or {}
+    video_id = stages.get("metadata", {}).get("params", {}).get("video_id")
+    video_id = video_id or meta.get("id") or out_dir.name.removeprefix("yt-extract-")
+    outputs = (stages.get("frames") or {}).get("outputs") or {}
+    frame_times = {out_dir / f: t for f, t in outputs.get("frame_times", {}).items()}
+    frames = [
+        (out_dir / f, frame_times.get(out_dir / f))
+        for f in outputs.get("interval", []) + outputs.get("scene", [])
+    ]
+    if (out_dir / OCR_LOG).exists():
+        ocr: Mapping[Path, str] = OcrResults(out_dir / OCR_LOG, out_dir)
+    else:
+        ocr = {
+            rebase_frame(out_dir, f): t
+            for f, t in (load("ocr-results.json") or {}).items()
+        }
+    return index.add_video(
+        video_id,
+        meta.get("webpage_url") or f"https://youtu.be/{video_id}",
+        out_dir,
+        meta,
+        search_documents(meta, load("transcript.json"), frames, ocr, out_dir),
+    )
+
 
-    md_path = out_dir / "extracted-reference.md"
-    md_path.write_text("\n".join(lines), encoding="utf-8")
-    print(f"[✓] Markdown 参考已写入 {md_path}")
-    return md_path
+def search_main(argv: list[str]) -> None:
+    """`search` 子命令：查询全文索引，或从已有输出目录重建索引。"""
+    parser = argparse.ArgumentParser(
+        prog="yt-design-extractor.py search",
+        description="在已提取视频的字幕、OCR 文本、章节和元数据中全文搜索。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=textwrap.dedent("""\
+            示例：
+              %(prog)s "design tokens"
+              %(prog)s '"color palette" NOT gradient' --kind ocr --limit 50
+              %(prog)s --reindex ./extractions
+        """),
+    )
+    parser.add_argument(
+        "query",
+        nargs="?",
+        help="搜索词（按子串匹配，支持中文）或 FTS5 查询（短语、AND/OR/NOT）",
+    )
+    parser.add_argument("--kind", choices=SEARCH_KINDS, help="只搜索某类文档")
+    parser.add_argument("--video", metavar="ID", help="只搜索某个视频")
+    parser.add_argument(
+        "--limit", type=int, default=20, help="最多返回的结果数（默认：20）"
+    )
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument(
+        "--reindex",
+        nargs="+",
+        metavar="DIR",
+        help="从输出目录（或包含 yt-extract-* 目录的父目录）重建索引",
+    )
+    parser.add_argument("--search-index", metavar="PATH", help="索引文件路径")
+    parser.add_argument(
+        "--cache-dir", help="缓存目录（默认：$XDG_CACHE_HOME/yt-design-extractor）"
+    )
+    args = parser.parse_args(argv)
+    if not args.query and not args.reindex:
+        parser.error("需要提供查询或 --reindex DIR")
+
+    index = SearchIndex(search_index_path(args))
+    try:
+        for root in args.reindex or ():
+            root = Path(root)
+            dirs = (
+                [root]
+                if (root / "manifest.json").exists()
+                else sorted(p.parent for p in root.glob("*/manifest.json"))
+            )
+            for out_dir in dirs:
+                try:
+                    count = index_output_dir(index, out_dir)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"[!] 跳过 {out_dir}：{e}")
+                    continue
+                print(f"[✓] {out_dir}：{count} 个文档")
+        if not args.query:
+            return
+        hits = index.search(args.query, args.limit, args.kind, args.video)
+        videos, docs = index.stats()
+    finally:
+        index.close()
+
+    if args.json:
+        print(
+            json.dumps(
+                [{**asdict(h), "url": h.url} for h in hits],
+                indent=2,
+                ensure_ascii=False,
+            )
+        )
+        return
+    print(f"[*] {len(hits)} 条结果（索引中共 {videos} 个视频、{docs} 个文档）")
+    for hit in hits:
+        ts = fmt_timestamp((hit.start_ms or 0) / 1000)
+        print(
+            f"\n  {hit.video_id}  `{ts}`（{hit.start_ms} ms）  [{hit.kind}]  {hit.title}"
+        )
+        print(f"    {' '.join(hit.snippet.split())}")
+        print(f"    → {hit.url}" + (f"  {hit.frame}" if hit.frame else ""))
 
 
 # ---------------------------------------------------------------------------
-# 主函数
+# 命令行选项
 # ---------------------------------------------------------------------------
 
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
+    """CLI 的参数解析器；库接口（`make_options`）也以其默认值为基础。"""
     parser = argparse.ArgumentParser(
         description="从 YouTube 视频中提取设计概念并生成 "
         "结构化的 markdown 参考文档。",
@@ -624,14 +5168,35 @@ def main():
               %(prog)s "https://youtu.be/eVnQFWGDEdY" --full
               %(prog)s "https://youtu.be/eVnQFWGDEdY" --interval 15 --scene-detect --ocr
               %(prog)s "https://youtu.be/eVnQFWGDEdY" --ocr --ocr-engine easyocr --colors
+              %(prog)s "https://youtu.be/eVnQFWGDEdY" --full --dedup --dedup-threshold 8
+              %(prog)s "https://youtu.be/eVnQFWGDEdY" --full --text-filter
+              %(prog)s "https://youtu.be/eVnQFWGDEdY" --ocr --ocr-preprocess
+              %(prog)s --serve-ocr --ocr-engine easyocr  # 常驻 OCR 守护进程
+              %(prog)s search "color palette"  # 在已提取的视频中全文搜索
               %(prog)s "https://youtu.be/eVnQFWGDEdY" -o ./my-output
+              %(prog)s "https://youtu.be/eVnQFWGDEdY" --stream-download --stream-frames
+              %(prog)s "https://youtu.be/eVnQFWGDEdY" --full --segments 8
+              %(prog)s "https://youtu.be/eVnQFWGDEdY" --ocr --adaptive --frame-budget 40
+              %(prog)s "https://youtu.be/eVnQFWGDEdY" --frame-format webp --thumbnails
+              %(prog)s "https://www.youtube.com/playlist?list=PL..." --full
+              %(prog)s --batch urls.txt --download-workers 3 --ocr-workers 2 --ocr
         """),
     )
-    parser.add_argument("url", help="YouTube 视频 URL 或 ID")
+    parser.add_argument(
+        "url",
+        nargs="?",
+        help="YouTube 视频 URL 或 ID；播放列表 URL 会展开为批量处理",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="批量模式：从文件读取 URL / ID / 播放列表（每行一个，'-' 表示 stdin）",
+    )
     parser.add_argument(
         "-o",
         "--output-dir",
-        help="输出目录（默认：./yt-extract-<video_id>）",
+        help="输出目录（默认：./yt-extract-<video_id>）；"
+        "批量模式下为各视频输出目录的父目录（默认：.）",
     )
     parser.add_argument(
         "--interval",
@@ -639,6 +5204,19 @@ def main():
         default=30,
         help="关键帧捕获之间的秒数（默认：30）",
     )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="自适应采样：按章节、字幕提示词和低分辨率画面变化信号选择帧的"
+        "时间点，静态片段少采、密集片段多采（需要已下载的视频文件）",
+    )
+    parser.add_argument(
+        "--frame-budget",
+        type=int,
+        metavar="N",
+        help="自适应采样最多提取的帧数（默认：时长 / --interval，"
+        "即不超过固定间隔采样的帧数；隐含 --adaptive）",
+    )
     parser.add_argument(
         "--scene-detect",
         action="store_true",
@@ -668,141 +5246,677 @@ def main():
     )
     parser.add_argument(
         "--ocr-engine",
-        choices=["tesseract", "easyocr"],
+        choices=sorted(ENGINES["ocr"]),
         default="tesseract",
         help="OCR 引擎：'tesseract'（快速）或 'easyocr'（更适合样式化文本）",
     )
+    parser.add_argument(
+        "--ocr-batch-size",
+        type=int,
+        default=8,
+        help="EasyOCR 每次批量推理的帧数（默认：8）",
+    )
+    parser.add_argument(
+        "--ocr-procs",
+        type=int,
+        default=1,
+        help="EasyOCR 工作进程数，每个进程加载一次模型（默认：1，即进程内运行）",
+    )
+    parser.add_argument(
+        "--no-ocr-cache",
+        action="store_true",
+        help="不读写持久化 OCR 缓存（按帧内容 + 引擎 + 配置缓存结果）",
+    )
+    parser.add_argument(
+        "--ocr-cache-size",
+        type=int,
+        default=256,
+        help="OCR 缓存的最大大小（MB），超出后按最近最少使用淘汰（默认：256）",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="持久化缓存目录（默认：$XDG_CACHE_HOME/yt-design-extractor）",
+    )
+    parser.add_argument(
+        "--meta-cache-ttl",
+        type=float,
+        default=24,
+        metavar="HOURS",
+        help="按视频 ID 缓存的元数据和字幕的有效期（小时），期内重复运行"
+        "不再调用 yt-dlp / 字幕 API（默认：24）",
+    )
+    parser.add_argument(
+        "--meta-cache-size",
+        type=int,
+        default=128,
+        help="元数据缓存的最大大小（MB），超出后按最近最少使用淘汰（默认：128）",
+    )
+    parser.add_argument(
+        "--no-meta-cache",
+        action="store_true",
+        help="不读写元数据 / 字幕缓存，每次都访问网络",
+    )
+    parser.add_argument(
+        "--search-index",
+        metavar="PATH",
+        help=f"跨视频全文索引（默认：缓存目录下的 {SEARCH_INDEX}），"
+        "每个视频提取完成后增量更新；用 search 子命令查询",
+    )
+    parser.add_argument(
+        "--no-search-index",
+        action="store_true",
+        help="提取完成后不更新全文索引",
+    )
+    parser.add_argument(
+        "--ocr-preprocess",
+        action="store_true",
+        help="Tesseract 只识别检测到的文本区域：裁剪、按行高自适应缩放并 Otsu "
+        "二值化后拼成一张图（需要 numpy + Pillow；EasyOCR 自带文本检测，不受影响）",
+    )
+    parser.add_argument(
+        "--serve-ocr",
+        action="store_true",
+        help="作为常驻 OCR 守护进程运行：加载一次 --ocr-engine 后通过 Unix 套接字"
+        "接受识别请求；运行中时其他调用自动连接它，省去模型加载",
+    )
+    parser.add_argument(
+        "--ocr-socket",
+        metavar="PATH",
+        help=f"OCR 守护进程的套接字（默认：缓存目录下的 {OCR_SOCKET}）",
+    )
+    parser.add_argument(
+        "--no-ocr-daemon",
+        action="store_true",
+        help="即使 OCR 守护进程在运行也在本进程内识别",
+    )
+    parser.add_argument(
+        "--text-filter",
+        action="store_true",
+        help="OCR 之前按笔画边缘密度估计帧中是否有文本，跳过得分低于 "
+        "--text-threshold 的帧（需要 numpy + Pillow）",
+    )
+    parser.add_argument(
+        "--text-threshold",
+        type=float,
+        default=TEXT_SCORE_THRESHOLD,
+        help="文本预筛选阈值（每千像素的笔画边缘数），越高 = 跳过越多"
+        f"（默认：{TEXT_SCORE_THRESHOLD}）",
+    )
     parser.add_argument(
         "--colors",
         action="store_true",
         help="从帧中提取调色板",
     )
+    parser.add_argument(
+        "--palette-engine",
+        choices=sorted(ENGINES["palette"]),
+        help="调色板引擎：'histogram'（NumPy 直方图 + k-means，覆盖全部帧）或 "
+        "'colorthief'（采样 10 帧）（默认：已安装 numpy 时为 histogram）",
+    )
+    parser.add_argument(
+        "--palette-source",
+        choices=["frames", "video"],
+        default="frames",
+        help="histogram 引擎的输入：'frames'（提取的全部帧）或 "
+        "'video'（以 1 fps 低分辨率解码整段视频）（默认：frames）",
+    )
     parser.add_argument(
         "--full",
         action="store_true",
         help="启用所有功能：场景检测、OCR 和颜色提取",
     )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="OCR/调色板之前用感知哈希折叠近似相同的帧（需要 numpy + Pillow）",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=int,
+        default=6,
+        help="视为重复帧的最大汉明距离 0-64，越高 = 折叠越多（默认：6）",
+    )
+    parser.add_argument(
+        "--hash-method",
+        choices=HASH_METHODS,
+        default="dhash",
+        help="感知哈希算法：'dhash'（快速）或 'phash'（对亮度变化更稳健）",
+    )
+    parser.add_argument(
+        "--frame-format",
+        choices=FRAME_FORMATS,
+        default="png",
+        help="帧图像格式：'png'（无损，最大）、'jpg' 或 'webp'（默认：png）",
+    )
+    parser.add_argument(
+        "--frame-quality",
+        type=int,
+        default=90,
+        help="jpg / webp 帧的质量 1-100（默认：90）",
+    )
+    parser.add_argument(
+        "--thumbnails",
+        type=int,
+        nargs="?",
+        const=320,
+        default=0,
+        metavar="WIDTH",
+        help="为 Markdown 生成缩略图（默认宽度 320），图片链接到原帧（需要 Pillow）",
+    )
+    parser.add_argument(
+        "--frame-store",
+        type=int,
+        nargs="?",
+        const=FRAME_STORE_WIDTH,
+        default=0,
+        metavar="WIDTH",
+        help="把所有帧缩小到 WIDTH 宽（默认 "
+        f"{FRAME_STORE_WIDTH}）后打包进内存映射的 {FrameStore.ARRAY} 和时间戳索引，"
+        "去重 / 文本预筛选 / 调色板统计直接切片读取（需要 numpy + Pillow）",
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        metavar="N",
+        help="把视频按关键帧分成 N 段，用 N 个 ffmpeg 进程并行提取帧，"
+        "适合多核机器上的长视频（默认：1；需要已下载的视频文件）",
+    )
+    parser.add_argument(
+        "--stream-frames",
+        action="store_true",
+        help="通过 rawvideo 管道在内存中对间隔帧运行 OCR/调色板，"
+        "省去 PNG 编码-解码往返（需要 numpy + Pillow + ffprobe）",
+    )
+    parser.add_argument(
+        "--stream-download",
+        action="store_true",
+        help="将 yt-dlp 的输出直接通过管道送入 ffmpeg，边下载边解码，"
+        "不在磁盘上保存完整视频",
+    )
+    parser.add_argument(
+        "--source-cmd",
+        help="替代 yt-dlp 的视频流命令，需把视频写到 stdout（{url} 会被替换），"
+        "例如 'cat local.mp4'；隐含 --stream-download",
+    )
+
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=2,
+        help="批量模式：同时获取元数据/字幕/下载视频的视频数（默认：2）",
+    )
+    parser.add_argument(
+        "--decode-workers",
+        type=int,
+        default=2,
+        help="批量模式：同时运行 ffmpeg 帧提取的视频数（默认：2）",
+    )
+    parser.add_argument(
+        "--ocr-workers",
+        type=int,
+        default=1,
+        help="批量模式：同时运行 OCR/调色板/markdown 的视频数（默认：1）",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=2,
+        help="批量模式：阶段之间最多排队的视频数，限制等待解码的已下载视频（默认：2）",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="记录每个阶段和每次 OCR/帧提取调用的墙钟时间、CPU 时间、峰值 RSS 和"
+        "项目数，写入 profile-trace.json（Chrome trace-event 格式）并打印汇总表",
+    )
+    parser.add_argument(
+        "--force-stage",
+        action="append",
+        choices=[*MANIFEST_STAGES, "all"],
+        default=[],
+        help="忽略 manifest.json 强制重新运行某阶段（可重复）；"
+        "下游阶段随之失效。默认跳过参数和输入未变化的已完成阶段",
+    )
+
+    return parser
+
+
+def ocr_options_for(args) -> OcrOptions:
+    """本次运行影响识别结果的 OCR 设置。"""
+    return OcrOptions(
+        preprocess=bool(args.ocr_preprocess) and NUMPY_AVAILABLE and PILLOW_AVAILABLE
+    )
+
+
+def connect_ocr_daemon(args) -> Optional[OcrDaemonClient]:
+    """按选项连接运行中的 OCR 守护进程；它加载的引擎或设置与本次运行
+    不同、或没有运行时返回 None（本地识别）。"""
+    if not args.ocr or args.no_ocr_daemon or args.serve_ocr:
+        return None
+    socket_path = ocr_socket_path(args)
+    daemon = OcrDaemonClient.connect(socket_path)
+    if daemon is None:
+        return None
+    if not daemon.serves(args.ocr_engine, ocr_options_for(args)):
+        print(
+            "[*] 运行中的 OCR 守护进程加载的引擎或设置不同，"
+            f"本地运行 {args.ocr_engine}"
+        )
+        return None
+    print(
+        f"[*] 使用运行中的 OCR 守护进程（{args.ocr_engine}，"
+        f"pid {daemon.info['pid']}）：{socket_path}"
+    )
+    return daemon
+
+
+def open_meta_cache(args) -> Optional[MetadataCache]:
+    """按选项打开元数据 / 字幕缓存；--no-meta-cache 时返回 None。"""
+    if args.no_meta_cache:
+        return None
+    return MetadataCache(
+        DiskCache(
+            cache_dir_for(args) / META_CACHE_FILE,
+            max_bytes=args.meta_cache_size * 1024 * 1024,
+        ),
+        args.meta_cache_ttl * 3600,
+    )
+
+
+def cache_dir_for(args) -> Path:
+    return Path(args.cache_dir) if args.cache_dir else default_cache_dir()
 
-    args = parser.parse_args()
 
+def ocr_socket_path(args) -> Path:
+    if args.ocr_socket:
+        return Path(args.ocr_socket)
+    return cache_dir_for(args) / OCR_SOCKET
+
+
+def prepare_options(args) -> argparse.Namespace:
+    """展开 --full、检查必需的外部工具，并在可选依赖缺失时关闭相应功能。
+
+    必需工具缺失或选项无效时抛出 ExtractorError 的子类。只检查和修改
+    `args`，不打开缓存或连接：这些资源由每次调用的 `open_run_context` 创建。"""
     # --full 启用所有功能
     if args.full:
         args.scene_detect = True
         args.ocr = True
         args.colors = True
 
-    # 提前依赖检查
-    if not shutil.which("yt-dlp"):
-        sys.exit(
-            "在 PATH 上找不到必需的工具 'yt-dlp'。安装方法：pip install yt-dlp"
+    # 提前依赖检查；--transcript-only 不下载视频，获取元数据时才检查 yt-dlp
+    if not args.transcript_only:
+        require_yt_dlp()
+        if not shutil.which("ffmpeg"):
+            raise DependencyError(
+                "在 PATH 上找不到必需的工具 'ffmpeg'。"
+                "安装方法：make install-ocr（或：brew install ffmpeg）"
+            )
+    if not 1 <= args.frame_quality <= 100:
+        raise InvalidInputError("--frame-quality 必须在 1-100 之间")
+    if args.ocr_engine not in ENGINES["ocr"]:
+        raise InvalidInputError(f"未知的 OCR 引擎：{args.ocr_engine}")
+    if args.stream_frames and not (NUMPY_AVAILABLE and PILLOW_AVAILABLE):
+        print("[!] --stream-frames 需要 numpy 和 Pillow，回退到基于文件的帧提取")
+        args.stream_frames = False
+    if args.source_cmd:
+        args.stream_download = True
+    if args.thumbnails and not PILLOW_AVAILABLE:
+        print("[!] --thumbnails 需要 Pillow，Markdown 直接引用原帧")
+        args.thumbnails = 0
+    if args.frame_store and not (NUMPY_AVAILABLE and PILLOW_AVAILABLE):
+        print("[!] --frame-store 需要 numpy 和 Pillow，各阶段逐个读取帧文件")
+        args.frame_store = 0
+    if args.text_filter and not (NUMPY_AVAILABLE and PILLOW_AVAILABLE):
+        print("[!] --text-filter 需要 numpy 和 Pillow，对所有帧运行 OCR")
+        args.text_filter = False
+    if args.ocr_preprocess and not (NUMPY_AVAILABLE and PILLOW_AVAILABLE):
+        print("[!] --ocr-preprocess 需要 numpy 和 Pillow，识别整帧")
+        args.ocr_preprocess = False
+    if args.segments > 1 and (args.stream_download or args.stream_frames):
+        print("[!] --segments 需要可随机定位的视频文件，流式模式下忽略")
+    if args.frame_budget is not None:
+        if args.frame_budget < 1:
+            raise InvalidInputError("--frame-budget 必须至少为 1")
+        args.adaptive = True
+    if args.adaptive and (args.stream_download or args.stream_frames):
+        print("[!] --adaptive 需要可随机定位的视频文件，流式模式下使用固定间隔采样")
+        args.adaptive = False
+    if args.adaptive and not NUMPY_AVAILABLE:
+        print("[!] --adaptive 需要 numpy，使用固定间隔采样")
+        args.adaptive = False
+    if args.meta_cache_ttl <= 0:
+        raise InvalidInputError(
+            "--meta-cache-ttl 必须大于 0（关闭缓存请用 --no-meta-cache）"
+        )
+    return args
+
+
+# ---------------------------------------------------------------------------
+# 库接口
+# ---------------------------------------------------------------------------
+
+
+@dataclass(slots=True, frozen=True)
+class TranscriptSegment:
+    start: float
+    duration: float
+    text: str
+
+
+@dataclass(slots=True, frozen=True)
+class Frame:
+    """提取的一帧。`kind` 为 "interval" 或 "scene"；去重后折叠的帧
+    在 `duplicate_of` 中记录其代表帧；`transcript` 是该帧所代表时间段
+    （到同类的下一帧为止）内的字幕。"""
+
+    path: Path
+    time: Optional[float]
+    kind: str
+    duplicate_of: Optional[Path] = None
+    transcript: str = ""
+
+
+@dataclass(slots=True, frozen=True)
+class OcrHit:
+    """代表帧上识别出的非空文本。"""
+
+    frame: Path
+    time: Optional[float]
+    text: str
+
+
+@dataclass(slots=True)
+class ExtractionResult:
+    """一个视频的提取结果；批量模式中失败的视频 `error` 非空。"""
+
+    url: str
+    video_id: str
+    out_dir: Path
+    metadata: dict
+    transcript: list[TranscriptSegment]
+    frames: list[Frame]
+    ocr: list[OcrHit]
+    palette: dict
+    reference: Optional[Path]
+    error: Optional[str] = None
+
+    @classmethod
+    def from_job(cls, job: VideoJob, args) -> "ExtractionResult":
+        index = TranscriptIndex(
+            (e["start"], e.get("duration", 0), e["text"]) for e in job.transcript or ()
         )
-    if not args.transcript_only and not shutil.which("ffmpeg"):
-        sys.exit(
-            "在 PATH 上找不到必需的工具 'ffmpeg'。"
-            "安装方法：make install-ocr（或：brew install ffmpeg）"
+        end = job.meta.get("duration")
+        # 与 build_markdown 一致：没有时间戳的间隔帧按 i * interval 计
+        step = 0 if args.adaptive else args.interval
+        frames = []
+        for kind, group, group_step in (
+            ("interval", job.interval_frames, step),
+            ("scene", job.scene_frames, 0),
+        ):
+            spans = frame_spans(group, job.frame_times, end, step=group_step)
+            for f, span in zip(group, spans):
+                rep = job.duplicates.get(f, f)
+                frames.append(
+                    Frame(
+                        f,
+                        span[0] if span else None,
+                        kind,
+                        rep if rep != f else None,
+                        index.text(*span) if span else "",
+                    )
+                )
+        ocr = []
+        for frame in frames:
+            text = job.ocr_results.get(frame.path, "").strip()
+            if text and frame.duplicate_of is None:
+                ocr.append(OcrHit(frame.path, frame.time, text))
+        return cls(
+            url=job.url,
+            video_id=job.video_id,
+            out_dir=job.out_dir,
+            metadata=job.meta,
+            transcript=[
+                TranscriptSegment(e["start"], e["duration"], e["text"])
+                for e in job.transcript or ()
+            ],
+            frames=frames,
+            ocr=ocr,
+            palette=job.color_analysis,
+            reference=job.md_path,
+            error=job.error,
         )
 
-    video_id = extract_video_id(args.url)
-    out_dir = Path(args.output_dir or f"./yt-extract-{video_id}")
-    out_dir.mkdir(parents=True, exist_ok=True)
 
-    # 1. 元数据
-    meta = get_video_metadata(args.url)
+def make_options(**options) -> argparse.Namespace:
+    """以 CLI 默认值为基础构造并检查选项。关键字与长选项同名（连字符换成
+    下划线），例如 make_options(full=True, frame_format="webp")。"""
+    args = build_parser().parse_args([])
+    unknown = sorted(set(options) - set(vars(args)))
+    if unknown:
+        raise InvalidInputError(f"未知的选项：{', '.join(unknown)}")
+    vars(args).update(options)
+    return prepare_options(args)
+
 
-    # 将原始元数据转储以供将来参考
-    (out_dir / "metadata.json").write_text(
-        json.dumps(meta, indent=2, default=str), encoding="utf-8"
+def open_ocr_cache(args) -> Optional[DiskCache]:
+    if not args.ocr or args.no_ocr_cache:
+        return None
+    return DiskCache(
+        cache_dir_for(args) / "ocr-cache.sqlite3",
+        max_bytes=args.ocr_cache_size * 1024 * 1024,
     )
-    print(f"    标题：    {meta.get('title')}")
-    print(f"    频道：  {meta.get('channel', meta.get('uploader'))}")
-    print(f"    时长：{fmt_timestamp(meta.get('duration', 0))}")
 
-    # 2. 字幕
-    transcript = get_transcript(video_id)
 
-    # 3. 关键帧
-    interval_frames: list[Path] = []
-    scene_frames: list[Path] = []
+def open_run_context(
+    args,
+    ocr_cache: Optional[DiskCache] = None,
+    meta_cache: Optional[MetadataCache] = None,
+) -> RunContext:
+    """为一次调用创建 `RunContext`：未传入的缓存按选项打开（调用结束时由
+    `RunContext.close` 关闭），按选项连接 OCR 守护进程，--profile 时使用
+    新的剖析器，使 trace 只包含本次调用的事件。"""
+    ctx = RunContext(ocr_cache=ocr_cache, meta_cache=meta_cache)
+    try:
+        if ctx.ocr_cache is None:
+            ctx.ocr_cache = open_ocr_cache(args)
+            if ctx.ocr_cache is not None:
+                ctx.owned.append(ctx.ocr_cache)
+        if ctx.meta_cache is None:
+            ctx.meta_cache = open_meta_cache(args)
+            if ctx.meta_cache is not None:
+                ctx.owned.append(ctx.meta_cache)
+        ctx.ocr_daemon = connect_ocr_daemon(args)
+    except BaseException:
+        ctx.close()
+        raise
+    ctx.profiler = Profiler() if args.profile else None
+    return ctx
 
-    # OCR 和颜色分析结果
-    ocr_results: dict[Path, str] = {}
-    color_analysis: dict = {}
 
-    if not args.transcript_only:
-        video_path = download_video(args.url, out_dir)
-        try:
-            interval_frames = extract_frames_interval(
-                video_path, out_dir, interval=args.interval
-            )
-            if args.scene_detect:
-                scene_frames = extract_frames_scene(
-                    video_path, out_dir, threshold=args.scene_threshold
-                )
-        finally:
-            # 始终清理视频文件以节省空间
-            print("[*] 正在删除下载的视频以节省空间…")
-            video_path.unlink(missing_ok=True)
+def _new_job(args) -> VideoJob:
+    if is_playlist_url(args.url):
+        raise InvalidInputError(f"播放列表请使用 extract_batch：{args.url}")
+    video_id = extract_video_id(args.url)
+    return VideoJob(
+        url=args.url,
+        video_id=video_id,
+        out_dir=Path(args.output_dir or f"./yt-extract-{video_id}"),
+    )
 
-        # 4. OCR 提取
-        if args.ocr:
-            all_frames_for_ocr = interval_frames + scene_frames
-            ocr_results = run_ocr_on_frames(
-                all_frames_for_ocr,
-                ocr_engine=args.ocr_engine,
-            )
-            # 将 OCR 结果保存到 JSON 以供重用
-            ocr_json = {str(k): v for k, v in ocr_results.items()}
-            (out_dir / "ocr-results.json").write_text(
-                json.dumps(ocr_json, indent=2), encoding="utf-8"
-            )
 
-        # 5. 调色板分析
-        if args.colors:
-            all_frames_for_color = interval_frames + scene_frames
-            color_analysis = analyze_color_palettes(all_frames_for_color)
-            if color_analysis:
-                (out_dir / "color-palette.json").write_text(
-                    json.dumps(color_analysis, indent=2), encoding="utf-8"
-                )
-    else:
-        print("[*] --transcript-only：跳过视频下载")
+def run_extraction(
+    args,
+    ocr_cache: Optional[DiskCache] = None,
+    meta_cache: Optional[MetadataCache] = None,
+) -> ExtractionResult:
+    """按已准备好的选项（见 `make_options`）提取 `args.url`。"""
+    job = _new_job(args)
+    ctx = open_run_context(args, ocr_cache, meta_cache)
+    try:
+        with profiling(ctx.profiler):
+            for name, stage in STAGES:
+                with profile_span(f"{name}阶段"):
+                    stage(job, args, ctx)
+    finally:
+        write_profile(job.out_dir, ctx.profiler)
+        ctx.close()
+    return ExtractionResult.from_job(job, args)
 
-    # 6. 构建 markdown
-    md_path = build_markdown(
-        meta,
-        transcript,
-        interval_frames,
-        scene_frames,
-        out_dir,
-        args.interval,
-        ocr_results=ocr_results,
-        color_analysis=color_analysis,
+
+def _library_options(options: dict, search_index: bool | str | os.PathLike) -> dict:
+    """库入口的选项。与 CLI 不同，全文索引默认不更新：库调用方（测试、
+    服务）不应在不知情时写入用户级的共享索引。`search_index` 为 True 时
+    写入默认索引文件，为路径时写入该文件。"""
+    path = None if isinstance(search_index, bool) else str(search_index)
+    return {**options, "search_index": path, "no_search_index": not search_index}
+
+
+def extract(
+    url: str,
+    output_dir: Optional[str] = None,
+    *,
+    ocr_cache: Optional[DiskCache] = None,
+    meta_cache: Optional[MetadataCache] = None,
+    search_index: bool | str | os.PathLike = False,
+    **options,
+) -> ExtractionResult:
+    """提取单个视频并返回 `ExtractionResult`；失败时抛出 `ExtractorError`。
+
+    `options` 与 CLI 长选项同名（例如 ocr=True、interval=15），只作用于
+    本次调用。长期运行的调用方可以传入共享的 `ocr_cache` 和 `meta_cache`
+    （不会被关闭）；已加载的 OCR 引擎在进程内保持加载，后续调用不再初始化。
+    `search_index` 默认为 False，即不更新全文索引（见 `_library_options`）。"""
+    options = _library_options(options, search_index)
+    args = make_options(url=url, output_dir=output_dir, **options)
+    return run_extraction(args, ocr_cache, meta_cache)
+
+
+async def extract_async(
+    url: str,
+    output_dir: Optional[str] = None,
+    *,
+    ocr_cache: Optional[DiskCache] = None,
+    meta_cache: Optional[MetadataCache] = None,
+    search_index: bool | str | os.PathLike = False,
+    **options,
+) -> ExtractionResult:
+    """`extract` 的异步版本：网络阶段在调用方的事件循环中并发运行，
+    ffmpeg 和 OCR 阶段在工作线程中运行，不阻塞事件循环。"""
+    options = _library_options(options, search_index)
+    args = make_options(url=url, output_dir=output_dir, **options)
+    job = _new_job(args)
+    ctx = open_run_context(args, ocr_cache, meta_cache)
+    try:
+        with profiling(ctx.profiler):
+            (fetch_name, _), *rest = STAGES
+            with profile_span(f"{fetch_name}阶段"):
+                try:
+                    await fetch_stage_async(job, args, ctx)
+                except BaseException:
+                    release_video(job, args)
+                    raise
+            for name, stage in rest:
+                with profile_span(f"{name}阶段"):
+                    await asyncio.to_thread(stage, job, args, ctx)
+    finally:
+        write_profile(job.out_dir, ctx.profiler)
+        ctx.close()
+    return ExtractionResult.from_job(job, args)
+
+
+def run_batch_extraction(
+    urls: list[str],
+    args,
+    ocr_cache: Optional[DiskCache] = None,
+    meta_cache: Optional[MetadataCache] = None,
+) -> list[ExtractionResult]:
+    """按已准备好的选项批量提取；单个视频的失败记录在结果的 `error` 中。"""
+    root = Path(args.output_dir or ".")
+    root.mkdir(parents=True, exist_ok=True)
+    jobs = collect_jobs(urls, root)
+    if not jobs:
+        raise InvalidInputError("批量模式没有可处理的视频。")
+    ctx = open_run_context(args, ocr_cache, meta_cache)
+    try:
+        with profiling(ctx.profiler):
+            run_batch(jobs, args, ctx)
+    finally:
+        write_profile(root, ctx.profiler)
+        ctx.close()
+    write_batch_summary(jobs, root)
+    return [ExtractionResult.from_job(job, args) for job in jobs]
+
+
+def extract_batch(
+    urls: list[str],
+    output_dir: Optional[str] = None,
+    *,
+    ocr_cache: Optional[DiskCache] = None,
+    meta_cache: Optional[MetadataCache] = None,
+    search_index: bool | str | os.PathLike = False,
+    **options,
+) -> list[ExtractionResult]:
+    """以流水线方式提取多个视频或播放列表（见 `run_batch`），按输入顺序
+    返回结果；单个视频的失败不抛出，记录在对应结果的 `error` 中。
+    `search_index` 与 `extract` 相同，默认不更新全文索引。"""
+    options = _library_options(options, search_index)
+    args = make_options(output_dir=output_dir, **options)
+    return run_batch_extraction(urls, args, ocr_cache, meta_cache)
+
+
+def search(
+    query: str,
+    *,
+    index_path: Optional[str] = None,
+    limit: int = 20,
+    kind: Optional[str] = None,
+    video_id: Optional[str] = None,
+) -> list[SearchHit]:
+    """在已提取视频的全文索引中搜索（FTS5 查询语法），按相关度返回
+    `SearchHit`；`index_path` 默认为缓存目录中的 search.sqlite3。"""
+    index = SearchIndex(
+        Path(index_path) if index_path else default_cache_dir() / SEARCH_INDEX
     )
+    try:
+        return index.search(query, limit, kind, video_id)
+    finally:
+        index.close()
 
-    # 摘要
-    print("\n" + "=" * 60)
-    print("完成！输出目录：", out_dir)
-    print("=" * 60)
-    print(f"  参考文档  : {md_path}")
-    print(f"  元数据       : {out_dir / 'metadata.json'}")
-    if interval_frames:
-        print(f"  间隔帧：{len(interval_frames)} 在 frames/ 中")
-    if scene_frames:
-        print(f"  场景帧   : {len(scene_frames)} 在 frames_scene/ 中")
-    if ocr_results:
-        frames_with_text = sum(1 for t in ocr_results.values() if len(t) > 10)
-        print(
-            f"  OCR 结果    : {frames_with_text} 帧有文本 → ocr-results.json"
-        )
-    if color_analysis:
-        print(
-            f"  调色板  : {len(color_analysis.get('dominant_colors', []))} 种颜色 → color-palette.json"
-        )
-    print()
-    print("下一步：")
-    print("  1. 审查 extracted-reference.md")
-    print("  2. 为您的 agent 整理/注释内容")
-    print("  3. 将文件提供给 Claude 以生成 SKILL.md 或 agent 定义")
+
+# ---------------------------------------------------------------------------
+# 主函数
+# ---------------------------------------------------------------------------
+
+
+def main():
+    if sys.argv[1:2] == ["search"]:
+        try:
+            search_main(sys.argv[2:])
+        except ExtractorError as e:
+            sys.exit(str(e))
+        return
+    parser = build_parser()
+    args = parser.parse_args()
+    if not args.url and not args.batch and not args.serve_ocr:
+        parser.error("需要提供视频 URL 或 --batch FILE")
+    try:
+        if args.serve_ocr:
+            serve_ocr(ocr_socket_path(args), args.ocr_engine, ocr_options_for(args))
+            return
+        args = prepare_options(args)
+        if args.batch or is_playlist_url(args.url):
+            urls = read_batch_file(args.batch) if args.batch else []
+            if args.url:
+                urls.insert(0, args.url)
+            results = run_batch_extraction(urls, args)
+            if any(result.error for result in results):
+                sys.exit(1)
+            return
+        print_summary(run_extraction(args))
+    except ExtractorError as e:
+        sys.exit(str(e))
 
 
 if __name__ == "__main__":
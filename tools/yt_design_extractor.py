@@ -0,0 +1,21 @@
+"""yt-design-extractor.py 的可导入名称（脚本文件名含连字符，无法直接 import）。
+
+用法（在 tools/ 目录中或把它加入 sys.path）：
+    import yt_design_extractor as yde
+
+    result = yde.extract("https://youtu.be/eVnQFWGDEdY", ocr=True, interval=15)
+    for hit in result.ocr:
+        print(hit.time, hit.text)
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+_spec = importlib.util.spec_from_file_location(
+    __name__, Path(__file__).with_name("yt-design-extractor.py")
+)
+_module = importlib.util.module_from_spec(_spec)
+# 先注册再执行：dataclass 和进程池按模块名查找其中的定义
+sys.modules[__name__] = _module
+_spec.loader.exec_module(_module)